@@ -0,0 +1,143 @@
+'''Garbage collection cost of building and dropping big trees.
+
+Run from the repository root:
+
+    python -m benchmarks.gc_parse --size 200000
+
+Each scenario runs in a fresh interpreter, so its peak RSS is its own.
+It builds a tree a few times over, dropping the previous one each
+time, and reports the wall time, the time spent in the cyclic
+collector, the number of collections per generation and the peak RSS:
+
+    parse              parse the toy grammar
+    parse_pause_gc     the same with pause_gc=True
+    parse_dispose      dispose() each tree before dropping it
+    build              build a plain tree of Nodes
+    build_weak         the same with WeakParentNode
+'''
+import sys
+import gc
+import json
+import time
+import argparse
+import subprocess
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+SCENARIOS = {}
+
+
+def scenario(func):
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def _parse_rounds(size, rounds, dispose=False, **options):
+    from tests import grammar
+    items = list(grammar.tokenize(grammar.make_source(size // 5)))
+    tree = None
+    for _ in range(rounds):
+        if dispose and tree is not None:
+            tree.dispose()
+        tree = grammar.Module.parse(iter(items), **options)
+
+
+@scenario
+def parse(size, rounds):
+    _parse_rounds(size, rounds)
+
+
+@scenario
+def parse_pause_gc(size, rounds):
+    _parse_rounds(size, rounds, pause_gc=True)
+
+
+@scenario
+def parse_dispose(size, rounds):
+    _parse_rounds(size, rounds, dispose=True)
+
+
+def _build_rounds(node_cls, size, rounds):
+    for _ in range(rounds):
+        root = node_cls()
+        for i in range(size // 10):
+            this = root.append(node_cls(name='f%d' % i))
+            for j in range(9):
+                this.append(node_cls(name='x%d' % j))
+
+
+@scenario
+def build(size, rounds):
+    from treebie import Node
+    _build_rounds(Node, size, rounds)
+
+
+@scenario
+def build_weak(size, rounds):
+    from treebie.lifecycle import WeakParentNode
+    _build_rounds(WeakParentNode, size, rounds)
+
+
+# ---------------------------------------------------------------------------
+# Measuring.
+# ---------------------------------------------------------------------------
+def measure(name, size, rounds, timer=time.perf_counter):
+    stats = dict(gc_seconds=0.0, collections=[0, 0, 0])
+    started = []
+
+    def callback(phase, info):
+        if phase == 'start':
+            started.append(timer())
+        elif started:
+            stats['gc_seconds'] += timer() - started.pop()
+            stats['collections'][info['generation']] += 1
+
+    gc.callbacks.append(callback)
+    try:
+        start = timer()
+        SCENARIOS[name](size, rounds)
+        stats['seconds'] = timer() - start
+    finally:
+        gc.callbacks.remove(callback)
+    if resource is not None:
+        # KiB on Linux, bytes on macOS.
+        stats['peak_rss'] = resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss
+    return stats
+
+
+def run_isolated(name, size, rounds):
+    output = subprocess.check_output([
+        sys.executable, '-m', 'benchmarks.gc_parse', '--child', name,
+        '--size', str(size), '--rounds', str(rounds)])
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=100000,
+                        help='approximate node count per tree')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        json.dump(measure(args.child, args.size, args.rounds), sys.stdout)
+        return 0
+
+    for name in SCENARIOS:
+        stats = run_isolated(name, args.size, args.rounds)
+        sys.stdout.write(
+            '%-16s %9.3f s  gc %8.3f s  collections %-16s peak rss %s\n' % (
+                name, stats['seconds'], stats['gc_seconds'],
+                '/'.join(map(str, stats['collections'])),
+                stats.get('peak_rss', '?')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+'''Lexer throughput in tokens per second.
+
+Run from the repository root:
+
+    python -m benchmarks.lex --size 1000000
+    python -m benchmarks.lex --file big_program.toy
+
+Lexes a file written in the toy grammar of tests/grammar.py, as a
+str, as bytes, and mmapped, with the built-in lexer, and as a str
+with the grammar's hand-written tokenizer for comparison. Without
+--file, a source of --size statements is generated into a temporary
+file first.
+'''
+import os
+import sys
+import mmap
+import time
+import argparse
+import tempfile
+
+from tests import grammar
+
+
+def _count(items):
+    count = 0
+    for _ in items:
+        count += 1
+    return count
+
+
+def run(path, repeat, stream=sys.stdout, timer=time.perf_counter):
+    with open(path, 'rb') as f:
+        data = f.read()
+    text = data.decode('utf-8')
+    lexer = grammar.ToyLexer()
+
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            cases = [
+                ('tokenize (str)', lambda: grammar.tokenize(text)),
+                ('lexer (str)', lambda: lexer.tokenize(text)),
+                ('lexer (bytes)', lambda: lexer.tokenize(data)),
+                ('lexer (mmap)', lambda: lexer.tokenize(mapped)),
+                ]
+            for name, make_items in cases:
+                best = None
+                for _ in range(repeat):
+                    start = timer()
+                    count = _count(make_items())
+                    elapsed = timer() - start
+                    if best is None or elapsed < best:
+                        best = elapsed
+                stream.write('%-16s %10d tokens %10.3f s %12.0f tokens/s\n' % (
+                    name, count, best, count / best))
+        finally:
+            mapped.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=200000,
+                        help='statements to generate without --file')
+    parser.add_argument('--file', help='a toy grammar source file to lex')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.file:
+        run(args.file, args.repeat)
+        return 0
+
+    fd, path = tempfile.mkstemp(suffix='.toy')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(grammar.make_source(args.size))
+        run(path, args.repeat)
+    finally:
+        os.remove(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
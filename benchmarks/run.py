@@ -0,0 +1,410 @@
+'''Benchmark harness for treebie's hot paths.
+
+Run from the repository root:
+
+    python -m benchmarks.run --output before.json
+    ... make changes ...
+    python -m benchmarks.run --compare before.json --threshold 0.1
+
+Each benchmark records the best and median wall time over several
+repeats, plus the peak memory allocated during one extra run as
+reported by tracemalloc. With --compare, the run exits non-zero if
+any benchmark's best time got slower than the baseline by more than
+the threshold.
+'''
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+
+from benchmarks import trees
+
+
+BENCHMARKS = []
+
+
+def benchmark(name, setup=None):
+    '''Register a benchmark. ``setup`` is called once with the size
+    argument, outside of the timed region, and its return value is
+    passed to the benchmark function. Without a setup function, the
+    benchmark gets the size itself.
+    '''
+    def decorator(func):
+        BENCHMARKS.append((name, setup, func))
+        return func
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Tree building, traversal, querying and cloning.
+# ---------------------------------------------------------------------------
+def _register_tree_benchmarks(shape, make_tree):
+    setup = make_tree
+
+    @benchmark('%s.build' % shape)
+    def build(size):
+        make_tree(size)
+
+    @benchmark('%s.depth_first' % shape, setup)
+    def depth_first(tree):
+        for node in tree.depth_first():
+            pass
+
+    @benchmark('%s.find' % shape, setup)
+    def find(tree):
+        for node in tree.find('Name'):
+            pass
+
+    @benchmark('%s.find_one_miss' % shape, setup)
+    def find_one_miss(tree):
+        tree.find_one('Missing')
+
+    @benchmark('%s.clone' % shape, setup)
+    def clone(tree):
+        tree.clone()
+
+    @benchmark('%s.to_data' % shape, setup)
+    def to_data(tree):
+        tree.to_data()
+
+    @benchmark('%s.fromdata' % shape, lambda size: make_tree(size).to_data())
+    def fromdata(data):
+        trees.Module.fromdata(data)
+
+    @benchmark('%s.to_records' % shape, setup)
+    def to_records(tree):
+        tree.to_records()
+
+    @benchmark('%s.from_records' % shape,
+               lambda size: make_tree(size).to_records())
+    def from_records(records):
+        trees.Module.from_records(*records)
+
+
+for shape in ('wide', 'balanced', 'ast'):
+    _register_tree_benchmarks(shape, trees.SHAPES[shape])
+
+
+def _deep(size):
+    # Recursive generators limit how deep a chain can be traversed.
+    return trees.deep(min(size, 200))
+
+
+@benchmark('deep.depth_first', _deep)
+def deep_depth_first(tree):
+    for node in tree.depth_first():
+        pass
+
+
+@benchmark('deep.getroot', lambda size: list(_deep(size).depth_first())[-1])
+def deep_getroot(leaf):
+    for _ in range(100):
+        leaf.getroot()
+
+
+def _deep_path_leaf(size):
+    from treebie.paths import PathNode
+    this = PathNode()
+    for _ in range(min(size, 200) - 1):
+        this = this.append(PathNode())
+    return this
+
+
+@benchmark('deep.getroot_cached', _deep_path_leaf)
+def deep_getroot_cached(leaf):
+    for _ in range(100):
+        leaf.getroot()
+
+
+@benchmark('wide.index', trees.wide)
+def wide_index(tree):
+    for child in tree.children[-100:]:
+        child.index()
+
+
+def _ctx_leaves(size):
+    tree = trees.balanced(size)
+    tree.ctx['key'] = 'value'
+    return [node for node in tree.depth_first() if not node.children]
+
+
+@benchmark('balanced.ctx_lookup', _ctx_leaves)
+def ctx_lookup(leaves):
+    for leaf in leaves:
+        leaf.ctx['key']
+
+
+def _find_passes():
+    from treebie.visitor import Find
+    keys = ('ClassDef', 'FunctionDef', 'Assign', 'Call', 'Name', 'Constant')
+    return [Find(keys[i % len(keys)]) for i in range(20)]
+
+
+@benchmark('ast.find_20_passes', trees.ast_like)
+def find_passes(tree):
+    for find in _find_passes():
+        for node in tree.find(find.nodekey):
+            pass
+
+
+@benchmark('ast.visit_all_20_passes', trees.ast_like)
+def visit_all_passes(tree):
+    from treebie.visitor import visit_all
+    visit_all(tree, _find_passes())
+
+
+def _rewrite_rules():
+    from treebie.rewrite import Pattern, RuleSet, REST
+    rules = RuleSet()
+
+    @rules.rule(Pattern('Call', children=[Pattern('Constant'), REST]))
+    def drop_constant_arg(node):
+        node.children[0].detatch()
+        return node
+
+    @rules.rule(Pattern('Assign', children=[Pattern('Call', children=[
+        Pattern('Name', bind='name')])]))
+    def unwrap_call(node, name):
+        node.children[0].detatch()
+        name.detatch()
+        node.append(name)
+        return node
+
+    return rules
+
+
+@benchmark('ast.rewrite', lambda size: (size, _rewrite_rules()))
+def rewrite(args):
+    # Includes building the tree, since rewriting consumes it; compare
+    # with ast.build.
+    size, rules = args
+    rules.rewrite(trees.ast_like(size))
+
+
+@benchmark('wide.uuid')
+def wide_uuid(size):
+    # Includes building the tree, since ids are cached; compare with
+    # wide.node_id.
+    for node in trees.wide(size).depth_first():
+        node.uuid
+
+
+@benchmark('wide.node_id')
+def wide_node_id(size):
+    from treebie.nodeids import IdNode
+    root = IdNode()
+    for i in range(size):
+        root.append(IdNode(id='n%d' % i))
+    for node in root.depth_first():
+        node.node_id
+
+
+def _build_journaled(size, journal):
+    from treebie.journal import JournalNode
+    root = JournalNode()
+    if journal is not None:
+        journal.attach(root)
+    for i in range(size):
+        root.append(JournalNode())['id'] = 'n%d' % i
+    return root
+
+
+@benchmark('wide.build_journal_off')
+def build_journal_off(size):
+    _build_journaled(size, None)
+
+
+@benchmark('wide.build_journal')
+def build_journal(size):
+    # Compare with wide.build_journal_off for the cost of recording.
+    from treebie.journal import Journal
+    _build_journaled(size, Journal())
+
+
+# ---------------------------------------------------------------------------
+# Parsing.
+# ---------------------------------------------------------------------------
+def _parse_setup(size):
+    from tests import grammar
+    return grammar, list(grammar.tokenize(grammar.make_source(size // 5)))
+
+
+@benchmark('parse.toy_grammar', _parse_setup)
+def parse(args):
+    grammar, items = args
+    grammar.Module.parse(iter(items))
+
+
+@benchmark('parse.toy_grammar_checkpoint', _parse_setup)
+def parse_checkpoint(args):
+    # Compare with parse.toy_grammar: checkpoints are asked for every
+    # 1000 items, and the default budget keeps their total cost under
+    # 5% of the parse, apart from the first snapshot's share. The toy
+    # grammar's handlers are cheap, so later snapshots rarely fit.
+    from treebie.syntaxnode.checkpoint import Checkpointer
+    grammar, items = args
+    grammar.Module.parse(iter(items), checkpoint=Checkpointer(every=1000))
+
+
+def _token_table_setup(size):
+    from tests import grammar
+    from treebie.syntaxnode.tokentable import TokenTable
+    source = grammar.make_source(size // 5)
+    return grammar, TokenTable.from_items(source, grammar.tokenize(source))
+
+
+@benchmark('parse.toy_grammar_table', _token_table_setup)
+def parse_token_table(args):
+    # The items are made from the table during the parse, so unlike
+    # parse.toy_grammar, the peak includes them while they're alive.
+    grammar, table = args
+    grammar.Module.parse(iter(table), token_table=table)
+
+
+def _parse_cache_setup(size):
+    from tests import grammar
+    from treebie.syntaxnode.cache import ParseCache
+    source = grammar.make_source(size // 5)
+    cache = ParseCache()
+    cache.parse(grammar.Module, source, grammar.tokenize)
+    return grammar, cache, source
+
+
+@benchmark('parse.toy_grammar_cache_hit', _parse_cache_setup)
+def parse_cache_hit(args):
+    # Hashes the source and rebuilds the tree; compare with
+    # parse.toy_grammar.
+    grammar, cache, source = args
+    cache.parse(grammar.Module, source, grammar.tokenize)
+
+
+def _corpus_setup(size):
+    from tests import grammar
+    from treebie.corpus import CorpusStore
+    source = grammar.make_source(size // 5)
+    tree = grammar.Module.parse(grammar.tokenize(source))
+    edited = grammar.Module.parse(grammar.tokenize('first = 0 ; ' + source))
+    store = CorpusStore()
+    store.put('toy', 'r1', tree)
+    return grammar, store, edited
+
+
+@benchmark('corpus.put_revision', _corpus_setup)
+def corpus_put(args):
+    # Hashes every node, but only writes the few changed subtrees.
+    grammar, store, edited = args
+    store.put('toy', 'r2', edited)
+
+
+@benchmark('corpus.get_revision', _corpus_setup)
+def corpus_get(args):
+    grammar, store, edited = args
+    store.get('toy', 'r1', grammar.Module)
+
+
+def _lex_setup(size):
+    from tests import grammar
+    return grammar.ToyLexer(), grammar.make_source(size // 5)
+
+
+@benchmark('lex.toy_grammar', _lex_setup)
+def lex(args):
+    # See benchmarks/lex.py for tokens per second over a big file.
+    lexer, source = args
+    for item in lexer.tokenize(source):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Running and comparing.
+# ---------------------------------------------------------------------------
+def run_one(setup, func, size, repeat, timer=time.perf_counter):
+    arg = size if setup is None else setup(size)
+    times = []
+    for _ in range(repeat):
+        start = timer()
+        func(arg)
+        times.append(timer() - start)
+
+    tracemalloc.start()
+    try:
+        func(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return dict(
+        best=min(times),
+        median=statistics.median(times),
+        peak_bytes=peak)
+
+
+def run(size, repeat, pattern=None, stream=sys.stdout):
+    results = {}
+    for name, setup, func in BENCHMARKS:
+        if pattern is not None and pattern not in name:
+            continue
+        result = run_one(setup, func, size, repeat)
+        results[name] = result
+        stream.write('%-28s best %10.3f ms  median %10.3f ms  peak %8d KiB\n' % (
+            name, result['best'] * 1e3, result['median'] * 1e3,
+            result['peak_bytes'] // 1024))
+    return dict(
+        meta=dict(
+            size=size,
+            repeat=repeat,
+            python=platform.python_version(),
+            implementation=platform.python_implementation(),
+            timestamp=time.time()),
+        results=results)
+
+
+def compare(baseline, current, threshold, stream=sys.stdout):
+    '''Return the names of benchmarks whose best time regressed by more
+    than ``threshold`` (a fraction) relative to the baseline.
+    '''
+    regressions = []
+    for name, result in sorted(current['results'].items()):
+        old = baseline['results'].get(name)
+        if old is None or not old['best']:
+            continue
+        ratio = result['best'] / old['best']
+        flag = ''
+        if 1 + threshold < ratio:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        stream.write('%-28s %6.2fx%s\n' % (name, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=10000,
+                        help='approximate node count per tree')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--filter', dest='pattern',
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('--output', help='write results to this json file')
+    parser.add_argument('--compare', help='baseline json file to compare to')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='allowed slowdown before failing, as a fraction')
+    args = parser.parse_args(argv)
+
+    current = run(args.size, args.repeat, args.pattern)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, current, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+'''Synthetic tree generators for the benchmarks.
+
+All generators are deterministic for a given seed, so results are
+comparable across runs.
+'''
+import random
+
+from treebie import Node
+
+
+class Module(Node):
+    pass
+
+
+class ClassDef(Node):
+    pass
+
+
+class FunctionDef(Node):
+    pass
+
+
+class Assign(Node):
+    pass
+
+
+class Call(Node):
+    pass
+
+
+class Name(Node):
+    pass
+
+
+class Constant(Node):
+    pass
+
+
+def wide(size):
+    '''A root with ``size`` leaf children.
+    '''
+    root = Module()
+    for i in range(size):
+        root.append(Name(id='n%d' % i))
+    return root
+
+
+def deep(size):
+    '''A single chain of ``size`` nodes.
+    '''
+    root = this = Module()
+    for i in range(size - 1):
+        this = this.append(Name(id='n%d' % i))
+    return root
+
+
+def balanced(size, fanout=4):
+    '''A complete tree with the given fanout and about ``size`` nodes.
+    '''
+    root = Module()
+    queue = [root]
+    count = 1
+    while count < size:
+        parent = queue.pop(0)
+        for i in range(fanout):
+            if count == size:
+                break
+            queue.append(parent.append(Name(id='n%d' % count)))
+            count += 1
+    return root
+
+
+def ast_like(size, seed=0):
+    '''A tree shaped like a Python module: classes containing functions
+    containing statements containing small expressions.
+    '''
+    rng = random.Random(seed)
+    root = Module(name='module')
+    count = 1
+    while count < size:
+        cls = root.append(ClassDef(name='C%d' % count))
+        count += 1
+        for _ in range(rng.randint(1, 8)):
+            func = cls.append(FunctionDef(name='f%d' % count))
+            count += 1
+            for _ in range(rng.randint(1, 12)):
+                stmt = func.append(Assign(target='v%d' % count))
+                call = stmt.append(Call(func='g'))
+                count += 2
+                for _ in range(rng.randint(0, 3)):
+                    call.append(Constant(value=rng.randint(0, 100)))
+                    count += 1
+                call.append(Name(id='v%d' % rng.randint(0, count)))
+                count += 1
+                if size <= count:
+                    return root
+    return root
+
+
+SHAPES = dict(wide=wide, deep=deep, balanced=balanced, ast=ast_like)
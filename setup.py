@@ -22,6 +22,9 @@ setup(**{
     "license": "MIT",
     "url": "http://twneale.github.com/treebie/",
     "platforms": ['any'],
+    "extras_require": {
+        "numpy": ["numpy"],
+        },
     "scripts": [
     ]
 })
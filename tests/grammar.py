@@ -0,0 +1,124 @@
+'''A toy statement grammar shared by the parser tests:
+
+    x = 1 ; { y = x 2 ; }
+'''
+import re
+from collections import namedtuple
+
+from hercules.tokentype import Token
+
+from treebie.journal import JournalMixin
+from treebie.syntaxnode import SyntaxNode, Lexer, matches, token_subtypes
+
+
+Item = namedtuple('Item', 'pos token text')
+
+_token_pattern = re.compile(r'''
+    \s*(?:
+    (?P<Number>\d+)|
+    (?P<Name>[A-Za-z_]\w*)|
+    (?P<Punctuation>[=;{}])
+    )''', re.VERBOSE)
+
+_tokentypes = dict(
+    Number=Token.Number.Integer,
+    Name=Token.Name,
+    Punctuation=Token.Punctuation)
+
+
+def tokenize(text):
+    pos = 0
+    while pos < len(text):
+        match = _token_pattern.match(text, pos)
+        if match is None or match.lastgroup is None:
+            break
+        kind = match.lastgroup
+        yield Item(match.start(kind), _tokentypes[kind], match.group(kind))
+        pos = match.end()
+
+
+class ToyLexer(Lexer):
+    '''The same tokens as ``tokenize``, from the built-in lexer.
+    '''
+    tokendefs = {
+        'root': [
+            (r'\s+', None),
+            (r'\d+', Token.Number.Integer),
+            (r'[A-Za-z_]\w*', Token.Name),
+            (r'[=;{}]', Token.Punctuation),
+            ],
+        }
+
+
+def make_source(statements, width=5):
+    '''Generate a program with the given number of statements, with
+    every ``width``-th statement opening a nested block.
+    '''
+    buf = []
+    depth = 0
+    for i in range(statements):
+        if i % width == width - 1:
+            buf.append('{')
+            depth += 1
+        buf.append('x%d = y %d ;' % (i, i))
+    buf.extend('}' * depth)
+    return ' '.join(buf)
+
+
+class Module(SyntaxNode):
+
+    @token_subtypes('Name')
+    def handle_name(self, *items):
+        return self.descend(Assign, *items)
+
+    @matches('{')
+    def handle_open(self, *items):
+        return self.descend(Block, *items)
+
+
+class Block(Module):
+
+    @matches('}')
+    def handle_close(self, *items):
+        self.extend(items)
+        return self.popstate()
+
+
+class Assign(SyntaxNode):
+
+    @matches('=')
+    def handle_equals(self, *items):
+        return self.extend(items)
+
+    @token_subtypes('Name')
+    def handle_name(self, *items):
+        return self.extend(items)
+
+    @token_subtypes('Number')
+    def handle_number(self, *items):
+        return self.extend(items)
+
+    @matches(';')
+    def handle_end(self, *items):
+        self.extend(items)
+        return self.popstate()
+
+
+class JAssign(JournalMixin, Assign):
+    pass
+
+
+class JModule(JournalMixin, Module):
+    '''The same grammar, with nodes that report to a journal.
+    '''
+    @token_subtypes('Name')
+    def handle_name(self, *items):
+        return self.descend(JAssign, *items)
+
+    @matches('{')
+    def handle_open(self, *items):
+        return self.descend(JBlock, *items)
+
+
+class JBlock(JModule, Block):
+    pass
@@ -1,6 +1,6 @@
 import unittest
 
-from treebie.syntaxnode import SyntaxNode as Node
+from treebie.syntaxnode import SyntaxNode as Node, matches, token_subtypes
 
 
 class TestDictFeatures:
@@ -52,3 +52,83 @@ class TestSyntaxHelpers:
         items = [(1, 2, 3), (4, 5, 6)]
         node = Node().descend('Child1', *items)
         assert node.first() == items[0]
+
+
+class TestDispatchInheritance:
+
+    def make_classes(self):
+        class Parent(Node):
+            @matches('a', 'b')
+            def handle_ab(self, *items):
+                return self
+
+            @token_subtypes('Number')
+            def handle_number(self, *items):
+                return self
+
+        class Child(Parent):
+            @matches('a', 'c')
+            def handle_ac(self, *items):
+                return self
+
+        class Sibling(Parent):
+            pass
+
+        return Parent, Child, Sibling
+
+    def test_signatures_are_hashable_tuples(self):
+        assert matches.make_signature(('a', 'b'), {}) == (('a', 'b'), ())
+
+    def test_unchanged_dispatch_data_is_shared(self):
+        Parent, Child, Sibling = self.make_classes()
+        assert Sibling._dispatch_data[matches] is Parent._dispatch_data[matches]
+        assert Child._dispatch_data[token_subtypes] is \
+            Parent._dispatch_data[token_subtypes]
+
+    def test_extended_trie_shares_untouched_branches(self):
+        Parent, Child, Sibling = self.make_classes()
+        parent_trie = Parent._dispatch_data[matches]._trie
+        child_trie = Child._dispatch_data[matches]._trie
+        assert child_trie is not parent_trie
+        assert child_trie['a']['b'] is parent_trie['a']['b']
+        assert 'c' in child_trie['a']
+        assert 'c' not in parent_trie['a']
+
+    def test_subclass_overrides_inherited_handler(self):
+        Parent, Child, Sibling = self.make_classes()
+
+        class Override(Parent):
+            @matches('a', 'b')
+            def handle_ab(self, *items):
+                return self
+
+        trie = Override._dispatch_data[matches]._trie
+        assert trie['a']['b'][0] is Override.__dict__['handle_ab']
+        trie = Parent._dispatch_data[matches]._trie
+        assert trie['a']['b'][0] is Parent.__dict__['handle_ab']
+
+    def test_override_in_diamond(self):
+        Parent, Child, Sibling = self.make_classes()
+
+        class Override(Parent):
+            @matches('a', 'b')
+            def handle_ab(self, *items):
+                return self
+
+        class Diamond(Override, Sibling):
+            pass
+
+        trie = Diamond._dispatch_data[matches]._trie
+        assert trie['a']['b'][0] is Override.__dict__['handle_ab']
+
+        # The MRO decides, even when the override is on a later base.
+        class Later(Sibling, Override):
+            pass
+
+        trie = Later._dispatch_data[matches]._trie
+        assert trie['a']['b'][0] is Override.__dict__['handle_ab']
+
+    def test_unhashable_arguments(self):
+        signature = matches.make_signature(('a',), {'x': [1, {'y': 2}]})
+        assert signature == (('a',), (('x', (1, (('y', 2),))),))
+        hash(signature)
@@ -0,0 +1,96 @@
+import pytest
+
+from treebie.syntaxnode.checkpoint import Checkpoint, Checkpointer
+from tests import grammar
+
+
+SOURCE = grammar.make_source(60)
+LEXER = grammar.ToyLexer()
+
+
+def parse(**options):
+    return grammar.Module.parse(LEXER.tokenize(SOURCE), **options)
+
+
+class TestCheckpoint:
+
+    def test_resume_at_offset(self):
+        checkpointer = Checkpointer(every=50, max_overhead=1e6)
+        tree = parse(checkpoint=checkpointer)
+        assert 1 < checkpointer.count
+        checkpoint = checkpointer.last
+        assert 0 < checkpoint.position
+        items = LEXER.tokenize(SOURCE, pos=checkpoint.offset)
+        resumed = grammar.Module.parse(items, resume=checkpoint)
+        assert resumed == tree
+
+    def test_resume_by_skipping(self):
+        checkpointer = Checkpointer(every=75, max_overhead=1e6)
+        tree = parse(checkpoint=checkpointer)
+        checkpoint = checkpointer.last
+        items = checkpoint.skip(grammar.tokenize(SOURCE))
+        assert grammar.Module.parse(items, resume=checkpoint) == tree
+
+    def test_saved_to_file(self, tmp_path):
+        path = str(tmp_path / 'parse.ckpt')
+        checkpointer = Checkpointer(path, every=100, max_overhead=1e6)
+        tree = parse(checkpoint=checkpointer)
+        checkpoint = Checkpoint.load(path)
+        assert checkpoint.position == checkpointer.last.position
+        assert checkpoint.path == checkpointer.last.path
+        items = LEXER.tokenize(SOURCE, pos=checkpoint.offset)
+        assert grammar.Module.parse(items, resume=checkpoint) == tree
+
+    def test_positions_after_resume(self):
+        items = list(LEXER.tokenize(SOURCE))
+        first = Checkpointer(every=100, max_overhead=1e6)
+        grammar.Module.parse(iter(items[:150]), checkpoint=first)
+        early = Checkpoint.loads(first.last.dumps())
+        second = Checkpointer(every=100, max_overhead=1e6)
+        grammar.Module.parse(
+            LEXER.tokenize(SOURCE, pos=early.offset),
+            resume=early, checkpoint=second)
+        # Positions count from the start of the whole input.
+        position = second.last.position
+        assert early.position + 100 <= position
+        pos, _, text = items[position - 1]
+        assert second.last.offset == pos + len(text)
+
+    @pytest.mark.parametrize('max_overhead', [0.05, 0.3, 0.5])
+    def test_overhead_is_bounded(self, monkeypatch, max_overhead):
+        # Fake time: each item takes 1 to parse, and a snapshot 0.2 per
+        # item consumed so far, so snapshots get dearer as the parse
+        # goes on.
+        clock = [0.0]
+        take = Checkpoint.take.__func__
+
+        def slow_take(cls, node, itemstream, base=0):
+            clock[0] += 0.2 * (base + itemstream.i)
+            return take(cls, node, itemstream, base)
+        monkeypatch.setattr(Checkpoint, 'take', classmethod(slow_take))
+
+        def items():
+            for item in LEXER.tokenize(SOURCE * 5):
+                clock[0] += 1
+                yield item
+
+        checkpointer = Checkpointer(
+            every=20, max_overhead=max_overhead, timer=lambda: clock[0])
+        grammar.Module.parse(items(), checkpoint=checkpointer)
+        assert 1 <= checkpointer.count
+        assert checkpointer.elapsed <= max_overhead * clock[0]
+        if max_overhead < 0.2:
+            # A snapshot always costs more than the budget allows.
+            assert checkpointer.count == 1
+        else:
+            assert 1 < checkpointer.count
+
+    def test_file_is_data(self, tmp_path):
+        path = str(tmp_path / 'parse.ckpt')
+        parse(checkpoint=Checkpointer(path, every=100, max_overhead=1e6))
+        with open(path, 'rb') as f:
+            assert f.read().startswith(b'[2,')
+        with open(path, 'wb') as f:
+            f.write(b'[1,2,3]')
+        with pytest.raises(ValueError):
+            Checkpoint.load(path)
@@ -0,0 +1,103 @@
+import pytest
+
+from treebie import Node
+from treebie import columnar
+
+np = pytest.importorskip('numpy')
+
+from treebie.columnar import Columns
+
+
+class Module(Node):
+    pass
+
+
+class FunctionDef(Node):
+    pass
+
+
+class Call(Node):
+    pass
+
+
+class Name(Node):
+    pass
+
+
+def make_module(name, funcs):
+    root = Module(name=name)
+    for i, calls in enumerate(funcs):
+        func = root.append(FunctionDef(name='f%d' % i, lineno=i * 10))
+        for j in range(calls):
+            call = func.append(Call(name='g', nargs=j))
+            call.append(Name(name='x'))
+    return root
+
+
+@pytest.fixture
+def trees():
+    return [make_module('a', [1, 2]), make_module('b', [0, 3])]
+
+
+@pytest.fixture
+def cols(trees):
+    return Columns.from_trees(trees, attrs=('name', 'nargs', 'lineno'))
+
+
+class TestColumns:
+
+    def test_columns(self, trees, cols):
+        rows = [node for tree in trees for node in tree.depth_first()]
+        assert cols.nodes_for(np.arange(len(cols))) == rows
+        assert len(cols) == len(rows) == 18
+        assert [cols.type_names[code] for code in cols.types] == [
+            node.get_nodekey() for node in rows]
+        assert cols.child_counts.tolist() == [
+            len(node.children) for node in rows]
+        for row, node in enumerate(rows):
+            parent = cols.parents[row]
+            if getattr(node, 'parent', None) is None:
+                assert parent == -1
+            else:
+                assert rows[parent] is node.parent
+        assert cols.trees.tolist().count(0) == 9
+        assert cols.roots().sum() == 2
+
+    def test_attr_columns(self, cols):
+        assert cols.attrs['name'].dtype == object
+        assert cols.attrs['nargs'].dtype.kind == 'f'
+        assert np.isnan(cols.attrs['nargs'][0])
+        assert cols.group_counts('nargs') == {0: 3, 1: 2, 2: 1}
+        assert cols.group_counts('name')['g'] == 6
+
+    def test_queries(self, trees, cols):
+        assert cols.group_counts() == {
+            'Module': 2, 'FunctionDef': 4, 'Call': 6, 'Name': 6}
+        mask = cols.mask('FunctionDef', name='f1')
+        assert [node['name'] for node in cols.nodes_for(mask)] == ['f1', 'f1']
+        calls = cols.mask('Call') & cols.within(mask)
+        assert len(cols.nodes_for(calls)) == 5
+        assert cols.depth_histogram().tolist() == [2, 4, 6, 6]
+
+    def test_within(self, trees, cols):
+        root_b = int(np.flatnonzero(cols.roots())[1])
+        inside = cols.within(cols.roots() & (cols.trees == 1))
+        assert inside.sum() == len(list(trees[1].depth_first())) - 1
+        assert not inside[root_b]
+        assert cols.within(cols.mask('Name')).sum() == 0
+        nested = cols.within(cols.mask('Module') | cols.mask('Call'))
+        assert nested.sum() == len(cols) - 2
+        assert (cols.subtree_mask(root_b) ==
+                cols.within(cols.roots() & (cols.trees == 1),
+                            include_self=True)).all()
+
+    def test_subtree_sizes(self, trees, cols):
+        sizes = cols.subtree_sizes().tolist()
+        assert sizes[0] == len(list(trees[0].depth_first()))
+        assert sizes[cols.child_counts.tolist().index(0)] == 1
+
+
+def test_requires_numpy(monkeypatch):
+    monkeypatch.setattr(columnar, 'np', None)
+    with pytest.raises(ImportError):
+        Columns.from_tree(Module())
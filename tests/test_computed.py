@@ -0,0 +1,136 @@
+from treebie.computed import ComputedNode, synthesized, inherited
+
+
+class Scoped(ComputedNode):
+
+    calls = None
+
+    @synthesized
+    def size(self):
+        self.calls.append(('size', self))
+        return 1 + sum(child.size for child in self.children)
+
+    @synthesized
+    def names(self):
+        return sorted(child['name'] for child in self.children
+                      if 'name' in child)
+
+    @inherited
+    def scope(self):
+        self.calls.append(('scope', self))
+        parent = getattr(self, 'parent', None)
+        if parent is None:
+            return ()
+        if 'name' in parent:
+            return parent.scope + (parent['name'],)
+        return parent.scope
+
+
+def make_tree():
+    Scoped.calls = []
+    root = Scoped()
+    a = root.append(Scoped(name='a'))
+    b = root.append(Scoped(name='b'))
+    a1 = a.append(Scoped())
+    a2 = a.append(Scoped(name='x'))
+    a21 = a2.append(Scoped())
+    b1 = b.append(Scoped())
+    return root, dict(a=a, b=b, a1=a1, a2=a2, a21=a21, b1=b1)
+
+
+def recomputed(name):
+    nodes = [node for attr, node in Scoped.calls if attr == name]
+    del Scoped.calls[:]
+    return nodes
+
+
+class TestSynthesized:
+
+    def test_memoized(self):
+        root, nodes = make_tree()
+        assert root.size == 7
+        assert len(recomputed('size')) == 7
+        assert root.size == 7
+        assert nodes['a'].size == 4
+        assert recomputed('size') == []
+
+    def test_append_invalidates_ancestors_only(self):
+        root, nodes = make_tree()
+        root.size
+        recomputed('size')
+        nodes['a21'].append(Scoped())
+        assert root.size == 8
+        changed = recomputed('size')
+        assert set(map(id, changed)) == set(map(id, [
+            root, nodes['a'], nodes['a2'], nodes['a21'], nodes['a21'].children[0]]))
+
+    def test_detatch_invalidates_old_parent(self):
+        root, nodes = make_tree()
+        root.size
+        nodes['a2'].detatch()
+        assert root.size == 5
+        assert nodes['a2'].size == 2
+        nodes['b'].append(nodes['a2'])
+        assert root.size == 7
+        assert nodes['a'].size == 2
+        assert nodes['b'].size == 4
+
+    def test_child_dict_change(self):
+        root, nodes = make_tree()
+        assert root.names == ['a', 'b']
+        nodes['a']['name'] = 'c'
+        assert root.names == ['b', 'c']
+        del nodes['b']['name']
+        assert root.names == ['c']
+        nodes['b'].update(name='d')
+        assert root.names == ['c', 'd']
+
+
+class TestInherited:
+
+    def test_values(self):
+        root, nodes = make_tree()
+        assert nodes['a21'].scope == ('a', 'x')
+        assert nodes['b1'].scope == ('b',)
+        assert root.scope == ()
+
+    def test_dict_change_invalidates_descendants_only(self):
+        root, nodes = make_tree()
+        for node in root.depth_first():
+            node.scope
+        recomputed('scope')
+        nodes['a']['name'] = 'z'
+        assert nodes['a21'].scope == ('z', 'x')
+        assert nodes['b1'].scope == ('b',)
+        for node in root.depth_first():
+            node.scope
+        changed = recomputed('scope')
+        assert set(map(id, changed)) == set(map(id, [
+            nodes['a'], nodes['a1'], nodes['a2'], nodes['a21']]))
+
+    def test_move_invalidates_subtree(self):
+        root, nodes = make_tree()
+        assert nodes['a21'].scope == ('a', 'x')
+        nodes['a2'].detatch()
+        nodes['b'].append(nodes['a2'])
+        assert nodes['a21'].scope == ('b', 'x')
+
+    def test_direct_edits_need_invalidate(self):
+        root, nodes = make_tree()
+        assert root.size == 7
+        nodes['b'].children.append(Scoped())
+        assert root.size == 7
+        nodes['b'].invalidate()
+        assert root.size == 8
+
+
+class TestEvaluate:
+
+    def test_deep_tree(self):
+        Scoped.calls = []
+        root = this = Scoped(name='root')
+        for i in range(5000):
+            this = this.append(Scoped())
+        assert root.evaluate('size') == 5001
+        assert this.evaluate('scope') == ('root',)
+        assert this.size == 1
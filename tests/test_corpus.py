@@ -0,0 +1,92 @@
+import pytest
+
+from treebie import Node
+from treebie.corpus import CorpusStore, encode_tree
+from tests import grammar
+
+
+SOURCE = grammar.make_source(40)
+
+
+def parse(source):
+    return grammar.Module.parse(grammar.tokenize(source))
+
+
+def _tokens(tree):
+    stack = [tree]
+    tokens = []
+    while stack:
+        node = stack.pop()
+        tokens.append(list(node.tokens))
+        stack.extend(reversed(node.children))
+    return tokens
+
+
+class TestCorpusStore:
+
+    def test_round_trip(self):
+        tree = parse(SOURCE)
+        store = CorpusStore()
+        store.put('a.toy', 'r1', tree)
+        loaded = store.get('a.toy', 'r1', grammar.Module)
+        assert loaded == tree
+        assert loaded is not tree
+        assert _tokens(loaded) == _tokens(tree)
+        assert loaded.children[0].parent is loaded
+
+    def test_shifted_subtrees_are_shared(self):
+        store = CorpusStore()
+        store.put('a.toy', 'r1', parse(SOURCE))
+        before = store.stats()['subtrees']
+        # Prepending a statement moves every later token but only
+        # changes the subtrees on the path to it.
+        edited = parse('first = 0 ; ' + SOURCE)
+        store.put('a.toy', 'r2', edited)
+        added = store.stats()['subtrees'] - before
+        assert added < 5
+        assert _tokens(store.get('a.toy', 'r2', grammar.Module)) == (
+            _tokens(edited))
+
+    def test_identical_trees_stored_once(self):
+        store = CorpusStore()
+        store.put('a.toy', 'r1', parse(SOURCE))
+        stats = store.stats()
+        store.put('b.toy', 'r1', parse(SOURCE))
+        assert store.stats()['subtrees'] == stats['subtrees']
+        assert store.stats()['revisions'] == 2
+        assert store.revisions() == [('a.toy', 'r1'), ('b.toy', 'r1')]
+        assert store.revisions('b.toy') == [('b.toy', 'r1')]
+
+    def test_hash_ignores_identity(self):
+        assert encode_tree(parse(SOURCE))[0] == encode_tree(parse(SOURCE))[0]
+        assert encode_tree(parse(SOURCE))[0] != (
+            encode_tree(parse(SOURCE + ' z = 1 ;'))[0])
+
+    def test_bulk_api(self, tmp_path):
+        path = str(tmp_path / 'corpus.db')
+        trees = dict(
+            ('r%d' % n, parse(grammar.make_source(n + 1))) for n in range(5))
+        with CorpusStore(path) as store:
+            grammar.Module.export_corpus(
+                store, (('a.toy', rev, tree) for rev, tree in trees.items()))
+        with CorpusStore(path) as store:
+            loaded = grammar.Module.import_corpus(
+                store, [('a.toy', rev) for rev in trees])
+            for name, rev, tree in loaded:
+                assert tree == trees[rev]
+            tree = grammar.Module.from_corpus(store, 'a.toy', 'r2')
+            assert tree == trees['r2']
+            tree.to_corpus(store, 'a.toy', 'r2')
+            assert store.stats()['revisions'] == 5
+
+    def test_plain_nodes(self):
+        tree = Node(dict(name='root'))
+        tree.append(Node(dict(value=[1, 2])))
+        tree.append(Node())
+        store = CorpusStore()
+        tree.to_corpus(store, 'tree', 1)
+        assert Node.from_corpus(store, 'tree', 1) == tree
+
+    def test_missing(self):
+        with pytest.raises(KeyError):
+            CorpusStore().get('a.toy', 'r1')
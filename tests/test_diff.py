@@ -0,0 +1,152 @@
+import random
+from collections import namedtuple
+
+from hercules.tokentype import Token
+
+from treebie import Node
+from treebie.syntaxnode import SyntaxNode
+from treebie.diff import diff, Move, Update, Replace
+
+
+class A(Node):
+    pass
+
+
+class B(Node):
+    pass
+
+
+class Leaf(SyntaxNode):
+    pass
+
+
+Item = namedtuple('Item', 'pos token text')
+
+
+def make_tree(size=100, seed=0):
+    rng = random.Random(seed)
+    nodes = [A(i=0)]
+    for i in range(1, size):
+        cls = rng.choice((A, B))
+        nodes.append(rng.choice(nodes).append(cls(i=i)))
+    return nodes[0]
+
+
+def mutate(root, edits, seed):
+    rng = random.Random(seed)
+    for _ in range(edits):
+        nodes = list(root.depth_first())
+        node = rng.choice(nodes)
+        action = rng.choice(('insert', 'delete', 'move', 'update'))
+        if action == 'insert':
+            node.insert(rng.randint(0, len(node.children)), B(new=True))
+        elif action == 'update':
+            node['changed'] = rng.random()
+        elif node is not root:
+            if action == 'delete':
+                node.detatch()
+            else:
+                node.detatch()
+                nodes = list(root.depth_first())
+                target = rng.choice(nodes)
+                target.insert(rng.randint(0, len(target.children)), node)
+
+
+class TestDiff:
+
+    def test_identical_trees(self):
+        old = make_tree()
+        assert diff(old, old.clone()) == []
+
+    def test_random_edits(self):
+        for seed in range(30):
+            old = make_tree(seed=seed)
+            new = old.clone()
+            mutate(new, 5, seed)
+            script = diff(old, new)
+            root = script.apply()
+            assert root is old
+            assert old == new
+
+    def test_small_edits_give_small_scripts(self):
+        old = make_tree(size=500)
+        new = old.clone()
+        mutate(new, 3, 1)
+        assert len(diff(old, new)) <= 10
+
+    def test_operations(self):
+        old = A()
+        x = old.append(B(name='x'))
+        x.append(A(name='moved', payload=list(range(5))))
+        x.append(A(name='stays'))
+        old.append(B(name='y'))
+        old.append(B(name='gone'))
+
+        new = old.clone()
+        moved = new.children[0].children[0]
+        moved.detatch()
+        new.children[1].append(moved)
+        new.children[1]['name'] = 'z'
+        new.children[2].detatch()
+        new.append(A(name='new'))
+
+        script = diff(old, new)
+        kinds = sorted(type(op).__name__ for op in script)
+        assert kinds == ['Delete', 'Insert', 'Move', 'Update']
+        move, = [op for op in script if isinstance(op, Move)]
+        assert move.node['name'] == 'moved'
+        assert script.apply() == new
+
+    def test_children_guide_pairing(self):
+        old = A()
+        old.append(B(name='x'))
+        old.append(B(name='y')).append(A(name='kid', unique=True))
+        new = A()
+        new.append(B(name='y2')).append(A(name='kid', unique=True))
+        script = diff(old, new)
+        assert not [op for op in script if isinstance(op, Move)]
+        assert script.apply() == new
+
+    def test_root_matches_old_child(self):
+        # The new root hashes like an old child; it's still paired
+        # with the old root, not with the child.
+        old = A(v=0)
+        old.append(A(v=0))
+        old.append(B(v=1))
+        old.append(B(v=0))
+        new = A(v=0)
+        script = diff(old, new)
+        assert len(script) == 3
+        assert script.apply() == new
+
+    def test_repeated_values(self):
+        for seed in range(300):
+            rng = random.Random(seed)
+            trees = []
+            for _ in range(2):
+                nodes = [rng.choice((A, B))(v=rng.randint(0, 1))]
+                for _ in range(rng.randint(0, 7)):
+                    node = rng.choice((A, B))(v=rng.randint(0, 1))
+                    nodes.append(rng.choice(nodes).append(node))
+                trees.append(nodes[0])
+            old, new = trees
+            assert diff(old, new).apply() == new
+
+    def test_replace_root(self):
+        old = A()
+        new = B()
+        new.append(A())
+        script = diff(old, new)
+        assert isinstance(script[0], Replace)
+        assert script.apply() == new
+
+    def test_token_positions_updated(self):
+        old = Leaf()
+        old.append(Leaf()).extend([Item(0, Token.Name, 'a')])
+        old.append(Leaf()).extend([Item(2, Token.Name, 'b')])
+        new = Leaf()
+        new.append(Leaf()).extend([Item(0, Token.Name, 'aa')])
+        new.append(Leaf()).extend([Item(3, Token.Name, 'b')])
+        script = diff(old, new)
+        assert all(isinstance(op, Update) for op in script)
+        assert script.apply() == new
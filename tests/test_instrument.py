@@ -0,0 +1,51 @@
+import io
+
+from treebie.syntaxnode import ParseProfiler
+
+from tests.grammar import Module, tokenize
+
+
+SOURCE = 'a = 1 ; { b = a 2 ; c = 3 } d = 4 ;'
+
+
+class TestParseProfiler:
+
+    def parse(self):
+        profiler = ParseProfiler()
+        tree = Module.parse(tokenize(SOURCE), instrument=profiler)
+        return tree, profiler
+
+    def test_same_tree_as_plain_parse(self):
+        tree, profiler = self.parse()
+        assert tree == Module.parse(tokenize(SOURCE))
+
+    def test_token_count(self):
+        tree, profiler = self.parse()
+        assert profiler.tokens == len(list(tokenize(SOURCE)))
+        assert profiler.tokens_per_second > 0
+
+    def test_dispatch_counts(self):
+        tree, profiler = self.parse()
+        summary = profiler.summary()
+        hits = sum(row['hits'] for row in summary['dispatchers'])
+        calls = sum(row['calls'] for row in summary['handlers'])
+        assert hits == calls == profiler.tokens
+        for row in summary['dispatchers']:
+            assert row['hits'] <= row['attempts']
+
+    def test_propagation_depths(self):
+        '''The unterminated "c = 3" statement passes the "}" up
+        to its block.
+        '''
+        tree, profiler = self.parse()
+        assert profiler.depths[1] == 1
+        assert sum(profiler.depths.values()) == profiler.tokens
+
+    def test_collapsed_stacks(self):
+        tree, profiler = self.parse()
+        buf = io.StringIO()
+        profiler.dump_collapsed(buf)
+        lines = buf.getvalue().splitlines()
+        stacks = [line.rsplit(' ', 1)[0] for line in lines]
+        assert 'Module;Block;Block.handle_close' in stacks
+        assert 'Module;Module.handle_open' in stacks
@@ -0,0 +1,75 @@
+import random
+
+from treebie import Node
+from treebie.intervals import IntervalNode
+
+
+class ClassDef(IntervalNode):
+    pass
+
+
+class FunctionDef(IntervalNode):
+    pass
+
+
+class Name(IntervalNode):
+    pass
+
+
+def make_tree(size=300, seed=0):
+    rng = random.Random(seed)
+    types = (ClassDef, FunctionDef, Name)
+    nodes = [ClassDef(i=0)]
+    for i in range(1, size):
+        parent = rng.choice(nodes)
+        nodes.append(parent.append(rng.choice(types)(i=i, even=i % 2 == 0)))
+    return nodes
+
+
+class TestIntervalNode:
+
+    def check(self, nodes):
+        rng = random.Random(1)
+        for node in rng.sample(nodes, 30):
+            for nodekey in ('ClassDef', 'FunctionDef', 'Name', 'Missing'):
+                expected = list(Node.find(node, nodekey))
+                assert list(node.find(nodekey)) == expected
+            expected = list(Node.find(node, 'Name', even=True))
+            assert list(node.find('Name', even=True)) == expected
+            assert node.find_one('Name') is next(
+                iter(Node.find(node, 'Name')), None)
+        for _ in range(300):
+            a, b = rng.choice(nodes), rng.choice(nodes)
+            assert a.is_ancestor_of(b) == Node.is_ancestor_of(a, b)
+
+    def test_matches_walking(self):
+        self.check(make_tree())
+
+    def test_interval(self):
+        root = ClassDef()
+        a = root.append(FunctionDef())
+        a.append(Name())
+        b = root.append(Name())
+        assert root.interval() == (0, 3)
+        assert a.interval() == (1, 2)
+        assert b.interval() == (3, 3)
+
+    def test_refreshed_after_mutations(self):
+        nodes = make_tree()
+        self.check(nodes)
+        rng = random.Random(2)
+        for _ in range(10):
+            node = rng.choice(nodes[1:])
+            node.detatch()
+            assert list(node.find('Name')) == list(Node.find(node, 'Name'))
+            target = rng.choice(nodes)
+            if target is node or node.is_ancestor_of(target):
+                target = nodes[0]
+            target.insert(0, node)
+            self.check(nodes)
+
+    def test_max_depth_falls_back(self):
+        root = ClassDef()
+        root.append(FunctionDef()).append(FunctionDef())
+        assert len(list(root.find('FunctionDef', max_depth=1))) == 1
+        assert len(list(root.find('FunctionDef'))) == 2
@@ -0,0 +1,150 @@
+import pytest
+
+from treebie.journal import (
+    Journal, JournalNode,
+    ChildInserted, ChildRemoved, MISSING)
+from treebie.node import BaseNode
+from tests import grammar
+
+
+class Other(JournalNode):
+    pass
+
+
+def make_tree():
+    root = JournalNode(name='root')
+    for name in 'abc':
+        child = root.append(JournalNode(name=name))
+        child.append(JournalNode(name=name + '1'))
+    return root
+
+
+def shape(node):
+    return (dict(node), [shape(child) for child in node.children])
+
+
+def check_parents(root):
+    for node in root.depth_first():
+        for child in node.children:
+            assert child.parent is node
+
+
+class TestJournal:
+
+    def test_structural_changes(self):
+        root = make_tree()
+        journal = Journal(root)
+        a, b, c = root.children
+        new = a.append(JournalNode(name='a2'))
+        root.insert(-1, JournalNode(name='x'))
+        b.detatch()
+        kinds = [type(change) for change in journal.entries]
+        assert kinds == [ChildInserted, ChildInserted, ChildRemoved]
+        assert journal.entries[0].child is new
+        assert journal.entries[1].index == 2
+        assert journal.entries[2].index == 1
+        # Nodes attached later report to the same journal.
+        new['name'] = 'a3'
+        assert journal.entries[-1].node is new
+
+    def test_value_changes(self):
+        root = make_tree()
+        journal = Journal(root)
+        root['name'] = 'top'
+        root.update(x=1)
+        root.setdefault('y', 2)
+        root.setdefault('y', 3)
+        assert root.pop('x') == 1
+        assert root.pop('missing', None) is None
+        del root['y']
+        assert [(c.key, c.old, c.new) for c in journal.entries] == [
+            ('name', 'root', 'top'),
+            ('x', MISSING, 1),
+            ('y', MISSING, 2),
+            ('x', 1, MISSING),
+            ('y', 2, MISSING),
+            ]
+
+    def test_rollback(self):
+        root = make_tree()
+        before = shape(root)
+        journal = Journal(root)
+        seen = []
+        journal.subscribe(seen.append)
+        mark = journal.checkpoint()
+        a, b, c = root.children
+        b.swap_type(Other)
+        c.detatch()
+        a['name'] = 'changed'
+        a.clear()
+        root.children[0].append(JournalNode(name='new'))
+        assert shape(root) != before
+        count = len(journal.entries)
+        assert seen == journal.entries
+
+        journal.rollback(mark)
+        assert shape(root) == before
+        assert [type(node) for node in root.children] == [JournalNode] * 3
+        assert root.children[1] is b
+        check_parents(root)
+        assert journal.entries == []
+        # Subscribers see the inverse of each undone change.
+        assert len(seen) == 2 * count
+        assert isinstance(seen[count], ChildRemoved)
+
+    def test_partial_rollback(self):
+        root = make_tree()
+        journal = Journal(root)
+        root['name'] = 'one'
+        mark = journal.checkpoint()
+        root['name'] = 'two'
+        root.children[0].detatch()
+        journal.rollback(mark)
+        assert root['name'] == 'one'
+        assert len(root.children) == 3
+        assert len(journal.since(0)) == 1
+
+    def test_keep_false(self):
+        root = make_tree()
+        seen = []
+        journal = Journal(root, keep=False)
+        journal.subscribe(seen.append)
+        root['name'] = 'x'
+        assert journal.entries == []
+        assert len(seen) == 1
+        journal.unsubscribe(seen.append)
+        root['name'] = 'y'
+        assert len(seen) == 1
+
+    def test_no_journal(self):
+        root = make_tree()
+        root.children[0].detatch()
+        root['name'] = 'x'
+        assert root.journal is None
+
+
+class TestParseJournal:
+
+    def test_parse_records(self):
+        journal = Journal()
+        source = 'a = 1 ; { b = 2 ; } c = 3 ;'
+        tree = grammar.JModule.parse(grammar.tokenize(source), journal=journal)
+        assert tree.journal is journal
+        inserted = [change.child for change in journal.entries]
+        assert inserted == list(tree.depth_first())[1:]
+        assert isinstance(tree.children[1], grammar.JBlock)
+        assert tree.children[1].children
+        journal.rollback()
+        assert tree.children == []
+
+    def test_plain_nodes_rejected(self):
+        with pytest.raises(TypeError):
+            grammar.Module.parse(grammar.tokenize('a = 1 ;'),
+                                 journal=Journal())
+        root = JournalNode()
+        Journal(root)
+        with pytest.raises(TypeError):
+            root.append(BaseNode())
+        assert root.children == []
+        with pytest.raises(TypeError):
+            Journal(JournalNode()).attach(BaseNode())
@@ -0,0 +1,97 @@
+import mmap
+import tempfile
+
+import pytest
+from hercules.tokentype import Token
+
+from treebie.syntaxnode import Lexer, LexError, include
+from tests import grammar
+from tests.grammar import ToyLexer
+
+
+class StringLexer(Lexer):
+    tokendefs = {
+        'whitespace': [
+            (r'\s+', None),
+            ],
+        'root': [
+            include('whitespace'),
+            (r'\w+', Token.Name),
+            (r'"', Token.String.Begin, 'string'),
+            (r'\(', Token.Punctuation, '#push'),
+            (r'\)', Token.Punctuation, '#pop'),
+            ],
+        'string': [
+            (r'[^"\\$]+', Token.String),
+            (r'\\.', Token.String.Escape),
+            (r'\$\(', Token.Punctuation, 'root'),
+            (r'"', Token.String.End, '#pop'),
+            ],
+        }
+
+
+def summary(items):
+    return [(token, text) for pos, token, text in items]
+
+
+class TestLexer:
+
+    def test_matches_toy_tokenizer(self):
+        source = grammar.make_source(30)
+        items = list(ToyLexer().tokenize(source))
+        assert items == list(grammar.tokenize(source))
+        assert ToyLexer.compiled()['root'].regex.groupindex
+        tree = grammar.Module.parse(ToyLexer().tokenize(source))
+        assert tree == grammar.Module.parse(grammar.tokenize(source))
+
+    def test_tokentype_names(self):
+        class Named(Lexer):
+            tokendefs = {'root': [(r'\w+', 'Name.Builtin')]}
+        assert summary(Named().tokenize('x')) == [(Token.Name.Builtin, 'x')]
+
+    def test_states(self):
+        source = 'say "a\\"b $(x) c" done'
+        assert summary(StringLexer().tokenize(source)) == [
+            (Token.Name, 'say'),
+            (Token.String.Begin, '"'),
+            (Token.String, 'a'),
+            (Token.String.Escape, '\\"'),
+            (Token.String, 'b '),
+            (Token.Punctuation, '$('),
+            (Token.Name, 'x'),
+            (Token.Punctuation, ')'),
+            (Token.String, ' c'),
+            (Token.String.End, '"'),
+            (Token.Name, 'done'),
+            ]
+
+    def test_binary_sources(self):
+        source = b'x1 = y 2 ; { z = 3 ; }'
+        expected = [(pos, token, text.encode())
+                    for pos, token, text in ToyLexer().tokenize(
+                        source.decode())]
+        assert list(ToyLexer().tokenize(source)) == expected
+        assert list(ToyLexer().tokenize(memoryview(source))) == expected
+        with tempfile.TemporaryFile() as fp:
+            fp.write(source)
+            fp.flush()
+            mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                assert list(ToyLexer().tokenize(mapped)) == expected
+            finally:
+                mapped.close()
+
+    def test_errors(self):
+        items = ToyLexer().tokenize('a = 1 ; @ b')
+        assert next(items).text == 'a'
+        with pytest.raises(LexError):
+            list(items)
+        items = list(ToyLexer().tokenize('a @ b', errors='emit'))
+        assert summary(items) == [
+            (Token.Name, 'a'), (Token.Error, '@'), (Token.Name, 'b')]
+
+    def test_empty_match(self):
+        class Empty(Lexer):
+            tokendefs = {'root': [(r'\d*', Token.Number)]}
+        with pytest.raises(LexError):
+            list(Empty().tokenize('x'))
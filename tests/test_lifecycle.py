@@ -0,0 +1,127 @@
+import gc
+import weakref
+
+import pytest
+
+from treebie import Node
+from treebie.lifecycle import WeakParentNode, WeakParentMixin, gc_paused
+from treebie.syntaxnode import SyntaxNode, matches, token_subtypes
+from tests import grammar
+
+
+@pytest.fixture
+def no_gc():
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def build(node_cls, size=20):
+    root = node_cls(name='root')
+    for i in range(size):
+        child = root.append(node_cls(name='c%d' % i))
+        child.append(node_cls(name='leaf'))
+    return root
+
+
+class WStart(WeakParentMixin, SyntaxNode):
+
+    @token_subtypes('Name')
+    def handle_name(self, *items):
+        return self.descend(WStatement, *items)
+
+
+class WStatement(WeakParentMixin, SyntaxNode):
+
+    @token_subtypes('Name')
+    def handle_name(self, *items):
+        return self.extend(items)
+
+    @matches(';')
+    def handle_end(self, *items):
+        self.extend(items)
+        return self.popstate()
+
+
+class TestWeakParents:
+
+    def test_parent_links(self):
+        root = build(WeakParentNode)
+        leaf = root.children[3].children[0]
+        assert leaf.parent is root.children[3]
+        assert leaf.getroot() is root
+        assert leaf.getdepth() == 2
+        leaf.detatch()
+        assert not hasattr(leaf, 'parent')
+
+    def test_freed_without_collection(self, no_gc):
+        root = build(WeakParentNode)
+        leaf = root.children[-1].children[0]
+        ref = weakref.ref(root)
+        del root
+        assert ref() is None
+        assert not hasattr(leaf, 'parent')
+
+    def test_parse_keeps_the_root(self, no_gc):
+        tree = WStart.parse(grammar.tokenize('a b ; c ;'))
+        assert isinstance(tree, WStart)
+        assert [len(child.tokens) for child in tree.children] == [3, 2]
+        assert tree.children[0].parent is tree
+
+
+class TestDispose:
+
+    def test_cycles_need_collection(self, no_gc):
+        root = build(Node)
+        ref = weakref.ref(root.children[0].children[0])
+        del root
+        assert ref() is not None
+        gc.collect()
+        assert ref() is None
+
+    def test_dispose(self, no_gc):
+        root = build(Node)
+        ref = weakref.ref(root.children[0].children[0])
+        root.dispose()
+        del root
+        assert ref() is None
+
+    def test_dispose_subtree(self):
+        root = build(Node, size=3)
+        branch = root.children[1]
+        branch.dispose()
+        assert len(root.children) == 2
+        assert dict(branch) == {}
+        assert not hasattr(branch, 'parent')
+
+
+class TestGCPaused:
+
+    def test_nesting(self):
+        enabled = gc.isenabled()
+        gc.enable()
+        try:
+            with gc_paused():
+                with gc_paused():
+                    assert not gc.isenabled()
+                assert not gc.isenabled()
+            assert gc.isenabled()
+            gc.disable()
+            with gc_paused():
+                pass
+            assert not gc.isenabled()
+        finally:
+            if enabled:
+                gc.enable()
+
+    def test_parse_option(self):
+        source = grammar.make_source(20)
+        items = list(grammar.tokenize(source))
+        enabled = gc.isenabled()
+        tree = grammar.Module.parse(iter(items), pause_gc=True)
+        assert gc.isenabled() == enabled
+        assert tree == grammar.Module.parse(iter(items))
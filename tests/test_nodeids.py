@@ -0,0 +1,99 @@
+from treebie.nodeids import IdNode, IdTable
+
+
+class Module(IdNode):
+    pass
+
+
+class Name(IdNode):
+    pass
+
+
+def make_tree():
+    root = Module(name='m')
+    for i in range(3):
+        child = root.append(Name(id='x%d' % i))
+        child.append(Name(id='y%d' % i))
+    return root
+
+
+def check_table(root):
+    table = root.id_table
+    nodes = list(root.depth_first())
+    assert len(table) == len(nodes)
+    for node in nodes:
+        assert node.__dict__['_ids'] is table
+        assert table.get(node.node_id) is node
+
+
+class TestNodeIds:
+
+    def test_lazy_preorder_ids(self):
+        root = make_tree()
+        assert '_ids' not in root.__dict__
+        leaf = root.children[1].children[0]
+        assert leaf.node_id == 4
+        assert [node.node_id for node in root.depth_first()] == list(range(7))
+        assert root.node_for(4) is leaf
+        assert leaf.node_for(0) is root
+        assert root.node_for(99) is None
+        check_table(root)
+
+    def test_attach_and_detach(self):
+        root = make_tree()
+        root.id_table
+        new = root.children[0].append(Name(id='z'))
+        assert new.node_id == 7
+        assert root.node_for(7) is new
+
+        branch = root.children[1]
+        ids = [node.node_id for node in branch.depth_first()]
+        branch.detatch()
+        assert root.node_for(ids[0]) is None
+        assert [node.node_id for node in branch.depth_first()] == ids
+        assert branch.node_for(ids[1]) is branch.children[0]
+        check_table(root)
+        check_table(branch)
+
+        # Moving it back keeps its ids, since they're free.
+        root.append(branch)
+        assert [node.node_id for node in branch.depth_first()] == ids
+        check_table(root)
+
+    def test_collisions_get_fresh_ids(self):
+        root = make_tree()
+        other = make_tree()
+        root.id_table
+        other.id_table
+        moved = other.children[0]
+        moved.detatch()
+        root.append(moved)
+        assert moved.node_id == 7
+        assert moved.children[0].node_id == 8
+        assert root.id_table.next_id == 9
+        check_table(root)
+        # Ids aren't reused.
+        moved.detatch()
+        assert root.append(Name()).node_id == 9
+
+    def test_serialization(self):
+        root = make_tree()
+        root.children[0].detatch()
+        root.id_table
+        root.append(Name(id='new'))
+        data = root.to_data()
+        assert data['id'] == 0
+        loaded = Module.fromdata(data)
+        assert [node.node_id for node in loaded.depth_first()] == [
+            node.node_id for node in root.depth_first()]
+        assert loaded.id_table.next_id == root.id_table.next_id
+        check_table(loaded)
+
+    def test_table(self):
+        table = IdTable()
+        node = Name()
+        assert table.add(node) == 0
+        assert 0 in table
+        table.discard(node)
+        assert 0 not in table
+        assert table.add(Name()) == 1
@@ -0,0 +1,165 @@
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from treebie import Node
+from treebie.node import BaseNode
+from treebie.chainmap import ChainMap
+from treebie.exceptions import FrozenNodeError
+from treebie.parallel import (
+    FreezableMixin, freeze, thaw, is_frozen, split,
+    parallel_find, parallel_map)
+
+
+class Item(Node):
+    pass
+
+
+class Group(Node):
+    pass
+
+
+class FrozenItem(FreezableMixin, Node):
+    pass
+
+
+def make_tree(width=6, depth=4):
+    root = Group(level=0)
+    level = [root]
+    for d in range(1, depth):
+        next_level = []
+        for node in level:
+            for i in range(width):
+                cls = Group if i % 2 else Item
+                next_level.append(node.append(cls(level=d, i=i)))
+        level = next_level
+    return root
+
+
+@pytest.fixture
+def switchy():
+    '''Switch threads as often as possible to provoke races.
+    '''
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def hammer(func, threads=8):
+    barrier = threading.Barrier(threads)
+
+    def run(_):
+        barrier.wait()
+        return func()
+    with ThreadPoolExecutor(threads) as executor:
+        return list(executor.map(run, range(threads)))
+
+
+class TestLazyInit:
+
+    def test_children_created_once(self, switchy):
+        for _ in range(200):
+            node = Node()
+            lists = hammer(lambda: node.children)
+            assert all(children is lists[0] for children in lists)
+            assert node.children is lists[0]
+
+    def test_ctx_and_uuid_created_once(self, switchy):
+        for _ in range(200):
+            node = Node()
+            assert len(set(map(id, hammer(lambda: node.ctx)))) == 1
+            assert len(set(hammer(lambda: node.uuid))) == 1
+
+    def test_resolve_noderef_creates_one_class(self, switchy):
+        node = Node()
+        for i in range(50):
+            name = 'RacyNode%d' % i
+            classes = hammer(lambda: node.resolve_noderef(name))
+            assert all(cls is classes[0] for cls in classes)
+
+    def test_chainmap_descriptor_binds_per_instance(self, switchy):
+        class Shared(BaseNode):
+            ctx = ChainMap()
+
+        nodes = [Shared() for _ in range(8)]
+        seen = hammer(lambda: [n.ctx.inst for n in nodes for _ in range(50)])
+        expected = [n for n in nodes for _ in range(50)]
+        assert all(
+            all(a is b for a, b in zip(result, expected)) for result in seen)
+        nodes[0].ctx['key'] = 1
+        assert nodes[1].ctx['key'] == 1
+
+
+class TestFreeze:
+
+    def test_frozen_nodes_reject_changes(self):
+        root = FrozenItem()
+        child = root.append(FrozenItem(a=1))
+        freeze(root)
+        assert is_frozen(root) and is_frozen(child)
+        for change in (lambda: root.append(FrozenItem()),
+                       lambda: child.detatch(),
+                       lambda: child.__setitem__('a', 2),
+                       lambda: child.update(a=2),
+                       lambda: child.pop('a'),
+                       lambda: child.setdefault('b', 1),
+                       lambda: child.clear()):
+            with pytest.raises(FrozenNodeError):
+                change()
+        assert child.setdefault('a', 5) == 1
+        assert dict(child) == {'a': 1} and root.children == [child]
+        thaw(root)
+        child['a'] = 2
+        assert child['a'] == 2
+
+    def test_freeze_creates_children(self):
+        root = make_tree(3, 3)
+        freeze(root)
+        assert all('children' in node.__dict__ for node in root.find())
+
+
+class TestParallel:
+
+    def test_split_is_document_order(self):
+        root = make_tree()
+        entries = split(root, 10)
+        assert 10 <= sum(whole for _, whole in entries)
+        flattened = []
+        for node, whole in entries:
+            flattened.extend(node.find() if whole else [node])
+        assert [id(n) for n in flattened] == [id(n) for n in root.find()]
+
+    def test_split_small_tree(self):
+        root = Item()
+        assert split(root, 10) == [(root, True)]
+
+    @pytest.mark.parametrize('parts', [1, 3, 50, 1000])
+    def test_parallel_find_matches_find(self, parts):
+        root = freeze(make_tree())
+        for nodekey, kwargs in (
+                (None, {}), ('Item', {}), ('Group', {'i': 3}),
+                ('Group', {'max_depth': 1}), (None, {'max_depth': 0}),
+                ('Item', {'max_depth': 2}), (None, {'max_depth': 5})):
+            expected = list(root.find(nodekey, **kwargs))
+            found = parallel_find(
+                root, nodekey, max_workers=4, parts=parts, **kwargs)
+            assert [id(n) for n in found] == [id(n) for n in expected]
+
+    def test_parallel_map(self):
+        root = freeze(make_tree())
+        results = parallel_map(
+            lambda node: node.to_data(), root.children, max_workers=4)
+        assert results == [child.to_data() for child in root.children]
+
+    def test_concurrent_reads_stress(self, switchy):
+        root = make_tree(5, 5)
+        expected = len(list(root.find('Item')))
+        with ThreadPoolExecutor(8) as executor:
+            counts = list(executor.map(
+                lambda _: len(parallel_find(root, 'Item', executor=None,
+                                            max_workers=2, parts=8)),
+                range(16)))
+        assert counts == [expected] * 16
@@ -0,0 +1,93 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from hercules.tokentype import Token
+
+from treebie.syntaxnode import SyntaxNode
+from treebie.syntaxnode.parallel import parse_parallel, choose_cuts
+from treebie.syntaxnode.tokentable import Item
+from tests import grammar
+
+
+class SplitModule(grammar.Module):
+    '''The toy grammar, cut at statements and blocks at the top level.
+    '''
+    @classmethod
+    def split_points(cls, items):
+        points = []
+        depth = 0
+        previous = None
+        for index, (pos, token, text) in enumerate(items):
+            if depth == 0 and previous in (';', '}'):
+                points.append(index)
+            if text == '{':
+                depth += 1
+            elif text == '}':
+                depth -= 1
+            previous = text
+        return points
+
+
+def check_parents(root):
+    for node in root.depth_first():
+        for child in node.children:
+            assert child.parent is node
+
+
+@pytest.fixture
+def items():
+    buf = []
+    for i in range(300):
+        buf.append('x%d = y %d ;' % (i, i))
+        if i % 7 == 6:
+            buf.append('{ a%d = 1 ; { b = 2 ; } }' % i)
+    return list(grammar.tokenize(' '.join(buf)))
+
+
+class TestParseParallel:
+
+    def test_split_tokens(self):
+        class Numbered(SyntaxNode):
+            split_tokens = ('Number',)
+        items = [Item(0, Token.Name, 'a'), Item(2, Token.Number.Integer, '1'),
+                 Item(4, Token.Name, 'b'), Item(6, Token.Number.Float, '2.')]
+        assert Numbered.split_points(items) == [1, 3]
+        assert SyntaxNode.split_points(items) == []
+
+    def test_choose_cuts(self):
+        assert choose_cuts([2, 5, 9], 12, 3) == [0, 5, 9, 12]
+        assert choose_cuts([2, 3], 12, 3) == [0, 12]
+        assert choose_cuts([], 12, 4) == [0, 12]
+
+    def test_equals_sequential_parse(self, items):
+        expected = SplitModule.parse(iter(items))
+        with ThreadPoolExecutor(4) as executor:
+            tree = parse_parallel(SplitModule, items, executor=executor,
+                                  chunks=5, min_chunk=10)
+        assert type(tree) is SplitModule
+        assert tree == expected
+        assert tree.to_data() == expected.to_data()
+        check_parents(tree)
+        # Tokens are the original items.
+        originals = set(map(id, items))
+        assert all(id(item) in originals
+                   for node in tree.depth_first() for item in node.tokens)
+
+    def test_cut_into_chunks(self, items):
+        points = SplitModule.split_points(items)
+        assert len(choose_cuts(points, len(items), 5)) == 6
+
+    def test_process_pool(self, items):
+        expected = SplitModule.parse(iter(items))
+        with ProcessPoolExecutor(2) as executor:
+            tree = parse_parallel(SplitModule, items, executor=executor,
+                                  chunks=3, min_chunk=10)
+        assert tree == expected
+        check_parents(tree)
+        positions = [item.pos for node in tree.depth_first()
+                     for item in node.tokens]
+        assert sorted(positions) == [item.pos for item in items]
+
+    def test_small_input_is_sequential(self, items):
+        tree = parse_parallel(SplitModule, items[:20], chunks=4)
+        assert tree == SplitModule.parse(iter(items[:20]))
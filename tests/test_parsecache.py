@@ -0,0 +1,222 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from treebie.journal import Journal
+from treebie.syntaxnode import matches, ParseProfiler
+from treebie.syntaxnode.base import ParseError
+from treebie.syntaxnode.checkpoint import Checkpointer
+from treebie.syntaxnode.recovery import Recovery
+from treebie.syntaxnode.tokentable import Item, TokenTable
+from treebie.syntaxnode.cache import (
+    ParseCache, grammar_fingerprint, grammar_classes, dump_tree, load_tree)
+from tests import grammar
+
+
+class Counting(object):
+    '''A tokenizer that counts how often it runs.
+    '''
+    def __init__(self):
+        self.calls = 0
+
+    def tokenize(self, source):
+        self.calls += 1
+        return grammar.tokenize(source)
+
+
+def _parse_in_process(directory):
+    cache = ParseCache(directory)
+    tree = cache.parse(grammar.Module, SOURCE, grammar.tokenize)
+    return tree.to_data(), cache.stats()
+
+
+SOURCE = grammar.make_source(40)
+
+
+class TestParseCache:
+
+    def test_round_trip(self):
+        tree = grammar.Module.parse(grammar.tokenize(SOURCE))
+        loaded = load_tree(dump_tree(tree), grammar.Module)
+        assert loaded == tree
+        assert loaded.children[0].tokens == tree.children[0].tokens
+
+    def test_round_trip_bytes(self):
+        tree = grammar.Module.parse(grammar.tokenize(SOURCE))
+        tokens = tree.children[0].tokens
+        tokens[:] = [Item(pos, token, text.encode())
+                     for pos, token, text in tokens]
+        loaded = load_tree(dump_tree(tree), grammar.Module)
+        assert loaded.children[0].tokens == tree.children[0].tokens
+
+    def test_entries_are_data(self, tmp_path):
+        directory = str(tmp_path / 'cache')
+        ParseCache(directory).parse(grammar.Module, SOURCE, grammar.tokenize)
+        assert os.stat(directory).st_mode & 0o777 == 0o700
+        paths = [os.path.join(dirpath, name)
+                 for dirpath, _, names in os.walk(directory)
+                 for name in names]
+        assert len(paths) == 1
+        assert os.stat(os.path.dirname(paths[0])).st_mode & 0o777 == 0o700
+        with open(paths[0], 'rb') as f:
+            assert f.read().startswith(b'[2,')
+
+    def test_memory_hits(self):
+        cache = ParseCache()
+        counter = Counting()
+        first = cache.parse(grammar.Module, SOURCE, counter.tokenize)
+        second = cache.parse(grammar.Module, SOURCE, counter.tokenize)
+        assert counter.calls == 1
+        assert second == first
+        assert second is not first
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+        cache.parse(grammar.Module, SOURCE + ' z = 1 ;', counter.tokenize)
+        assert counter.calls == 2
+
+    def test_disk_hits(self, tmp_path):
+        counter = Counting()
+        ParseCache(str(tmp_path)).parse(
+            grammar.Module, SOURCE, counter.tokenize)
+        cache = ParseCache(str(tmp_path))
+        tree = cache.parse(grammar.Module, SOURCE, counter.tokenize)
+        assert counter.calls == 1
+        assert tree == grammar.Module.parse(grammar.tokenize(SOURCE))
+        assert cache.stats()['disk_hits'] == 1
+        cache.parse(grammar.Module, SOURCE, counter.tokenize)
+        assert cache.stats()['hits'] == 1
+
+    def test_damaged_entry(self, tmp_path):
+        cache = ParseCache(str(tmp_path))
+        cache.parse(grammar.Module, SOURCE, grammar.tokenize)
+        for dirpath, dirnames, filenames in os.walk(str(tmp_path)):
+            for filename in filenames:
+                with open(os.path.join(dirpath, filename), 'wb') as f:
+                    f.write(b'garbage')
+        cache = ParseCache(str(tmp_path))
+        tree = cache.parse(grammar.Module, SOURCE, grammar.tokenize)
+        assert tree == grammar.Module.parse(grammar.tokenize(SOURCE))
+        assert cache.stats()['misses'] == 1
+        assert ParseCache(str(tmp_path)).parse(
+            grammar.Module, SOURCE, grammar.tokenize) == tree
+
+    def test_eviction(self):
+        size = len(dump_tree(grammar.Module.parse(grammar.tokenize(SOURCE))))
+        cache = ParseCache(max_bytes=int(size * 2.5))
+        for i in range(4):
+            cache.parse(grammar.Module, SOURCE + ' ' * i, grammar.tokenize)
+        stats = cache.stats()
+        assert stats['evictions'] == 2
+        assert stats['entries'] == 2
+        assert stats['bytes'] <= size * 2.5
+        cache.parse(grammar.Module, SOURCE, grammar.tokenize)
+        assert cache.stats()['misses'] == 5
+
+    def test_fingerprint(self):
+        classes = grammar_classes(grammar.Module)
+        assert {grammar.Module, grammar.Block, grammar.Assign} <= classes
+        base = grammar_fingerprint(classes, grammar.tokenize)
+        assert base == grammar_fingerprint(classes, grammar.tokenize)
+        assert base != grammar_fingerprint(classes)
+
+        class Changed(grammar.Assign):
+            @matches(';')
+            def handle_end(self, *items):
+                return self.popstate()
+        assert base != grammar_fingerprint(
+            classes | {Changed}, grammar.tokenize)
+        lexed = grammar_fingerprint(classes, grammar.ToyLexer().tokenize)
+        assert lexed != base
+        assert lexed == grammar_fingerprint(
+            classes, grammar.ToyLexer().tokenize)
+
+    def test_key(self):
+        cache = ParseCache()
+        key = cache.key(grammar.Module, SOURCE, grammar.tokenize)
+        assert key == cache.key(grammar.Module, SOURCE, grammar.tokenize)
+        assert key != cache.key(grammar.Module, SOURCE.encode(),
+                                grammar.tokenize)
+        assert key != cache.key(grammar.Block, SOURCE, grammar.tokenize)
+
+    def test_key_per_lexer_rules(self):
+        cache = ParseCache()
+        lexer = grammar.ToyLexer()
+        other = grammar.ToyLexer()
+        other.tokendefs = dict(lexer.tokendefs, extra=[(r'x', 'Name')])
+        key = cache.key(grammar.Module, SOURCE, lexer.tokenize)
+        assert key != cache.key(grammar.Module, SOURCE, other.tokenize)
+        assert key == cache.key(
+            grammar.Module, SOURCE, grammar.ToyLexer().tokenize)
+
+    def test_key_options(self):
+        cache = ParseCache()
+        key = cache.key(grammar.Module, SOURCE, grammar.tokenize)
+        assert key == cache.key(
+            grammar.Module, SOURCE, grammar.tokenize, pause_gc=True)
+        table = TokenTable.from_items(SOURCE, grammar.tokenize(SOURCE))
+        assert key != cache.key(
+            grammar.Module, SOURCE, grammar.tokenize, token_table=table)
+
+    def test_token_table_not_shared(self):
+        cache = ParseCache()
+        counter = Counting()
+        table = TokenTable.from_items(SOURCE, grammar.tokenize(SOURCE))
+        cache.parse(grammar.Module, SOURCE, counter.tokenize,
+                    token_table=table)
+        cache.parse(grammar.Module, SOURCE, counter.tokenize)
+        assert counter.calls == 2
+        assert cache.stats()['misses'] == 2
+
+    def test_recover_bypasses(self):
+        cache = ParseCache()
+        source = 'a = 1 ; } b = 2 ;'
+        recovery = Recovery()
+        cache.parse(grammar.Module, source, grammar.tokenize,
+                    recover=recovery)
+        assert len(recovery.errors) == 1
+        recovery = Recovery()
+        cache.parse(grammar.Module, source, grammar.tokenize,
+                    recover=recovery)
+        assert len(recovery.errors) == 1
+        with pytest.raises(ParseError):
+            cache.parse(grammar.Module, source, grammar.tokenize)
+        assert cache.stats()['bypassed'] == 2
+
+    def test_journal_bypasses(self):
+        cache = ParseCache()
+        cache.parse(grammar.JModule, SOURCE, grammar.tokenize)
+        journal = Journal()
+        tree = cache.parse(grammar.JModule, SOURCE, grammar.tokenize,
+                           journal=journal)
+        assert tree.journal is journal
+        assert journal.entries
+        assert cache.stats()['hits'] == 0
+
+    def test_instrument_bypasses(self):
+        cache = ParseCache()
+        cache.parse(grammar.Module, SOURCE, grammar.tokenize)
+        instrument = ParseProfiler()
+        cache.parse(grammar.Module, SOURCE, grammar.tokenize,
+                    instrument=instrument)
+        assert instrument.handler_calls
+        assert cache.stats()['hits'] == 0
+
+    def test_checkpoint_bypasses(self):
+        cache = ParseCache()
+        cache.parse(grammar.Module, SOURCE, grammar.tokenize)
+        checkpointer = Checkpointer(every=50, max_overhead=1e6)
+        cache.parse(grammar.Module, SOURCE, grammar.tokenize,
+                    checkpoint=checkpointer)
+        assert checkpointer.count
+        assert cache.stats()['hits'] == 0
+
+    def test_concurrent_processes(self, tmp_path):
+        with ProcessPoolExecutor(3) as executor:
+            results = list(executor.map(
+                _parse_in_process, [str(tmp_path)] * 6))
+        expected = grammar.Module.parse(grammar.tokenize(SOURCE)).to_data()
+        assert all(data == expected for data, stats in results)
+        files = [name for _, _, names in os.walk(str(tmp_path))
+                 for name in names]
+        assert len(files) == 1 and files[0].endswith('.tree')
@@ -0,0 +1,109 @@
+import random
+
+from treebie import Node
+from treebie.paths import PathNode
+
+
+def make_tree(cls, size=200, seed=0):
+    rng = random.Random(seed)
+    nodes = [cls(i=0)]
+    for i in range(1, size):
+        nodes.append(rng.choice(nodes).append(cls(i=i)))
+    return nodes
+
+
+class TestNaiveQueries:
+
+    def test_getdepth(self):
+        root = Node()
+        leaf = root.descend_path('A', 'B', 'C')
+        assert root.getdepth() == 0
+        assert leaf.getdepth() == 3
+
+    def test_is_ancestor_of(self):
+        root = Node()
+        leaf = root.descend_path('A', 'B')
+        assert root.is_ancestor_of(leaf)
+        assert not leaf.is_ancestor_of(root)
+        assert not leaf.is_ancestor_of(leaf)
+
+    def test_common_ancestor(self):
+        root = Node()
+        a = root.descend_path('A', 'B')
+        b = root.descend('C')
+        assert a.common_ancestor(b) is root
+        assert a.common_ancestor(a.parent) is a.parent
+        assert a.common_ancestor(Node()) is None
+
+
+class TestPathNode:
+
+    def check(self, nodes):
+        rng = random.Random(1)
+        for node in nodes:
+            assert node.getroot() is Node.getroot(node)
+            assert node.getdepth() == Node.getdepth(node)
+        for _ in range(300):
+            a, b = rng.choice(nodes), rng.choice(nodes)
+            assert a.is_ancestor_of(b) == Node.is_ancestor_of(a, b)
+            assert a.common_ancestor(b) is Node.common_ancestor(a, b)
+
+    def test_matches_naive_queries(self):
+        self.check(make_tree(PathNode))
+
+    def test_reparenting(self):
+        nodes = make_tree(PathNode)
+        self.check(nodes)
+        rng = random.Random(2)
+        for _ in range(20):
+            node = rng.choice(nodes[1:])
+            node.detatch()
+            assert node.getroot() is node
+            assert node.getdepth() == 0
+            target = rng.choice(nodes)
+            if target is node or node.is_ancestor_of(target):
+                nodes[0].append(node)
+            else:
+                target.insert(0, node)
+            self.check(nodes)
+
+    def test_separate_trees(self):
+        a = PathNode()
+        b = PathNode()
+        assert a.getroot() is a
+        assert a.common_ancestor(b) is None
+        assert not a.is_ancestor_of(b)
+
+    def test_attach_subtree(self):
+        root = PathNode()
+        subtree = PathNode()
+        leaf = subtree.append(PathNode())
+        assert leaf.getroot() is subtree
+        root.append(subtree)
+        assert leaf.getroot() is root
+        assert leaf.getdepth() == 2
+
+    def test_generation_per_tree(self):
+        a = make_tree(PathNode)
+        b = make_tree(PathNode)
+        self.check(a)
+        self.check(b)
+        entries = [node.__dict__['_paths'] for node in b]
+        moved = next(node for node in a[1:] if node.children)
+        moved.detatch()
+        a[0].append(moved)
+        self.check(a)
+        # b's cached entries are still valid, and weren't recomputed.
+        assert all(entry[1] == entry[0][0] for entry in entries)
+        assert all(node.__dict__['_paths'] is entry
+                   for node, entry in zip(b, entries))
+
+    def test_deep_chain(self):
+        root = this = PathNode()
+        for _ in range(5000):
+            this = this.append(PathNode())
+        assert this.getdepth() == 5000
+        assert this.getroot() is root
+        assert root.is_ancestor_of(this)
+        middle = this._ancestor_at_depth(2500)
+        assert middle.getdepth() == 2500
@@ -0,0 +1,97 @@
+import pytest
+from collections import namedtuple
+
+from hercules.tokentype import Token
+
+from treebie import Node
+from treebie.syntaxnode import SyntaxNode
+from treebie.persistent import PersistentNode, VersionedTree
+
+
+class Module(Node):
+    pass
+
+
+class FunctionDef(Node):
+    pass
+
+
+class Leaf(SyntaxNode):
+    pass
+
+
+Item = namedtuple('Item', 'pos token text')
+
+
+def make_tree():
+    root = Module(name='m')
+    for i in range(3):
+        func = root.append(FunctionDef(name='f%d' % i))
+        for j in range(3):
+            func.append(Leaf(j=j)).extend([Item(j, Token.Name, 'x')])
+    return root
+
+
+class TestPersistentNode:
+
+    def test_round_trip(self):
+        tree = make_tree()
+        persistent = PersistentNode.from_node(tree)
+        assert persistent.to_node() == tree
+        assert type(persistent.to_node().children[0].children[0]) is Leaf
+
+    def test_queries(self):
+        persistent = PersistentNode.from_node(make_tree())
+        names = [node['name'] for node in persistent.find('FunctionDef')]
+        assert names == ['f0', 'f1', 'f2']
+        assert persistent.find_path('FunctionDef', name='f1') == (1,)
+
+    def test_path_copying(self):
+        v1 = PersistentNode.from_node(make_tree())
+        path = v1.find_path('FunctionDef', name='f1')
+        v2 = v1.set_at(path, 'name', 'g')
+        assert v1.get_in(path)['name'] == 'f1'
+        assert v2.get_in(path)['name'] == 'g'
+        # Untouched subtrees are shared, and the edited node's
+        # children are too.
+        assert v2.children[0] is v1.children[0]
+        assert v2.children[2] is v1.children[2]
+        assert v2.children[1].children[0] is v1.children[1].children[0]
+
+    def test_structural_edits(self):
+        v1 = PersistentNode.from_node(make_tree())
+        v2 = v1.append_at((0,), Leaf(j=3))
+        v3 = v2.insert_at((), 0, FunctionDef(name='first'))
+        v4 = v3.delete_at((2,))
+        v5 = v4.replace_at((0,), FunctionDef(name='replaced'))
+        assert len(v1.children[0].children) == 3
+        assert len(v2.children[0].children) == 4
+        assert [c['name'] for c in v5.children] == ['replaced', 'f0', 'f2']
+        assert [c['name'] for c in v1.children] == ['f0', 'f1', 'f2']
+
+    def test_immutable(self):
+        node = PersistentNode.from_node(make_tree())
+        with pytest.raises(TypeError):
+            node['a'] = 1
+        with pytest.raises(TypeError):
+            node.update(a=1)
+        with pytest.raises(TypeError):
+            node.descend('FunctionDef')
+
+    def test_to_data_matches_mutable(self):
+        tree = make_tree()
+        assert PersistentNode.from_node(tree).to_data() == tree.to_data()
+        assert PersistentNode.from_node(tree).to_data(children=False) == (
+            tree.to_data(children=False))
+
+
+class TestVersionedTree:
+
+    def test_snapshot_and_rollback(self):
+        tree = VersionedTree(make_tree())
+        mark = tree.snapshot()
+        tree.edit('set_at', (0,), 'name', 'changed')
+        tree.edit('delete_at', (1,))
+        assert len(tree.root.children) == 2
+        tree.rollback(mark)
+        assert tree.to_node() == make_tree()
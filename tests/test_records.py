@@ -0,0 +1,90 @@
+import pytest
+
+from treebie import Node
+from treebie.node import ParentHookMixin
+from tests import grammar
+
+
+class Module(Node):
+    pass
+
+
+class FunctionDef(Node):
+    pass
+
+
+class Name(Node):
+    pass
+
+
+class Hooked(ParentHookMixin, Node):
+
+    def parent_changed(self, old_parent):
+        self.__dict__.setdefault('changes', []).append(old_parent)
+
+
+def make_tree():
+    root = Module(name='m')
+    for i in range(3):
+        func = root.append(FunctionDef(name='f%d' % i))
+        for j in range(i):
+            func.append(Name(id='x%d' % j))
+    return root
+
+
+def check_parents(root):
+    for node in root.depth_first():
+        for child in node.children:
+            assert child.parent is node
+
+
+class TestRecords:
+
+    def test_round_trip(self):
+        tree = make_tree()
+        types, parents, attrs = tree.to_records()
+        assert parents == [-1, 0, 0, 2, 0, 4, 4]
+        assert types[1] == FunctionDef.fqname()
+        assert attrs[0] == {'name': 'm'}
+        rebuilt = Node.from_records(types, parents, attrs)
+        assert rebuilt == tree
+        assert rebuilt.to_data() == tree.to_data()
+        assert not hasattr(rebuilt, 'parent')
+        check_parents(rebuilt)
+
+    def test_syntax_tree_round_trip(self):
+        tree = grammar.Module.parse(grammar.tokenize(grammar.make_source(12)))
+        records = tree.to_records()
+        assert len(records) == 4
+        assert records[3][0] is None
+        rebuilt = grammar.Module.from_records(*records)
+        assert rebuilt == tree
+        assert rebuilt.children[0].tokens == tree.children[0].tokens
+        assert rebuilt.to_data() == tree.to_data()
+
+    def test_classes_and_names(self):
+        root = Node.from_records(
+            [Module, 'FunctionDef', Name, Name],
+            [-1, 0, 1, 0],
+            [{'name': 'm'}, None, {'id': 'a'}, {}])
+        assert [type(node) for node in root.depth_first()] == [
+            Module, FunctionDef, Name, Name]
+        assert dict(root.children[1]) == {}
+        assert root.children[0].children[0]['id'] == 'a'
+        check_parents(root)
+
+    def test_parent_hook(self):
+        root = Node.from_records([Hooked, Hooked], [None, 0])
+        child = root.children[0]
+        assert child.parent is root
+        assert child.changes == [None]
+
+    def test_bad_records(self):
+        with pytest.raises(ValueError):
+            Node.from_records([Module, Name], [-1])
+        with pytest.raises(ValueError):
+            Node.from_records([Module, Name], [-1, -1])
+        with pytest.raises(ValueError):
+            Node.from_records([Name, Module], [1, -1])
+        with pytest.raises(ValueError):
+            Node.from_records([], [])
@@ -0,0 +1,121 @@
+import pytest
+
+from treebie.syntaxnode import matches
+from treebie.syntaxnode.base import ParseError
+from treebie.syntaxnode.recovery import Recovery
+from tests import grammar
+
+
+class Strict(grammar.Module):
+
+    @matches('{')
+    def handle_open(self, *items):
+        # A handler's own error, after it consumed the item.
+        raise ParseError('No blocks allowed.')
+
+
+def parse(source, **options):
+    return grammar.Module.parse(grammar.tokenize(source), **options)
+
+
+def texts(node):
+    return [item.text for item in node.tokens]
+
+
+class TestParseError:
+
+    def test_context(self):
+        with pytest.raises(ParseError) as info:
+            parse('a = 1 ; b = 2 ; } c = 3 ;')
+        error = info.value
+        assert error.position == 8
+        assert error.item.text == '}'
+        assert [item.text for item in error.before] == [
+            'a', '=', '1', ';', 'b', '=', '2', ';']
+        assert [item.text for item in error.after] == [
+            '}', 'c', '=', '3', ';']
+
+    def test_stream_not_materialized(self):
+        pulled = []
+
+        def items():
+            for item in grammar.tokenize('a = 1 ; } ' + 'b = 2 ; ' * 1000):
+                pulled.append(item)
+                yield item
+
+        with pytest.raises(ParseError) as info:
+            grammar.Module.parse(items())
+        assert len(info.value.after) == 10
+        assert len(pulled) < 20
+
+
+class TestRecovery:
+
+    def test_skip(self):
+        recovery = Recovery()
+        tree = parse('a = 1 ; } ; b = 2 ; = c = 3 ;', recover=recovery)
+        expected = parse('a = 1 ; b = 2 ; c = 3 ;')
+        assert [texts(child) for child in tree.children] == [
+            texts(child) for child in expected.children]
+        assert [(e.position, e.item.text, e.skipped)
+                for e in recovery.errors] == [(4, '}', 2), (10, '=', 1)]
+        assert recovery.errors[0].node is tree
+
+    def test_skip_stays_in_node(self):
+        recovery = Recovery()
+        tree = parse('a = 1 } b = 2 ;', recover=recovery)
+        assert len(tree.children) == 1
+        assert texts(tree.children[0]) == ['a', '=', '1', 'b', '=', '2', ';']
+        assert recovery.errors[0].node is tree.children[0]
+
+    @pytest.mark.parametrize('sync', [('Module',), (grammar.Module,)])
+    def test_sync(self, sync):
+        recovery = Recovery(sync=sync)
+        tree = parse('a = 1 } b = 2 ;', recover=recovery)
+        assert [texts(child) for child in tree.children] == [
+            ['a', '=', '1'], ['b', '=', '2', ';']]
+        assert len(recovery.errors) == 1
+
+    def test_sync_to_nearest(self):
+        recovery = Recovery(sync=('Block',))
+        tree = parse('{ a = 1 = } } b = 2 ;', recover=recovery)
+        block = tree.children[0]
+        assert isinstance(block, grammar.Block)
+        # The stray '}' closes the block it popped to.
+        assert texts(block) == ['{', '}']
+        assert texts(tree.children[1]) == ['b', '=', '2', ';']
+
+    def test_bounded_context(self):
+        recovery = Recovery(context=3)
+        parse('a = 1 ; } b = 2 ; c = 3 ;', recover=recovery)
+        error, = recovery.errors
+        assert [item.text for item in error.before] == ['=', '1', ';']
+        assert [item.text for item in error.after] == ['}', 'b', '=']
+
+    def test_max_errors(self):
+        recovery = Recovery(max_errors=1)
+        with pytest.raises(ParseError) as info:
+            parse('a = 1 ; } b = 2 ; } c = 3 ;', recover=recovery)
+        assert info.value.position == 9
+        assert len(recovery.errors) == 1
+
+    def test_handler_errors_not_recovered(self):
+        recovery = Recovery()
+        with pytest.raises(ParseError) as info:
+            Strict.parse(grammar.tokenize('a = 1 ; { b = 2 ; }'),
+                         recover=recovery)
+        assert str(info.value) == 'No blocks allowed.'
+        assert recovery.errors == []
+
+    def test_nested_parse_errors_not_recovered(self):
+        class Nested(grammar.Module):
+            @matches('{')
+            def handle_open(self, *items):
+                # Fails at position 5 of its own stream, which is also
+                # the outer stream's position.
+                grammar.Module.parse(grammar.tokenize('x = 1 ; y }'))
+
+        recovery = Recovery()
+        with pytest.raises(ParseError):
+            Nested.parse(grammar.tokenize('a = 1 ; {'), recover=recovery)
+        assert recovery.errors == []
@@ -0,0 +1,201 @@
+import pytest
+
+from treebie import Node
+from treebie.rewrite import (
+    Pattern, Rule, RuleSet, RewriteError, RewriteHookMixin, ANY, REST)
+from treebie.visitor import REMOVE
+
+
+class Module(Node):
+    pass
+
+
+class BinOp(Node):
+    pass
+
+
+class Num(Node):
+    pass
+
+
+class Name(Node):
+    pass
+
+
+class Paren(Node):
+    pass
+
+
+class HookedBlock(RewriteHookMixin, Node):
+    pass
+
+
+def binop(op, left, right):
+    node = BinOp(op=op)
+    node.append(left)
+    node.append(right)
+    return node
+
+
+def folding_rules():
+    rules = RuleSet()
+
+    @rules.rule(Pattern('BinOp', op='+', children=[
+        Pattern('Num', bind='left'), Pattern('Num', bind='right')]))
+    def fold(node, left, right):
+        return Num(value=left['value'] + right['value'])
+
+    @rules.rule(Pattern('Paren', children=[Pattern(bind='inner')]))
+    def unwrap(node, inner):
+        inner.detatch()
+        return inner
+
+    return rules
+
+
+def to_tuple(node):
+    return (node.get_nodekey(), dict(node),
+            [to_tuple(child) for child in node.children])
+
+
+class TestPattern:
+
+    def test_nodekey_and_attrs(self):
+        match = Pattern('Num', value=1).compile()
+        assert match(Num(value=1), {})
+        assert not match(Num(value=2), {})
+        assert not match(Name(value=1), {})
+        assert not match(Num(), {})
+
+    def test_predicates_and_classes(self):
+        match = Pattern(Node, value=lambda v: v is not None and v > 1).compile()
+        assert match(Num(value=2), {})
+        assert not match(Num(value=1), {})
+        assert not match(Num(), {})
+
+    def test_child_shapes(self):
+        exact = Pattern('BinOp', children=[ANY, Pattern('Num')]).compile()
+        rest = Pattern('BinOp', children=[Pattern('Name'), REST]).compile()
+        node = binop('+', Name(id='x'), Num(value=1))
+        assert exact(node, {})
+        assert rest(node, {})
+        node.append(Num(value=2))
+        assert not exact(node, {})
+        assert rest(node, {})
+        assert Pattern('BinOp', children=[]).compile()(BinOp(), {})
+
+    def test_bindings(self):
+        pattern = Pattern('BinOp', bind='op', children=[
+            Pattern(bind='left'), Pattern(bind='right')])
+        node = binop('+', Name(id='x'), Num(value=1))
+        bindings = {}
+        assert pattern.compile()(node, bindings)
+        assert bindings == {
+            'op': node, 'left': node.children[0], 'right': node.children[1]}
+
+    def test_rest_must_be_last(self):
+        with pytest.raises(ValueError):
+            Pattern(children=[REST, ANY]).compile()
+
+    def test_depth(self):
+        assert ANY.depth == 1
+        assert Pattern(children=[ANY, Pattern(children=[ANY])]).depth == 3
+
+
+class TestRuleSet:
+
+    def test_index_by_nodekey(self):
+        rules = folding_rules()
+        anything = rules.add(Rule(ANY, lambda node: None, 'anything'))
+        assert [r.name for r in rules.rules_for('BinOp')] == [
+            'fold', 'anything']
+        assert rules.rules_for('Name') == [anything]
+
+    def test_fold_to_fixpoint(self):
+        root = Module()
+        root.append(binop('+', Num(value=1), binop(
+            '+', Paren().append(Num(value=2)).parent, Num(value=3))))
+        root.append(binop('*', Name(id='x'), Num(value=4)))
+        root = folding_rules().rewrite(root)
+        assert to_tuple(root) == ('Module', {}, [
+            ('Num', {'value': 6}, []),
+            ('BinOp', {'op': '*'}, [
+                ('Name', {'id': 'x'}, []), ('Num', {'value': 4}, [])]),
+        ])
+        assert all(child.parent is root for child in root.children)
+
+    def test_replace_and_remove_root(self):
+        rules = folding_rules()
+        root = rules.rewrite(binop('+', Num(value=1), Num(value=2)))
+        assert to_tuple(root) == ('Num', {'value': 3}, [])
+
+        rules.add(Rule(Pattern('Num'), lambda node: REMOVE))
+        assert rules.rewrite(Num(value=1)) is None
+
+    def test_remove_rechecks_parent(self):
+        rules = RuleSet()
+        rules.rule(Pattern('Name', id='_'))(lambda node: REMOVE)
+        rules.rule(Pattern('Paren', children=[]))(lambda node: REMOVE)
+        root = Module()
+        paren = root.append(Paren())
+        paren.append(Name(id='_'))
+        paren.append(Name(id='_'))
+        root.append(Name(id='y'))
+        root = rules.rewrite(root)
+        assert to_tuple(root) == ('Module', {}, [('Name', {'id': 'y'}, [])])
+
+    def test_only_changed_region_is_rechecked(self):
+        calls = []
+        rules = folding_rules()
+
+        @rules.rule(Pattern('Name'))
+        def count(node):
+            calls.append(node)
+
+        root = Module()
+        for i in range(50):
+            root.append(Name(id=i))
+        root.append(binop('+', Num(value=1), Num(value=2)))
+        rules.rewrite(root)
+        # Every Name is checked once; the fold doesn't send the
+        # engine back over the untouched siblings.
+        assert len(calls) == 50
+
+    def test_in_place_with_hooks(self):
+        seen = []
+        rules = RuleSet()
+
+        @rules.rule(Pattern('HookedBlock', flatten=True))
+        def flatten(node):
+            seen.append(node)
+            del node['flatten']
+            for child in list(node.children):
+                if isinstance(child, HookedBlock):
+                    index = child.detatch()
+                    for grandchild in reversed(list(child.children)):
+                        grandchild.detatch()
+                        node.insert(index, grandchild)
+            return node
+
+        @rules.rule(Pattern('Num', value=0))
+        def drop_zero(node):
+            return REMOVE
+
+        root = HookedBlock(flatten=True)
+        inner = root.append(HookedBlock())
+        inner.append(Num(value=1))
+        inner.append(Num(value=2))
+        root.append(Num(value=3))
+        root = rules.rewrite(root)
+        assert seen == [root]
+        assert to_tuple(root) == ('HookedBlock', {}, [
+            ('Num', {'value': 1}, []),
+            ('Num', {'value': 2}, []),
+            ('Num', {'value': 3}, []),
+        ])
+
+    def test_no_fixpoint(self):
+        rules = RuleSet()
+        rules.rule(Pattern('Num'))(lambda node: Num(value=node['value']))
+        with pytest.raises(RewriteError):
+            rules.rewrite(Num(value=1), max_rewrites=10)
@@ -0,0 +1,107 @@
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from treebie import Node
+from treebie.syntaxnode import SyntaxNode
+from treebie.sharedmem import SharedTree
+
+
+class Module(Node):
+    pass
+
+
+class Call(Node):
+    pass
+
+
+class Name(Node):
+    pass
+
+
+class Word(SyntaxNode):
+    serialization_meta = (dict(attr='tokens'),)
+
+
+def make_tree(width=5):
+    root = Module(name='m')
+    for i in range(width):
+        call = root.append(Call(func='f%d' % i))
+        for j in range(i):
+            call.append(Name(id='x%d' % j))
+    return root
+
+
+def find_names(snapshot, part):
+    child = snapshot.root.children[part]
+    return [view.id for view in child.find('Name')]
+
+
+@pytest.fixture
+def snapshot():
+    snapshot = SharedTree.create(make_tree())
+    yield snapshot
+    snapshot.close()
+    snapshot.unlink()
+
+
+class TestSharedTree:
+
+    def test_structure(self, snapshot):
+        root = snapshot.root
+        assert len(snapshot) == 1 + 5 + 10
+        assert root.get_nodekey() == 'Module'
+        assert root.parent is None
+        assert root['name'] == 'm'
+        assert [c['func'] for c in root.children] == [
+            'f0', 'f1', 'f2', 'f3', 'f4']
+        call = root.children[3]
+        assert [n['id'] for n in call.children] == ['x0', 'x1', 'x2']
+        assert call.children[0].parent == call
+        assert call.children[0].getdepth() == 2
+        assert dict(call) == {'func': 'f3'}
+        assert call.type_name() == Call.fqname()
+
+    def test_queries_match_original(self, snapshot):
+        tree = make_tree()
+        views = list(snapshot.root.depth_first())
+        assert [dict(v) for v in views] == [dict(n) for n in tree.depth_first()]
+        assert [v.id for v in snapshot.root.find('Name', id='x1')] == [
+            v.id for v in views if v.get('id') == 'x1']
+        assert snapshot.root.find_one('Call', func='f2')['func'] == 'f2'
+        assert snapshot.root.find_one('Missing') is None
+        assert [v.get_nodekey() for v in snapshot.root.find(max_depth=1)] == [
+            'Module'] + ['Call'] * 5
+
+    def test_nodes_for(self, snapshot):
+        ids = [v.id for v in snapshot.root.find('Name', id='x0')]
+        nodes = snapshot.nodes_for(ids)
+        assert all(isinstance(node, Name) and node['id'] == 'x0'
+                   for node in nodes)
+        assert nodes[0] is snapshot.nodes[ids[0]]
+
+    def test_pickles_by_name(self, snapshot):
+        data = pickle.dumps(snapshot)
+        assert len(data) < 200
+        attached = pickle.loads(data)
+        try:
+            assert attached.nodes is None
+            assert attached.root.children[1]['func'] == 'f1'
+        finally:
+            attached.close()
+
+    def test_process_pool(self, snapshot):
+        with ProcessPoolExecutor(2) as pool:
+            ids = list(pool.map(find_names, [snapshot] * 5, range(5)))
+        found = snapshot.nodes_for(sum(ids, []))
+        expected = list(snapshot.nodes[0].find('Name'))
+        assert [id(n) for n in found] == [id(n) for n in expected]
+
+    def test_extra_attrs(self):
+        root = Word()
+        root.tokens.extend([(0, 'Name', 'a')])
+        with SharedTree.create(root) as snapshot:
+            assert snapshot.root.tokens == [[0, 'Name', 'a']]
+            with pytest.raises(AttributeError):
+                snapshot.root.missing
@@ -0,0 +1,86 @@
+import mmap
+import tempfile
+
+from hercules.tokentype import Token
+
+from treebie.syntaxnode.tokentable import TokenTable, TokenRange, Item
+from tests import grammar
+
+
+SOURCE = 'a = 1 ; { b = a 2 ; c = 3 } d = 4 ;'
+
+
+def parse_both(source=SOURCE):
+    items = list(grammar.tokenize(source))
+    table = TokenTable.from_items(source, items)
+    plain = grammar.Module.parse(iter(items))
+    tabled = grammar.Module.parse(iter(table), token_table=table)
+    return table, plain, tabled
+
+
+class TestTokenTable:
+
+    def test_items_round_trip(self):
+        items = list(grammar.tokenize(SOURCE))
+        table = TokenTable.from_items(SOURCE, items)
+        assert len(table) == len(items)
+        assert list(table) == items
+        assert table[3] == items[3]
+        assert table.index_of(items[5]) == 5
+        assert table.index_of(Item(0, Token.Name, 'zz')) is None
+        assert table.nbytes() == len(items) * (4 + 8 + 4)
+
+    def test_bytes_and_mmap_sources(self):
+        data = b'foo  bar'
+        items = [Item(0, Token.Name, b'foo'), Item(5, Token.Name, b'bar')]
+        assert list(TokenTable.from_items(data, items)) == items
+        assert list(TokenTable.from_items(memoryview(data), items)) == items
+        with tempfile.TemporaryFile() as fp:
+            fp.write(data)
+            fp.flush()
+            mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                assert list(TokenTable.from_items(mapped, items)) == items
+            finally:
+                mapped.close()
+
+
+class TestTokenRange:
+
+    def test_parse_matches_plain_parse(self):
+        table, plain, tabled = parse_both()
+        assert tabled == plain
+        assert tabled.to_data() == plain.to_data()
+        for node in tabled.depth_first():
+            if node.tokens:
+                assert isinstance(node.tokens, TokenRange)
+                assert node.tokens.items is None
+
+    def test_runs_and_node_api(self):
+        table, plain, tabled = parse_both()
+        block = tabled.find_one('Block')
+        # The braces are separated by the block's statements.
+        assert block.tokens.runs == [4, 5, 13, 14]
+        assert [item.text for item in block.tokens] == ['{', '}']
+        assert block.tokens[-1].text == '}'
+        assert block.tokens[0:1] == [table[4]]
+        assign = tabled.find_one('Assign')
+        assert assign.tokens.runs == [0, 4]
+        assert assign.first() == table[0]
+        assert assign.first_token() is Token.Name
+        assert assign.first_text() == 'a'
+        assert len(assign.tokens) == 4
+
+    def test_foreign_items_fall_back_to_a_list(self):
+        table, plain, tabled = parse_both()
+        assign = tabled.find_one('Assign')
+        extra = Item(999, Token.Name, 'zz')
+        assign.extend([extra])
+        assert assign.tokens.items == list(table)[0:4] + [extra]
+        assert assign.tokens[-1] == extra
+        assign.tokens[:] = []
+        assert not assign.tokens
+
+    def test_no_table_outside_parse(self):
+        table, plain, tabled = parse_both()
+        assert grammar.Module().tokens == []
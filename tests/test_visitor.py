@@ -0,0 +1,185 @@
+from treebie import Node
+from treebie.visitor import (
+    NodeVisitor, NodeTransformer, Find, visit_all, SKIP, REMOVE)
+
+
+class Module(Node):
+    pass
+
+
+class Call(Node):
+    pass
+
+
+class Name(Node):
+    pass
+
+
+def make_tree():
+    root = Module()
+    call = root.append(Call(func='f'))
+    call.append(Name(id='a'))
+    call.append(Name(id='b'))
+    root.append(Name(id='c'))
+    return root
+
+
+class Recorder(NodeVisitor):
+
+    def __init__(self):
+        self.events = []
+
+    def visit_Call(self, node):
+        self.events.append(('enter', node['func']))
+
+    def leave_Call(self, node):
+        self.events.append(('leave', node['func']))
+
+    def visit_Name(self, node):
+        self.events.append(('name', node['id']))
+
+    def finish(self, root):
+        return self.events
+
+
+class TestNodeVisitor:
+
+    def test_order(self):
+        events = Recorder().visit(make_tree())
+        assert events == [
+            ('enter', 'f'), ('name', 'a'), ('name', 'b'),
+            ('leave', 'f'), ('name', 'c')]
+
+    def test_skip(self):
+        class Skipper(Recorder):
+            def visit_Call(self, node):
+                Recorder.visit_Call(self, node)
+                return SKIP
+
+        events = Skipper().visit(make_tree())
+        assert events == [('enter', 'f'), ('leave', 'f'), ('name', 'c')]
+
+    def test_handlers_cached_per_class(self):
+        Recorder().visit(make_tree())
+        table = Recorder.__dict__['_handlers']
+        assert table[Call] == (Recorder.visit_Call, Recorder.leave_Call)
+        assert table[Module] == (None, None)
+        assert '_handlers' not in NodeVisitor.__dict__
+
+    def test_generic_visit(self):
+        class Everything(NodeVisitor):
+            def __init__(self):
+                self.seen = []
+
+            def generic_visit(self, node):
+                self.seen.append(type(node).__name__)
+
+        visitor = Everything()
+        visitor.visit(make_tree())
+        assert visitor.seen == ['Module', 'Call', 'Name', 'Name', 'Name']
+
+    def test_deep_tree(self):
+        root = this = Module()
+        for _ in range(5000):
+            this = this.append(Name(id='x'))
+
+        class Count(NodeVisitor):
+            count = 0
+
+            def visit_Name(self, node):
+                self.count += 1
+
+        visitor = Count()
+        visitor.visit(root)
+        assert visitor.count == 5000
+
+
+class TestNodeTransformer:
+
+    def test_replace(self):
+        class Rename(NodeTransformer):
+            def visit_Name(self, node):
+                return Name(id=node['id'].upper())
+
+        root = Rename().visit(make_tree())
+        ids = [node['id'] for node in root.find('Name')]
+        assert ids == ['A', 'B', 'C']
+        for node in root.find('Name'):
+            assert node.parent.children[node.index()] is node
+
+    def test_remove(self):
+        class Prune(NodeTransformer):
+            def visit_Name(self, node):
+                if node['id'] != 'b':
+                    return REMOVE
+
+        root = Prune().visit(make_tree())
+        assert [node['id'] for node in root.find('Name')] == ['b']
+
+    def test_children_first(self):
+        class Flatten(NodeTransformer):
+            def visit_Name(self, node):
+                return Name(id=node['id'] * 2)
+
+            def visit_Call(self, node):
+                ids = [child['id'] for child in node.children]
+                return Name(id='+'.join(ids))
+
+        root = Flatten().visit(make_tree())
+        assert [node['id'] for node in root.children] == ['aa+bb', 'cc']
+
+    def test_replace_root(self):
+        class NewRoot(NodeTransformer):
+            def visit_Module(self, node):
+                return Module(replaced=True)
+
+        root = NewRoot().visit(make_tree())
+        assert root == Module(replaced=True)
+
+
+class TestVisitAll:
+
+    def test_same_results_as_separate_passes(self):
+        tree = make_tree()
+        events, names, calls = visit_all(
+            tree, [Recorder(), Find('Name'), Find('Call', func='f')])
+        assert events == Recorder().visit(tree)
+        assert names == list(tree.find('Name'))
+        assert calls == list(tree.find('Call', func='f'))
+
+    def test_find_operators(self):
+        tree = make_tree()
+        found, = visit_all(tree, [Find('Name', id__in=('a', 'c'))])
+        assert [node['id'] for node in found] == ['a', 'c']
+        found, = visit_all(tree, [Find(id__ne='a')])
+        assert [node['id'] for node in found] == ['b', 'c']
+
+    def test_skip_only_affects_one_pass(self):
+        class Skipper(Recorder):
+            def visit_Call(self, node):
+                Recorder.visit_Call(self, node)
+                return SKIP
+
+        skipped, events, names = visit_all(
+            make_tree(), [Skipper(), Recorder(), Find('Name')])
+        assert skipped == [('enter', 'f'), ('leave', 'f'), ('name', 'c')]
+        assert len(events) == 5
+        assert len(names) == 3
+
+    def test_only_interested_passes_are_routed(self):
+        calls = []
+
+        class Spy(NodeVisitor):
+            def visit_Call(self, node):
+                calls.append(node)
+
+        visit_all(make_tree(), [Spy(), Find('Name')])
+        assert len(calls) == 1
+
+    def test_transformer(self):
+        class Rename(NodeTransformer):
+            def visit_Name(self, node):
+                return Name(id=node['id'].upper())
+
+        root, names = visit_all(make_tree(), [Rename(), Find('Name')])
+        assert [node['id'] for node in root.find('Name')] == ['A', 'B', 'C']
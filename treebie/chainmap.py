@@ -21,8 +21,16 @@ class ChainMap(MutableMapping):
             self._inst = inst
 
     def __get__(self, inst, _type=None):
-        self._inst = inst
-        return self
+        '''Return a view bound to ``inst`` that shares this map,
+        rather than rebinding self, which would race between threads
+        reading the attribute on different instances.
+        '''
+        if inst is None:
+            return self
+        bound = self.__class__.__new__(self.__class__)
+        bound.map = self.map
+        bound._inst = inst
+        return bound
 
     @property
     def inst(self):
@@ -0,0 +1,229 @@
+'''Columnar NumPy export for corpus-wide statistics.
+
+    cols = Columns.from_trees(trees, attrs=('name',))
+    cols.group_counts()                         # {'Call': 91234, ...}
+    calls = cols.mask('Call')
+    in_tests = cols.within(cols.mask('FunctionDef', name='test_main'))
+    cols.nodes_for(calls & in_tests)
+
+One or more trees are flattened in pre-order into parallel arrays, one
+row per node: a type code, the row of the parent (-1 for roots), the
+depth, the number of children, the row of the last descendant, the
+index of the tree the row belongs to, and one column per requested
+dict attribute. A node's subtree is the contiguous range of rows from
+the node to its last descendant, so subtree and ancestry queries are
+range and prefix-sum operations over whole arrays instead of Python
+loops over nodes.
+
+Attribute columns holding only numbers (or bools) get a numeric
+dtype, with NaN where a node doesn't have the key; any other column is
+an object array with None for missing values.
+
+NumPy is an optional dependency; this module imports without it, but
+building Columns raises ImportError.
+'''
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+_missing = object()
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError('treebie.columnar requires numpy.')
+
+
+def _column(values):
+    '''Build the array for one attribute column.
+    '''
+    present = [value for value in values if value is not _missing]
+    numeric = all(
+        isinstance(value, (int, float, bool)) for value in present)
+    if numeric and present:
+        if len(present) == len(values):
+            return np.array(values)
+        return np.array(
+            [np.nan if value is _missing else value for value in values],
+            dtype=float)
+    column = np.empty(len(values), dtype=object)
+    column[:] = [None if value is _missing else value for value in values]
+    return column
+
+
+class Columns(object):
+
+    def __init__(self, nodes, type_names, types, parents, depths,
+                 child_counts, exits, trees, attrs):
+        self.nodes = nodes
+        self.type_names = type_names
+        self.types = types
+        self.parents = parents
+        self.depths = depths
+        self.child_counts = child_counts
+        self.exits = exits
+        self.trees = trees
+        self.attrs = attrs
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __repr__(self):
+        return 'Columns(%d rows, attrs=%r)' % (len(self), sorted(self.attrs))
+
+    @classmethod
+    def from_tree(cls, root, attrs=()):
+        return cls.from_trees([root], attrs)
+
+    @classmethod
+    def from_trees(cls, roots, attrs=()):
+        '''Flatten the trees into columns, with a column for each of
+        the dict keys in ``attrs``.
+        '''
+        _require_numpy()
+        nodes = []
+        type_codes = {}
+        type_names = []
+        types = []
+        parents = []
+        depths = []
+        child_counts = []
+        exits = []
+        trees = []
+        values = dict((attr, []) for attr in attrs)
+
+        for tree, root in enumerate(roots):
+            stack = [(root, -1, 0, False)]
+            while stack:
+                node, parent, depth, done = stack.pop()
+                if done:
+                    exits[parent] = len(nodes) - 1
+                    continue
+                row = len(nodes)
+                nodes.append(node)
+                nodekey = node.get_nodekey()
+                code = type_codes.get(nodekey)
+                if code is None:
+                    code = type_codes[nodekey] = len(type_names)
+                    type_names.append(nodekey)
+                types.append(code)
+                parents.append(parent)
+                depths.append(depth)
+                exits.append(row)
+                trees.append(tree)
+                for attr, column in values.items():
+                    column.append(node.get(attr, _missing))
+
+                children = node.__dict__.get('children') or ()
+                child_counts.append(len(children))
+                if children:
+                    stack.append((node, row, depth, True))
+                    for child in reversed(children):
+                        stack.append((child, row, depth + 1, False))
+
+        return cls(
+            nodes, type_names,
+            types=np.array(types, dtype=np.int32),
+            parents=np.array(parents, dtype=np.int64),
+            depths=np.array(depths, dtype=np.int32),
+            child_counts=np.array(child_counts, dtype=np.int32),
+            exits=np.array(exits, dtype=np.int64),
+            trees=np.array(trees, dtype=np.int32),
+            attrs=dict((attr, _column(column))
+                       for attr, column in values.items()))
+
+    # -----------------------------------------------------------------------
+    # Masks.
+    # -----------------------------------------------------------------------
+    def type_mask(self, *nodekeys):
+        codes = [self.type_names.index(key) for key in nodekeys
+                 if key in self.type_names]
+        return np.isin(self.types, codes)
+
+    def mask(self, nodekey=None, **attrs):
+        '''Rows with the given nodekey (if any) whose attribute columns
+        equal the given values.
+        '''
+        if nodekey is None:
+            result = np.ones(len(self), dtype=bool)
+        else:
+            result = self.type_mask(nodekey)
+        for attr, value in attrs.items():
+            result &= self.attrs[attr] == value
+        return result
+
+    def subtree_mask(self, row, include_self=True):
+        '''Rows in the subtree of the node at ``row``.
+        '''
+        result = np.zeros(len(self), dtype=bool)
+        start = row if include_self else row + 1
+        result[start:self.exits[row] + 1] = True
+        return result
+
+    def within(self, ancestors, include_self=False):
+        '''Rows that are descendants of any row in the ``ancestors``
+        mask (or the rows themselves, with include_self).
+        '''
+        rows = np.flatnonzero(ancestors)
+        starts = rows if include_self else rows + 1
+        # +1 where each subtree starts, -1 after it ends; a running sum
+        # counts the selected ancestors covering each row.
+        delta = np.zeros(len(self) + 1, dtype=np.int64)
+        np.add.at(delta, starts, 1)
+        np.add.at(delta, self.exits[rows] + 1, -1)
+        return np.cumsum(delta[:-1]) > 0
+
+    def roots(self):
+        return self.parents == -1
+
+    # -----------------------------------------------------------------------
+    # Aggregates.
+    # -----------------------------------------------------------------------
+    def group_counts(self, by=None, mask=None):
+        '''Count rows by nodekey, or by the values of the attribute
+        column ``by``, optionally among the rows in ``mask``.
+        '''
+        if by is None:
+            types = self.types if mask is None else self.types[mask]
+            counts = np.bincount(types, minlength=len(self.type_names))
+            return dict((name, int(count)) for name, count
+                        in zip(self.type_names, counts) if count)
+        column = self.attrs[by]
+        if mask is not None:
+            column = column[mask]
+        if column.dtype == object:
+            # Mixed or unorderable values can't go through np.unique.
+            counts = Counter(column.tolist())
+            counts.pop(None, None)
+            return dict(counts)
+        if column.dtype.kind == 'f':
+            column = column[~np.isnan(column)]
+        keys, counts = np.unique(column, return_counts=True)
+        return dict(zip(keys.tolist(), counts.tolist()))
+
+    def depth_histogram(self, mask=None):
+        depths = self.depths if mask is None else self.depths[mask]
+        return np.bincount(depths)
+
+    def subtree_sizes(self):
+        return self.exits - np.arange(len(self)) + 1
+
+    # -----------------------------------------------------------------------
+    # Back to nodes.
+    # -----------------------------------------------------------------------
+    def rows(self, mask):
+        return np.flatnonzero(mask)
+
+    def nodes_for(self, mask_or_rows):
+        '''Return the original nodes for a boolean mask or an array of
+        rows, in row (document) order for masks.
+        '''
+        rows = np.asarray(mask_or_rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+        nodes = self.nodes
+        return [nodes[row] for row in rows.tolist()]
@@ -0,0 +1,232 @@
+'''Memoized computed attributes that stay correct as the tree changes.
+
+    class MyNode(ComputedMixin, BaseNode):
+
+        @synthesized
+        def size(self):
+            return 1 + sum(child.size for child in self.children)
+
+        @inherited
+        def scope(self):
+            parent = getattr(self, 'parent', None)
+            if parent is None:
+                return ()
+            if 'name' in parent:
+                return parent.scope + (parent['name'],)
+            return parent.scope
+
+A computed attribute is evaluated on first access and cached on the
+node. Unlike CachedAttr, the cache is invalidated when the tree
+changes, and only on the nodes whose values could depend on the
+change. That's decided by the kind of attribute:
+
+- a ``synthesized`` attribute may read the node's own dict, its
+  children's dicts and its children's synthesized attributes;
+- an ``inherited`` attribute may read the node's own dict, its
+  parent's dict and its parent's inherited attributes.
+
+So a change to a node's dict invalidates its synthesized values and
+those of its ancestors, and its inherited values and those of its
+descendants. Attaching or detaching a node invalidates the synthesized
+values above both its old and new parent, and the inherited values of
+the node and its descendants. Each walk stops at the first node that
+has nothing cached, which makes invalidation proportional to the
+region that actually has to be recomputed.
+
+Changes made through the dict methods, ``parent`` and the mutation
+methods are seen; changes made directly to a ``children`` list aren't.
+Use ``invalidate`` after those.
+
+Evaluating an attribute on a deep tree for the first time recurses
+once per level. ``evaluate`` computes it iteratively instead, in the
+order its kind requires.
+'''
+from treebie.node import BaseNode, ParentHookMixin
+
+
+class ComputedAttr(object):
+
+    #: The key of the node's cache dict in its __dict__.
+    cache_attr = None
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.name)
+
+    def __get__(self, inst, cls):
+        if inst is None:
+            return self
+        attrs = inst.__dict__
+        cache = attrs.get(self.cache_attr)
+        if cache is None:
+            cache = attrs[self.cache_attr] = {}
+        try:
+            return cache[self.name]
+        except KeyError:
+            pass
+        self.depend(inst)
+        value = cache[self.name] = self.func(inst)
+        return value
+
+    def depend(self, inst):
+        '''Record what the value about to be computed for ``inst``
+        will read, so that changes to it are seen.
+        '''
+
+    def order(self, root):
+        '''Return the nodes under ``root`` in an order in which each
+        value can be computed without recursing.
+        '''
+        raise NotImplementedError()
+
+
+class synthesized(ComputedAttr):
+    '''A value computed from the node and its children.
+    '''
+    cache_attr = '_synthesized'
+
+    def order(self, root):
+        nodes = list(_preorder(root))
+        nodes.reverse()
+        return nodes
+
+
+class inherited(ComputedAttr):
+    '''A value computed from the node and its parent.
+    '''
+    cache_attr = '_inherited'
+
+    def depend(self, inst):
+        # Marks the parent so that changes to its dict reach this node.
+        parent = getattr(inst, 'parent', None)
+        if parent is not None:
+            parent.__dict__['_read_by_children'] = True
+
+    def order(self, root):
+        return _preorder(root)
+
+
+def _preorder(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = node.__dict__.get('children')
+        if children:
+            stack.extend(reversed(children))
+
+
+# ---------------------------------------------------------------------------
+# Invalidation.
+# ---------------------------------------------------------------------------
+def _invalidate_up(node):
+    '''Clear synthesized values from ``node`` upwards, stopping after
+    the first node that had none cached.
+    '''
+    while node is not None:
+        if node.__dict__.pop('_synthesized', None) is None:
+            return
+        node = getattr(node, 'parent', None)
+
+
+def _invalidate_down(node):
+    '''Clear inherited values from ``node`` downwards, not descending
+    below nodes that had none cached.
+    '''
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.__dict__.pop('_inherited', None) is not None:
+            children = node.__dict__.get('children')
+            if children:
+                stack.extend(children)
+
+
+class ComputedMixin(ParentHookMixin):
+
+    def parent_changed(self, old_parent):
+        super(ComputedMixin, self).parent_changed(old_parent)
+        _invalidate_up(old_parent)
+        _invalidate_up(getattr(self, 'parent', None))
+        _invalidate_down(self)
+
+    def data_changed(self):
+        '''Called after the node's dict was changed.
+        '''
+        attrs = self.__dict__
+        attrs.pop('_synthesized', None)
+        _invalidate_up(getattr(self, 'parent', None))
+        attrs.pop('_inherited', None)
+        if attrs.pop('_read_by_children', None):
+            for child in attrs.get('children') or ():
+                _invalidate_down(child)
+
+    def invalidate(self):
+        '''Clear every computed value that could depend on this node
+        or its children, such as after editing ``children`` directly.
+        '''
+        for node in _preorder(self):
+            node.__dict__.pop('_synthesized', None)
+            node.__dict__.pop('_inherited', None)
+        _invalidate_up(getattr(self, 'parent', None))
+
+    def evaluate(self, name):
+        '''Compute the attribute ``name`` throughout this subtree
+        without deep recursion, and return its value on this node.
+        '''
+        attr = getattr(type(self), name)
+        if isinstance(attr, inherited):
+            # Values above this node are needed first.
+            for node in reversed(list(self.ancestors())):
+                getattr(node, name)
+        for node in attr.order(self):
+            getattr(node, name)
+        return getattr(self, name)
+
+    def remove(self, child):
+        super(ComputedMixin, self).remove(child)
+        _invalidate_up(self)
+
+    # -----------------------------------------------------------------------
+    # Dict methods that change the node's data.
+    # -----------------------------------------------------------------------
+    def __setitem__(self, key, value):
+        super(ComputedMixin, self).__setitem__(key, value)
+        self.data_changed()
+
+    def __delitem__(self, key):
+        super(ComputedMixin, self).__delitem__(key)
+        self.data_changed()
+
+    def update(self, *args, **kwargs):
+        super(ComputedMixin, self).update(*args, **kwargs)
+        self.data_changed()
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def pop(self, *args):
+        value = super(ComputedMixin, self).pop(*args)
+        self.data_changed()
+        return value
+
+    def popitem(self):
+        item = super(ComputedMixin, self).popitem()
+        self.data_changed()
+        return item
+
+    def clear(self):
+        super(ComputedMixin, self).clear()
+        self.data_changed()
+
+
+class ComputedNode(ComputedMixin, BaseNode):
+    '''A basic node that supports computed attributes.
+    '''
@@ -0,0 +1,273 @@
+'''A content-addressed store for many revisions of many trees.
+
+    store = CorpusStore('corpus.db')
+    store.put('src/app.py', 'r1', tree)
+    store.put_many(('src/app.py', 'r2', tree2), ...)
+    tree = store.get('src/app.py', 'r1')
+
+Each subtree is hashed from its type, its dict, its tokens and the
+hashes of its children, and stored once however many trees and
+revisions it appears in; a tree is kept as a reference to its root
+subtree. Token positions are stored relative to the first position in
+their subtree, so a subtree that only moved between revisions (because
+something before it was edited) is still stored once.
+
+Node data has to be JSON-serializable, as for ``to_data``. Other
+attributes (beyond ``tokens`` and ``children``) aren't stored. The
+store is a SQLite database, so several processes can use it at once;
+``put_many`` writes its trees in one transaction. Reading a tree
+fetches its subtrees a level at a time, so it takes a query per level
+of depth (per 500 distinct subtrees) rather than per node.
+'''
+import json
+import zlib
+import sqlite3
+import hashlib
+
+from hercules.tokentype import string_to_tokentype
+
+from treebie.node import BaseNode
+from treebie.syntaxnode.tokentable import Item
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS subtrees (
+    hash BLOB PRIMARY KEY,
+    body BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS revisions (
+    name TEXT NOT NULL,
+    revision TEXT NOT NULL,
+    root BLOB NOT NULL,
+    base INTEGER,
+    PRIMARY KEY (name, revision)
+);
+'''
+
+# SQLite's default limit on query parameters is 999.
+_BATCH = 500
+
+
+def _encode_text(text):
+    if isinstance(text, bytes):
+        return {'b': text.hex()}
+    return text
+
+
+def _decode_text(text):
+    if isinstance(text, dict):
+        return bytes.fromhex(text['b'])
+    return text
+
+
+def _postorder(root):
+    stack = [(root, False)]
+    while stack:
+        node, visited = stack.pop()
+        if visited:
+            yield node
+            continue
+        stack.append((node, True))
+        children = node.__dict__.get('children')
+        if children:
+            stack.extend((child, False) for child in reversed(children))
+
+
+def encode_tree(root):
+    '''Return the root's hash, the root's base position and a dict of
+    the bodies of the tree's distinct subtrees by hash.
+    '''
+    bodies = {}
+    # id(node) -> (hash, base)
+    encoded = {}
+    names = {}
+    for node in _postorder(root):
+        tokens = node.__dict__.get('tokens') or ()
+        positions = [item[0] for item in tokens]
+        children = []
+        for child in node.__dict__.get('children') or ():
+            children.append(encoded.pop(id(child)))
+        positions.extend(base for _, base in children if base is not None)
+        base = min(positions) if positions else None
+
+        token_data = []
+        for pos, token, text in tokens:
+            name = names.get(token)
+            if name is None:
+                name = names[token] = token.as_json()
+            token_data.append([pos - base, name, _encode_text(text)])
+        child_data = [
+            [digest.hex(), None if child_base is None else child_base - base]
+            for digest, child_base in children]
+        body = json.dumps(
+            [node.fqname(), node, token_data, child_data],
+            sort_keys=True, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha256(body).digest()
+        bodies[digest] = body
+        encoded[id(node)] = (digest, base)
+    digest, base = encoded[id(root)]
+    return digest, base, bodies
+
+
+class CorpusStore(object):
+
+    def __init__(self, path=':memory:', level=6):
+        self.path = path
+        self.level = level
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_SCHEMA)
+        self._tokentypes = {}
+
+    def __repr__(self):
+        return 'CorpusStore(%r)' % self.path
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # -----------------------------------------------------------------------
+    # Writing.
+    # -----------------------------------------------------------------------
+    def put(self, name, revision, tree):
+        self.put_many([(name, revision, tree)])
+
+    def put_many(self, entries):
+        '''Store each ``(name, revision, tree)`` in one transaction.
+        A tree already stored under the same name and revision is
+        replaced.
+        '''
+        with self.db:
+            for name, revision, tree in entries:
+                digest, base, bodies = encode_tree(tree)
+                self._write_subtrees(bodies)
+                self.db.execute(
+                    'INSERT OR REPLACE INTO revisions VALUES (?, ?, ?, ?)',
+                    (name, revision, digest, base))
+
+    def _write_subtrees(self, bodies):
+        digests = list(bodies)
+        missing = set(digests)
+        for i in range(0, len(digests), _BATCH):
+            batch = digests[i:i + _BATCH]
+            query = 'SELECT hash FROM subtrees WHERE hash IN (%s)' % (
+                ','.join('?' * len(batch)))
+            for (digest,) in self.db.execute(query, batch):
+                missing.discard(bytes(digest))
+        level = self.level
+        self.db.executemany(
+            'INSERT OR IGNORE INTO subtrees VALUES (?, ?)',
+            ((digest, zlib.compress(bodies[digest], level))
+             for digest in missing))
+
+    # -----------------------------------------------------------------------
+    # Reading.
+    # -----------------------------------------------------------------------
+    def _fetch(self, digests, bodies):
+        '''Load the bodies of the digests not in ``bodies`` yet.
+        '''
+        wanted = [digest for digest in set(digests) if digest not in bodies]
+        for i in range(0, len(wanted), _BATCH):
+            batch = wanted[i:i + _BATCH]
+            query = 'SELECT hash, body FROM subtrees WHERE hash IN (%s)' % (
+                ','.join('?' * len(batch)))
+            for digest, body in self.db.execute(query, batch):
+                bodies[bytes(digest)] = json.loads(zlib.decompress(body))
+        for digest in wanted:
+            if digest not in bodies:
+                raise KeyError('Subtree %s is missing.' % digest.hex())
+
+    def _build(self, digest, base, bodies, node_cls):
+        '''Fetch the tree a level at a time into records, breadth
+        first, and build it with ``from_records``.
+        '''
+        types = []
+        parents = []
+        attrs = []
+        tokens = []
+        level = [(-1, digest, base)]
+        while level:
+            self._fetch([digest for _, digest, _ in level], bodies)
+            next_level = []
+            for parent, digest, base in level:
+                fqname, data, node_tokens, children = bodies[digest]
+                index = len(types)
+                types.append(fqname)
+                parents.append(parent)
+                attrs.append(data)
+                tokens.append((base, node_tokens))
+                for child, offset in children:
+                    next_level.append((
+                        index, bytes.fromhex(child),
+                        None if offset is None else base + offset))
+            level = next_level
+
+        root = node_cls.from_records(types, parents, attrs)
+        # from_records keeps the records' order among siblings, so
+        # walking the tree breadth first visits the records in order.
+        nodes = [root]
+        tokentypes = self._tokentypes
+        for node, (base, node_tokens) in zip(nodes, tokens):
+            if node_tokens:
+                items = node.tokens
+                for pos, name, text in node_tokens:
+                    token = tokentypes.get(name)
+                    if token is None:
+                        token = tokentypes[name] = string_to_tokentype(name)
+                    items.append(Item(base + pos, token, _decode_text(text)))
+            children = node.__dict__.get('children')
+            if children:
+                nodes.extend(children)
+        return root
+
+    def get(self, name, revision, node_cls=BaseNode):
+        '''Return a new tree for the name and revision. Node classes
+        are resolved as by ``node_cls.from_records``.
+        '''
+        row = self.db.execute(
+            'SELECT root, base FROM revisions WHERE name = ? AND revision = ?',
+            (name, revision)).fetchone()
+        if row is None:
+            raise KeyError((name, revision))
+        digest, base = row
+        return self._build(bytes(digest), base, {}, node_cls)
+
+    def get_many(self, keys, node_cls=BaseNode):
+        '''Generate ``(name, revision, tree)`` for each key, sharing
+        the subtrees fetched between the trees.
+        '''
+        bodies = {}
+        for name, revision in keys:
+            row = self.db.execute(
+                'SELECT root, base FROM revisions '
+                'WHERE name = ? AND revision = ?',
+                (name, revision)).fetchone()
+            if row is None:
+                raise KeyError((name, revision))
+            digest, base = row
+            yield name, revision, self._build(
+                bytes(digest), base, bodies, node_cls)
+
+    def revisions(self, name=None):
+        '''Return the stored (name, revision) pairs.
+        '''
+        if name is None:
+            cursor = self.db.execute(
+                'SELECT name, revision FROM revisions ORDER BY name, revision')
+        else:
+            cursor = self.db.execute(
+                'SELECT name, revision FROM revisions WHERE name = ? '
+                'ORDER BY revision', (name,))
+        return cursor.fetchall()
+
+    def stats(self):
+        subtrees, size = self.db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) '
+            'FROM subtrees').fetchone()
+        revisions, = self.db.execute(
+            'SELECT COUNT(*) FROM revisions').fetchone()
+        return dict(subtrees=subtrees, revisions=revisions, bytes=size)
@@ -0,0 +1,408 @@
+'''Structural diffing of BaseNode trees.
+
+    script = diff(old_tree, new_tree)
+    for op in script:
+        print(op)
+    old_tree = script.apply()    # old_tree now equals new_tree
+
+Nodes are first matched with structural hashes: subtrees that occur
+exactly once in both trees are paired up wherever they are, then the
+children of each matched pair are aligned by hash and, in the gaps, by
+type. On mostly unchanged trees this is close to linear. The edit
+script is then derived from the matching:
+
+- ``Delete`` detaches old subtrees that have no counterpart,
+- ``Update`` replaces the dict contents (and tokens) of matched nodes
+  that differ,
+- ``Move`` detaches a matched node and inserts it at its new place,
+- ``Insert`` adds new nodes (copied from the new tree without their
+  children, which get their own operations).
+
+Operations reference nodes of the old tree directly, and ``apply``
+performs them with ``detatch`` and ``insert`` in order.
+'''
+import difflib
+
+
+def default_token_key(item):
+    '''Token positions shift whenever earlier text changes, so by
+    default they're left out of the structural hash. Matched nodes
+    whose tokens differ still get an ``Update``.
+    '''
+    return tuple(item[1:])
+
+
+def _freeze(value):
+    try:
+        hash(value)
+    except TypeError:
+        pass
+    else:
+        return value
+    if isinstance(value, dict):
+        return frozenset((key, _freeze(val)) for key, val in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_freeze, value))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(map(_freeze, value))
+    return repr(value)
+
+
+def node_hash(node, child_hashes, token_key=default_token_key):
+    '''Hash a node's type, dict contents, tokens and child hashes.
+    '''
+    tokens = node.__dict__.get('tokens')
+    if tokens:
+        tokens = tuple(_freeze(token_key(item)) for item in tokens)
+    else:
+        tokens = ()
+    items = frozenset((key, _freeze(val)) for key, val in node.items())
+    return hash((type(node), items, tokens, tuple(child_hashes)))
+
+
+def structural_hashes(root, token_key=default_token_key):
+    '''Return a dict mapping id(node) to the structural hash of the
+    subtree under each node.
+    '''
+    hashes = {}
+    stack = [(root, False)]
+    while stack:
+        node, done = stack.pop()
+        children = node.__dict__.get('children') or ()
+        if done:
+            child_hashes = [hashes[id(child)] for child in children]
+            hashes[id(node)] = node_hash(node, child_hashes, token_key)
+            continue
+        stack.append((node, True))
+        stack.extend((child, False) for child in children)
+    return hashes
+
+
+def _preorder(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = node.__dict__.get('children')
+        if children:
+            stack.extend(reversed(children))
+
+
+def _children(node):
+    return node.__dict__.get('children') or ()
+
+
+# ---------------------------------------------------------------------------
+# Edit operations.
+# ---------------------------------------------------------------------------
+class Operation(object):
+    __slots__ = ()
+
+    def __repr__(self):
+        args = ', '.join('%s=%r' % (name, getattr(self, name))
+                         for name in self.__slots__)
+        return '%s(%s)' % (self.__class__.__name__, args)
+
+
+class Delete(Operation):
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    def apply(self):
+        self.node.detatch()
+
+
+class Update(Operation):
+    __slots__ = ('node', 'data', 'tokens')
+
+    def __init__(self, node, data, tokens=None):
+        self.node = node
+        self.data = data
+        self.tokens = tokens
+
+    def apply(self):
+        self.node.clear()
+        self.node.update(self.data)
+        if self.tokens is not None:
+            self.node.tokens[:] = self.tokens
+
+
+class Move(Operation):
+    __slots__ = ('node', 'parent', 'index')
+
+    def __init__(self, node, parent, index):
+        self.node = node
+        self.parent = parent
+        self.index = index
+
+    def apply(self):
+        self.node.detatch()
+        self.parent.insert(self.index, self.node)
+
+
+class Insert(Operation):
+    __slots__ = ('parent', 'index', 'node')
+
+    def __init__(self, parent, index, node):
+        self.parent = parent
+        self.index = index
+        self.node = node
+
+    def apply(self):
+        self.parent.insert(self.index, self.node)
+
+
+class Replace(Operation):
+    '''Replaces the old root when the two roots have different types.
+    '''
+    __slots__ = ('node', 'new')
+
+    def __init__(self, node, new):
+        self.node = node
+        self.new = new
+
+    def apply(self):
+        parent = getattr(self.node, 'parent', None)
+        if parent is not None:
+            parent.insert(self.node.detatch(), self.new)
+
+
+class EditScript(list):
+    '''A list of operations that turns ``old`` into ``new``.
+    '''
+    def __init__(self, old, new, operations=()):
+        super(EditScript, self).__init__(operations)
+        self.old = old
+        self.new = new
+
+    def apply(self):
+        '''Apply the operations to the old tree and return its root,
+        which is a different node if the root was replaced.
+        '''
+        root = self.old
+        for operation in self:
+            operation.apply()
+            if isinstance(operation, Replace) and operation.node is root:
+                root = operation.new
+        return root
+
+
+# ---------------------------------------------------------------------------
+# Matching.
+# ---------------------------------------------------------------------------
+class _Matcher(object):
+
+    def __init__(self, old, new, token_key):
+        self.old = old
+        self.new = new
+        self.old_hashes = structural_hashes(old, token_key)
+        self.new_hashes = structural_hashes(new, token_key)
+        self.old_to_new = {}
+        self.new_to_old = {}
+
+    def match(self, x, y):
+        self.old_to_new[id(x)] = y
+        self.new_to_old[id(y)] = x
+
+    def match_subtrees(self, x, y):
+        '''Match two subtrees with equal hashes node for node.
+        '''
+        for x, y in zip(_preorder(x), _preorder(y)):
+            self.match(x, y)
+
+    def is_matched(self, x=None, y=None):
+        if x is not None:
+            return id(x) in self.old_to_new
+        return id(y) in self.new_to_old
+
+    def anchor_unique_subtrees(self):
+        '''Match subtrees whose hash occurs exactly once in each tree,
+        largest (outermost) first.
+        '''
+        counts = {}
+        old_by_hash = {}
+        for node in _preorder(self.old):
+            h = self.old_hashes[id(node)]
+            counts[h] = counts.get(h, 0) + 1
+            old_by_hash[h] = node
+        new_counts = {}
+        for node in _preorder(self.new):
+            h = self.new_hashes[id(node)]
+            new_counts[h] = new_counts.get(h, 0) + 1
+
+        stack = [self.new]
+        while stack:
+            y = stack.pop()
+            h = self.new_hashes[id(y)]
+            if counts.get(h) == 1 and new_counts[h] == 1:
+                x = old_by_hash[h]
+                # The roots are already paired with each other.
+                if not self.is_matched(x=x) and not self.is_matched(y=y):
+                    self.match_subtrees(x, y)
+                    continue
+            stack.extend(reversed(_children(y)))
+
+    def align_children(self, x, y):
+        '''Match the unmatched children of a matched pair, first by
+        hash, then by type within the gaps.
+        '''
+        old_kids = [kid for kid in _children(x) if not self.is_matched(x=kid)]
+        new_kids = [kid for kid in _children(y) if not self.is_matched(y=kid)]
+        if not old_kids or not new_kids:
+            return
+
+        old_hashes = [self.old_hashes[id(kid)] for kid in old_kids]
+        new_hashes = [self.new_hashes[id(kid)] for kid in new_kids]
+        matcher = difflib.SequenceMatcher(
+            None, old_hashes, new_hashes, autojunk=False)
+        i = j = 0
+        for a, b, size in matcher.get_matching_blocks():
+            self.align_by_type(old_kids[i:a], new_kids[j:b])
+            for k in range(size):
+                self.match_subtrees(old_kids[a + k], new_kids[b + k])
+            i, j = a + size, b + size
+
+    def pair(self, x, y):
+        if self.old_hashes[id(x)] == self.new_hashes[id(y)]:
+            self.match_subtrees(x, y)
+        else:
+            self.match(x, y)
+
+    def align_by_type(self, old_kids, new_kids):
+        '''Pair nodes of the same type, preferring pairs whose children
+        are already matched to each other, then in order.
+        '''
+        candidates = {id(kid): kid for kid in old_kids}
+        for kid in new_kids:
+            for grandkid in _children(kid):
+                x = self.new_to_old.get(id(grandkid))
+                parent = getattr(x, 'parent', None)
+                if parent is None or id(parent) not in candidates:
+                    continue
+                if type(parent) is type(kid):
+                    del candidates[id(parent)]
+                    self.pair(parent, kid)
+                    break
+
+        old_kids = [kid for kid in old_kids if id(kid) in candidates]
+        i = 0
+        for kid in new_kids:
+            if self.is_matched(y=kid):
+                continue
+            for k in range(i, len(old_kids)):
+                old_kid = old_kids[k]
+                if type(old_kid) is type(kid):
+                    self.pair(old_kid, kid)
+                    i = k + 1
+                    break
+
+    def run(self):
+        self.match(self.old, self.new)
+        self.anchor_unique_subtrees()
+        # Pairs with equal hashes are matched node for node, so only
+        # pairs whose subtrees differ need their children aligned.
+        queue = [(self.old, self.new)]
+        while queue:
+            x, y = queue.pop()
+            self.align_children(x, y)
+            for kid in _children(y):
+                old_kid = self.new_to_old.get(id(kid))
+                if old_kid is not None and (
+                        self.old_hashes[id(old_kid)] !=
+                        self.new_hashes[id(kid)]):
+                    queue.append((old_kid, kid))
+
+
+# ---------------------------------------------------------------------------
+# Generating the script.
+# ---------------------------------------------------------------------------
+def _shallow_copy(node):
+    new = type(node)(node)
+    tokens = node.__dict__.get('tokens')
+    if tokens is not None:
+        new.tokens.extend(tokens)
+    return new
+
+
+def _index_of(nodes, node):
+    for i, other in enumerate(nodes):
+        if other is node:
+            return i
+
+
+def diff(old, new, token_key=default_token_key):
+    '''Return an EditScript that turns the tree ``old`` into ``new``.
+    ``token_key`` maps each token to the part of it that's hashed.
+    '''
+    if type(old) is not type(new):
+        return EditScript(old, new, [Replace(old, new.clone())])
+
+    matcher = _Matcher(old, new, token_key)
+    matcher.run()
+    old_to_new = matcher.old_to_new
+    new_to_old = matcher.new_to_old
+    script = EditScript(old, new)
+
+    # Delete the outermost unmatched old subtrees, and keep a shadow
+    # copy of each remaining children list to simulate the edits.
+    shadow = {}
+    parents = {}
+    for x in _preorder(old):
+        kids = []
+        for kid in _children(x):
+            parents[id(kid)] = x
+            if id(kid) in old_to_new or id(x) not in old_to_new:
+                kids.append(kid)
+            else:
+                script.append(Delete(kid))
+                del parents[id(kid)]
+        shadow[id(x)] = kids
+
+    # Updates.
+    for x in _preorder(old):
+        y = old_to_new.get(id(x))
+        if y is None:
+            continue
+        x_tokens = x.__dict__.get('tokens')
+        y_tokens = y.__dict__.get('tokens')
+        tokens = None
+        if (x_tokens or []) != (y_tokens or []):
+            tokens = list(y_tokens or [])
+        if dict.__ne__(x, y) or tokens is not None:
+            script.append(Update(x, dict(y), tokens))
+
+    # Moves and inserts, top-down in the new tree. Old children that
+    # will be moved elsewhere are stepped over rather than pushed
+    # aside, since they'll leave on their own.
+    def leaving(node, y):
+        y_node = old_to_new.get(id(node))
+        return y_node is not None and getattr(y_node, 'parent', None) is not y
+
+    for y in _preorder(new):
+        target = new_to_old[id(y)]
+        kids = shadow.setdefault(id(target), [])
+        pos = 0
+        for y_kid in _children(y):
+            while pos < len(kids) and leaving(kids[pos], y):
+                pos += 1
+            x_kid = new_to_old.get(id(y_kid))
+            if x_kid is None:
+                x_kid = _shallow_copy(y_kid)
+                new_to_old[id(y_kid)] = x_kid
+                script.append(Insert(target, pos, x_kid))
+            elif pos < len(kids) and kids[pos] is x_kid:
+                pos += 1
+                continue
+            else:
+                current = parents.get(id(x_kid))
+                if current is not None:
+                    siblings = shadow[id(current)]
+                    del siblings[_index_of(siblings, x_kid)]
+                script.append(Move(x_kid, target, pos))
+            kids.insert(pos, x_kid)
+            parents[id(x_kid)] = target
+            pos += 1
+
+    return script
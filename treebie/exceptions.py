@@ -10,4 +10,9 @@ class ConfigurationError(Exception):
 class AmbiguousNodeNameError(Exception):
     '''Raised if the user was silly and used an
     ambiguous string reference to a node class.
-    '''
\ No newline at end of file
+    '''
+
+
+class FrozenNodeError(TypeError):
+    '''Raised on an attempt to change a frozen node.
+    '''
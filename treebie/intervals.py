@@ -0,0 +1,130 @@
+'''Document-order interval numbering for fast containment and
+"all X within Y" queries.
+
+    class MyNode(IntervalMixin, BaseNode):
+        pass
+
+Each tree gets a ``DocumentOrder`` index, built lazily on the first
+query. It numbers the nodes in pre-order and records, for each node,
+the position of its last descendant, so that A contains B exactly
+when ``A.enter < B.enter <= A.exit``. It also keeps the sorted
+positions of each nodekey, which turns ``find(nodekey)`` into two
+bisections and a slice.
+
+Setting or deleting a node's parent, or calling ``remove``, marks the
+indexes of the trees involved as stale, and the next query rebuilds
+them. Changes made directly to a ``children`` list aren't seen. The
+mixin combines with PathCacheMixin, which makes the ``getroot`` call
+in each rebuild O(1).
+'''
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+from hercules import IteratorDictFilter
+
+from treebie.node import BaseNode, ParentHookMixin
+
+
+class DocumentOrder(object):
+    '''The pre-order numbering of one tree.
+    '''
+    __slots__ = ('root', 'nodes', 'exits', 'by_nodekey', 'stale')
+
+    def __init__(self, root):
+        self.root = root
+        self.nodes = nodes = []
+        self.exits = exits = []
+        self.by_nodekey = by_nodekey = defaultdict(list)
+        self.stale = False
+
+        stack = [(root, None)]
+        while stack:
+            node, enter = stack.pop()
+            if enter is not None:
+                exits[enter] = len(nodes) - 1
+                continue
+            enter = len(nodes)
+            nodes.append(node)
+            exits.append(enter)
+            by_nodekey[node.get_nodekey()].append(enter)
+            node.__dict__['_order'] = (self, enter)
+            children = node.__dict__.get('children')
+            if children:
+                stack.append((node, enter))
+                stack.extend((child, None) for child in reversed(children))
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def within(self, enter, nodekey):
+        '''Return the nodes with the given nodekey in the subtree whose
+        root is at position ``enter``, in document order.
+        '''
+        positions = self.by_nodekey.get(nodekey)
+        if not positions:
+            return []
+        start = bisect_left(positions, enter)
+        stop = bisect_right(positions, self.exits[enter], start)
+        nodes = self.nodes
+        return [nodes[i] for i in positions[start:stop]]
+
+
+class IntervalMixin(ParentHookMixin):
+
+    def parent_changed(self, old_parent):
+        super(IntervalMixin, self).parent_changed(old_parent)
+        for node in (self, getattr(self, 'parent', None)):
+            entry = node is not None and node.__dict__.get('_order')
+            if entry:
+                entry[0].stale = True
+
+    def remove(self, child):
+        super(IntervalMixin, self).remove(child)
+        entry = self.__dict__.get('_order')
+        if entry is not None:
+            entry[0].stale = True
+
+    def document_order(self):
+        '''Return (index, position) for this node, rebuilding its
+        tree's index if it's stale.
+        '''
+        entry = self.__dict__.get('_order')
+        if entry is None or entry[0].stale:
+            DocumentOrder(self.getroot())
+            entry = self.__dict__['_order']
+        return entry
+
+    def interval(self):
+        '''Return this node's (enter, exit) pre-order positions.
+        '''
+        index, enter = self.document_order()
+        return enter, index.exits[enter]
+
+    # -----------------------------------------------------------------------
+    # Querying methods.
+    # -----------------------------------------------------------------------
+    def is_ancestor_of(self, other):
+        index, enter = self.document_order()
+        other_index, other_enter = other.document_order()
+        if index is not other_index:
+            return False
+        return enter < other_enter <= index.exits[enter]
+
+    def find(self, nodekey=None, max_depth=None, **kwargs):
+        '''With a nodekey and no max_depth, the matches are found by
+        range lookup in the document order index. Otherwise this
+        falls back to walking the subtree.
+        '''
+        if nodekey is None or max_depth is not None:
+            return super(IntervalMixin, self).find(
+                nodekey, max_depth=max_depth, **kwargs)
+        index, enter = self.document_order()
+        gen = iter(index.within(enter, nodekey))
+        if kwargs:
+            gen = IteratorDictFilter(gen).filter(**kwargs)
+        return IteratorDictFilter(gen)
+
+
+class IntervalNode(IntervalMixin, BaseNode):
+    '''A basic node with document-order numbering.
+    '''
@@ -0,0 +1,325 @@
+'''A per-tree log of structural and attribute changes.
+
+    class MyNode(JournalMixin, BaseNode):
+        pass
+
+    journal = Journal(root)
+    journal.subscribe(index.on_change)
+    mark = journal.checkpoint()
+    root.append(MyNode(name='x'))
+    root.children[0]['name'] = 'y'
+    journal.entries[mark:]   # [ChildInserted(...), ValueChanged(...)]
+    journal.rollback(mark)
+
+Nodes using JournalMixin report each change to the journal of their
+tree: ``ChildInserted`` and ``ChildRemoved`` for ``append``,
+``insert`` and ``remove`` (so ``detatch``, ``replace`` and
+``swap_type``, which are built on them, are covered too), and
+``ValueChanged`` for each key changed by the dict methods. Every
+change carries the node and the position or key involved, and knows
+how to undo itself.
+
+A journal attaches to a root and its current nodes. Nodes attached
+later pick it up from their new parent; nodes detached keep reporting
+to it, so that rolling back over the detach stays consistent.
+
+Every node in a journaled tree has to use JournalMixin, or its changes
+would go unrecorded: attaching a journal to a tree with other nodes,
+or adding such a node to a journaled tree, raises TypeError. For
+``SyntaxNode.parse(items, journal=journal)``, that means every node
+class the grammar creates.
+
+Nodes without a journal skip recording entirely. With one, each change
+also creates and stores a change record, which roughly doubles the
+cost of building a tree node by node.
+
+Subscribers are called with each change as it happens, and with the
+inverse changes a rollback performs. With ``keep=False`` a journal
+only notifies subscribers and doesn't store the entries.
+'''
+from treebie.node import BaseNode
+
+
+class _Missing(object):
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+#: The old or new value of a key that wasn't or isn't set.
+MISSING = _Missing()
+
+
+# ---------------------------------------------------------------------------
+# Change records.
+# ---------------------------------------------------------------------------
+class Change(object):
+    __slots__ = ()
+
+    def __repr__(self):
+        args = ', '.join('%s=%r' % (name, getattr(self, name))
+                         for name in self.__slots__)
+        return '%s(%s)' % (self.__class__.__name__, args)
+
+    def undo(self):
+        '''Apply the inverse change, and return it.
+        '''
+        raise NotImplementedError()
+
+
+class ChildInserted(Change):
+    '''``old_parent`` is the child's parent before it was inserted,
+    which is set when it was added without being removed elsewhere,
+    as ``replace`` does with the replaced node's children.
+    '''
+    __slots__ = ('node', 'index', 'child', 'old_parent')
+
+    def __init__(self, node, index, child, old_parent=None):
+        self.node = node
+        self.index = index
+        self.child = child
+        self.old_parent = old_parent
+
+    def undo(self):
+        self.node.remove(self.child)
+        if self.old_parent is not None:
+            self.child.parent = self.old_parent
+        elif getattr(self.child, 'parent', None) is self.node:
+            del self.child.parent
+        return ChildRemoved(self.node, self.index, self.child)
+
+
+class ChildRemoved(Change):
+    __slots__ = ('node', 'index', 'child')
+
+    def __init__(self, node, index, child):
+        self.node = node
+        self.index = index
+        self.child = child
+
+    def undo(self):
+        self.node.insert(self.index, self.child)
+        return ChildInserted(self.node, self.index, self.child)
+
+
+class ValueChanged(Change):
+    __slots__ = ('node', 'key', 'old', 'new')
+
+    def __init__(self, node, key, old, new):
+        self.node = node
+        self.key = key
+        self.old = old
+        self.new = new
+
+    def undo(self):
+        if self.old is MISSING:
+            del self.node[self.key]
+        else:
+            self.node[self.key] = self.old
+        return ValueChanged(self.node, self.key, self.new, self.old)
+
+
+# ---------------------------------------------------------------------------
+# The journal.
+# ---------------------------------------------------------------------------
+class Journal(object):
+
+    def __init__(self, root=None, keep=True):
+        self.entries = []
+        self.subscribers = []
+        self.keep = keep
+        self.paused = False
+        if root is not None:
+            self.attach(root)
+
+    def __repr__(self):
+        return 'Journal(%d entries)' % len(self.entries)
+
+    def attach(self, root):
+        '''Make the journal record changes to the tree under ``root``.
+        Raises TypeError if a node in the tree doesn't use JournalMixin.
+        '''
+        _propagate(root, self)
+        return root
+
+    def record(self, change):
+        if self.paused:
+            return
+        if self.keep:
+            self.entries.append(change)
+        for subscriber in self.subscribers:
+            subscriber(change)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def checkpoint(self):
+        '''Return a mark to roll back to.
+        '''
+        return len(self.entries)
+
+    def rollback(self, mark=0):
+        '''Undo the changes recorded since ``mark``, newest first.
+        '''
+        undone = self.entries[mark:]
+        del self.entries[mark:]
+        self.paused = True
+        try:
+            inverses = [change.undo() for change in reversed(undone)]
+        finally:
+            self.paused = False
+        for inverse in inverses:
+            for subscriber in self.subscribers:
+                subscriber(inverse)
+
+    def since(self, mark):
+        return self.entries[mark:]
+
+    def clear(self):
+        '''Drop the recorded entries. Earlier marks become invalid.
+        '''
+        del self.entries[:]
+
+
+def _parent_of(node):
+    # Avoids the AttributeError getattr would raise for new nodes.
+    # ParentHookMixin keeps the parent under ``_parent``, and
+    # WeakParentMixin a reference to it under ``_parent_ref``.
+    attrs = node.__dict__
+    if 'parent' in attrs:
+        return attrs['parent']
+    if '_parent' in attrs or '_parent_ref' in attrs:
+        return getattr(node, 'parent', None)
+
+
+def _propagate(root, journal):
+    '''Give the nodes under ``root`` the journal. Every node has to
+    use JournalMixin; otherwise TypeError is raised before any of them
+    is changed, since changes to that node would go unrecorded.
+    '''
+    attrs = root.__dict__
+    if not attrs.get('children'):
+        if not isinstance(root, JournalMixin):
+            _not_journaled(root)
+        attrs['_journal'] = journal
+        return
+    nodes = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        attrs = node.__dict__
+        if attrs.get('_journal') is journal:
+            continue
+        if not isinstance(node, JournalMixin):
+            _not_journaled(node)
+        nodes.append(attrs)
+        children = attrs.get('children')
+        if children:
+            stack.extend(children)
+    for attrs in nodes:
+        attrs['_journal'] = journal
+
+
+def _not_journaled(node):
+    msg = ("Can't journal %r: its class doesn't use JournalMixin, so its "
+           "changes wouldn't be recorded.")
+    raise TypeError(msg % node)
+
+
+class JournalMixin(object):
+
+    @property
+    def journal(self):
+        return self.__dict__.get('_journal')
+
+    # -----------------------------------------------------------------------
+    # Structural changes.
+    # -----------------------------------------------------------------------
+    def append(self, child, related=True):
+        journal = self.__dict__.get('_journal')
+        if journal is None or not related:
+            return super(JournalMixin, self).append(child, related)
+        _propagate(child, journal)
+        old_parent = _parent_of(child)
+        super(JournalMixin, self).append(child, related)
+        journal.record(ChildInserted(
+            self, len(self.children) - 1, child, old_parent))
+        return child
+
+    def insert(self, index, child):
+        journal = self.__dict__.get('_journal')
+        if journal is None:
+            return super(JournalMixin, self).insert(index, child)
+        size = len(self.children)
+        if index < 0:
+            index = max(0, size + index)
+        index = min(index, size)
+        _propagate(child, journal)
+        old_parent = _parent_of(child)
+        super(JournalMixin, self).insert(index, child)
+        journal.record(ChildInserted(self, index, child, old_parent))
+        return child
+
+    def remove(self, child):
+        journal = self.__dict__.get('_journal')
+        if journal is None:
+            return super(JournalMixin, self).remove(child)
+        index = child.index()
+        super(JournalMixin, self).remove(child)
+        journal.record(ChildRemoved(self, index, child))
+
+    # -----------------------------------------------------------------------
+    # Attribute changes.
+    # -----------------------------------------------------------------------
+    def __setitem__(self, key, value):
+        journal = self.__dict__.get('_journal')
+        if journal is None:
+            return super(JournalMixin, self).__setitem__(key, value)
+        old = self.get(key, MISSING)
+        super(JournalMixin, self).__setitem__(key, value)
+        journal.record(ValueChanged(self, key, old, value))
+
+    def __delitem__(self, key):
+        journal = self.__dict__.get('_journal')
+        if journal is None:
+            return super(JournalMixin, self).__delitem__(key)
+        old = self[key]
+        super(JournalMixin, self).__delitem__(key)
+        journal.record(ValueChanged(self, key, old, MISSING))
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super(JournalMixin, self).pop(key, *default)
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self):
+        key, value = super(JournalMixin, self).popitem()
+        journal = self.__dict__.get('_journal')
+        if journal is not None:
+            journal.record(ValueChanged(self, key, value, MISSING))
+        return key, value
+
+    def clear(self):
+        for key in list(self):
+            del self[key]
+
+
+class JournalNode(JournalMixin, BaseNode):
+    '''A basic node that reports changes to its tree's journal.
+    '''
@@ -0,0 +1,95 @@
+'''Keeping big trees from loading the cyclic garbage collector.
+
+    class MyNode(WeakParentMixin, BaseNode):
+        pass
+
+    with gc_paused():
+        tree = build_big_tree()
+    ...
+    tree.dispose()
+
+Every attached node normally makes a ``parent`` <-> ``children``
+reference cycle, so a tree is only freed by a full collection, and
+while a big tree is being built the collector keeps rescanning its
+young nodes. There are three ways around that, which can be combined:
+
+WeakParentMixin keeps ``parent`` as a weak reference, so trees have
+no cycles and are freed by reference counting as soon as the root is
+dropped. Something has to keep the root alive: a node whose root is
+gone has no parent. When parsing, ``SyntaxNode.parse`` holds the start
+node for the duration of the parse.
+
+``BaseNode.dispose()`` breaks the cycles of an ordinary tree in one
+pass when it's no longer needed.
+
+``gc_paused()`` turns automatic collection off while a tree is being
+built, and ``SyntaxNode.parse(items, pause_gc=True)`` does that for
+a parse. Pauses nest, across threads too; collection is turned back
+on when the outermost one ends, if it was on to begin with. For a
+tree that's kept for the rest of the process, ``gc.freeze()`` after
+building it keeps later collections from scanning it again.
+'''
+import gc
+import weakref
+import threading
+import contextlib
+
+from treebie.node import BaseNode, ParentHookMixin
+
+
+class WeakParentMixin(ParentHookMixin):
+    '''Stores ``parent`` as a weak reference.
+    '''
+    @property
+    def parent(self):
+        try:
+            parent = self.__dict__['_parent_ref']()
+        except KeyError:
+            raise AttributeError('parent')
+        if parent is None:
+            raise AttributeError('parent')
+        return parent
+
+    @parent.setter
+    def parent(self, parent):
+        old = self.__dict__.get('_parent_ref')
+        self.__dict__['_parent_ref'] = weakref.ref(parent)
+        self.parent_changed(old and old())
+
+    @parent.deleter
+    def parent(self):
+        try:
+            old = self.__dict__.pop('_parent_ref')
+        except KeyError:
+            raise AttributeError('parent')
+        self.parent_changed(old())
+
+
+class WeakParentNode(WeakParentMixin, BaseNode):
+    '''A basic node with a weak reference to its parent.
+    '''
+
+
+# ---------------------------------------------------------------------------
+# Pausing collection.
+# ---------------------------------------------------------------------------
+_pause_lock = threading.Lock()
+_pause_state = dict(depth=0, was_enabled=False)
+
+
+@contextlib.contextmanager
+def gc_paused():
+    '''Turn automatic garbage collection off for the duration.
+    '''
+    with _pause_lock:
+        if not _pause_state['depth']:
+            _pause_state['was_enabled'] = gc.isenabled()
+            gc.disable()
+        _pause_state['depth'] += 1
+    try:
+        yield
+    finally:
+        with _pause_lock:
+            _pause_state['depth'] -= 1
+            if not _pause_state['depth'] and _pause_state['was_enabled']:
+                gc.enable()
@@ -5,12 +5,14 @@ import json
 import uuid
 import inspect
 import operator
+import functools
+import threading
 import contextlib
 from collections import defaultdict
 
 from hercules import (
         CachedAttr, CachedClassAttr, NoClobberDict,
-        KeyClobberError, memoize_methodcalls, LoopInterface,
+        KeyClobberError, LoopInterface,
         iterdict_filter, IteratorDictFilter, DictFilterMixin)
 
 from treebie.chainmap import ChainMap
@@ -21,6 +23,39 @@ from treebie.resolvers import (
 from treebie.exceptions import ConfigurationError
 
 
+class AtomicCachedAttr(CachedAttr):
+    '''Like CachedAttr, but safe when several threads get the attr
+    for the first time at once: the first value stored wins, and every
+    thread gets that one, so nothing is ever written to a discarded
+    copy.
+    '''
+    def __get__(self, inst, cls):
+        if inst is None:
+            return self
+        return inst.__dict__.setdefault(self.name, self.method(inst))
+
+
+def memoize_noderefs(func):
+    '''Like hercules' memoize_methodcalls, but misses are resolved
+    under a lock, so that a ref resolves to the same class in every
+    thread even if a resolver creates the class.
+    '''
+    cache = func._memoize_cache = {}
+    lock = threading.RLock()
+
+    @functools.wraps(func)
+    def memoizer(self, ref):
+        try:
+            return cache[ref]
+        except KeyError:
+            pass
+        with lock:
+            if ref not in cache:
+                cache[ref] = func(self, ref)
+            return cache[ref]
+    return memoizer
+
+
 class NodeList(list, DictFilterMixin):
     '''A list subclass that exposes a LoopInterface when
     invoked as a context manager, and can also be iterated
@@ -60,7 +95,7 @@ class BaseNode(dict):
 
     ChildrenWrapper = NodeList
 
-    @CachedAttr
+    @AtomicCachedAttr
     def children(self):
         return self.ChildrenWrapper()
 
@@ -101,7 +136,7 @@ class BaseNode(dict):
     # -----------------------------------------------------------------------
     # Methods related to instance state.
     # -----------------------------------------------------------------------
-    @CachedAttr
+    @AtomicCachedAttr
     def ctx(self):
         '''For values that are accessible to children
         and inherit from parents.
@@ -119,11 +154,11 @@ class BaseNode(dict):
     # -----------------------------------------------------------------------
     # Plumbing methods for resolve stringy node references.
     # -----------------------------------------------------------------------
-    @CachedAttr
+    @AtomicCachedAttr
     def resolvers(self):
         return [cls() for cls in self.noderef_resolvers]
 
-    @memoize_methodcalls
+    @memoize_noderefs
     def resolve_noderef(self, ref):
         '''Given a string, resolve it to a class definition. The
         various resolver methods may be slow, so the results of this
@@ -192,6 +227,24 @@ class BaseNode(dict):
         '''
         self.children.pop(child.index())
 
+    def dispose(self):
+        '''Detach this node and break the reference cycles in its
+        subtree in one pass, so it's freed by reference counting
+        instead of waiting for a full garbage collection. The nodes
+        are left empty and shouldn't be used afterwards.
+        '''
+        if getattr(self, 'parent', None) is not None:
+            self.detatch()
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            attrs = node.__dict__
+            children = attrs.get('children')
+            if children:
+                stack.extend(children)
+            attrs.clear()
+            dict.clear(node)
+
     # -----------------------------------------------------------------------
     # High-level mutation methods. String references to types allowed.
     # -----------------------------------------------------------------------
@@ -337,6 +390,33 @@ class BaseNode(dict):
                 yield parent
             this = parent
 
+    def getdepth(self):
+        '''Return the number of ancestors this node has.
+        '''
+        depth = 0
+        for _ in self.ancestors():
+            depth += 1
+        return depth
+
+    def is_ancestor_of(self, other):
+        for ancestor in other.ancestors():
+            if ancestor is self:
+                return True
+        return False
+
+    def common_ancestor(self, other):
+        '''Return the lowest node that is this node or one of its
+        ancestors and also other or one of its ancestors, or None if
+        they're in different trees.
+        '''
+        mine = {id(self)}
+        mine.update(map(id, self.ancestors()))
+        if id(other) in mine:
+            return other
+        for ancestor in other.ancestors():
+            if id(ancestor) in mine:
+                return ancestor
+
     def get_nodekey(self):
         '''This method enables subclasses to customize the
         behavior of ``find`` and ``find_one``. The default
@@ -385,13 +465,16 @@ class BaseNode(dict):
         dict(attr='children', to_data=_children_to_data),
         )
 
-    def to_data(self):
+    def to_data(self, children=True):
         '''Render out this object as a json-serializable dictionary.
+        With children=False, only this node is rendered.
         '''
         data = dict(data=dict(self))
         serialization_meta = getattr(self, 'serialization_meta', [])
         for meta in self._serialization_meta + tuple(serialization_meta):
             attr = meta['attr']
+            if attr == 'children' and not children:
+                continue
             alias = meta.get('alias', attr)
             to_data = meta.get('to_data')
             value = getattr(self, attr)
@@ -423,7 +506,8 @@ class BaseNode(dict):
             node.append(child)
 
         # Add any other attrs marked for inclusion by the class def.
-        for meta in cls._serialization_meta + tuple(cls.serialization_meta):
+        serialization_meta = getattr(node_cls, 'serialization_meta', [])
+        for meta in node_cls._serialization_meta + tuple(serialization_meta):
             meta = dict(meta)
             if meta.get('alias') == 'type':
                 continue
@@ -457,17 +541,166 @@ class BaseNode(dict):
         with open(filename) as f:
             return self.from_fp(f)
 
+    @classmethod
+    def from_records(cls, types, parents, attrs=None, tokens=None):
+        '''Build a tree from parallel sequences and return its root.
+        ``types[i]`` is the class or node ref of record i, and
+        ``parents[i]`` the index of its parent, or -1 for the root.
+        Parents must come before their children, as in preorder, and
+        children keep the order of their records. ``attrs[i]``, if
+        given, is a mapping of the node's data, or None, and
+        ``tokens[i]`` the items to add to the node's ``tokens``, or
+        None.
+
+        Each distinct type is resolved once, and children lists are
+        filled in place instead of going through ``append``.
+        '''
+        size = len(types)
+        if len(parents) != size:
+            raise ValueError('Got %d types but %d parents.' % (
+                size, len(parents)))
+        if attrs is None:
+            attrs = (None,) * size
+
+        # Resolve each distinct type once. Called from here directly
+        # so the type creator finds the caller's module.
+        proto = cls()
+        resolved = {}
+        for ref in types:
+            if ref not in resolved:
+                resolved[ref] = proto.resolve_noderef(ref)
+
+        nodes = []
+        for ref, data in zip(types, attrs):
+            node_cls = resolved[ref]
+            nodes.append(node_cls(data) if data else node_cls())
+        if tokens is not None:
+            for node, items in zip(nodes, tokens):
+                if items:
+                    node.tokens.extend(items)
+
+        counts = [0] * size
+        root = None
+        for index, parent in enumerate(parents):
+            if parent is None or parent < 0:
+                if root is not None:
+                    raise ValueError('Records %d and %d are both roots.' % (
+                        root, index))
+                root = index
+            elif parent < index:
+                counts[parent] += 1
+            else:
+                msg = 'Record %d comes before its parent %d.'
+                raise ValueError(msg % (index, parent))
+        if root is None:
+            raise ValueError('The records have no root.')
+
+        for node, count in zip(nodes, counts):
+            if count:
+                node.__dict__['children'] = node.ChildrenWrapper(
+                    [None] * count)
+
+        filled = [0] * size
+        for index, parent in enumerate(parents):
+            if parent is None or parent < 0:
+                continue
+            node = nodes[parent]
+            child = nodes[index]
+            node.children[filled[parent]] = child
+            filled[parent] += 1
+            child.parent = node
+        return nodes[root]
+
+    def to_records(self):
+        '''Return this subtree as ``(types, parents, attrs)`` lists in
+        preorder, in the form ``from_records`` takes. Types are given
+        as fully qualified names. SyntaxNode adds a fourth list, of
+        the nodes' tokens.
+        '''
+        types = []
+        parents = []
+        attrs = []
+        stack = [(self, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index = len(types)
+            types.append(node.fqname())
+            parents.append(parent)
+            attrs.append(dict(node))
+            children = node.__dict__.get('children')
+            if children:
+                stack.extend((child, index) for child in reversed(children))
+        return types, parents, attrs
+
+    def to_corpus(self, store, name, revision):
+        '''Store this tree as the given revision of ``name`` in a
+        treebie.corpus.CorpusStore.
+        '''
+        store.put(name, revision, self)
+
+    @classmethod
+    def from_corpus(cls, store, name, revision):
+        '''Load a revision of a tree from a treebie.corpus.CorpusStore.
+        '''
+        return store.get(name, revision, node_cls=cls)
+
+    @classmethod
+    def export_corpus(cls, store, entries):
+        '''Store each ``(name, revision, tree)`` in one transaction.
+        '''
+        store.put_many(entries)
+
+    @classmethod
+    def import_corpus(cls, store, keys):
+        '''Generate ``(name, revision, tree)`` for each (name, revision)
+        key, fetching subtrees shared between the trees once.
+        '''
+        return store.get_many(keys, node_cls=cls)
+
     #------------------------------------------------------------------------
     # Random utils.
     #------------------------------------------------------------------------
-    @CachedAttr
+    @AtomicCachedAttr
     def uuid(self):
         '''Just a convenience for quickly generating uuid4's. The built-in
         ``id`` function is probably more idiomatic for most purposes.
+        For cheap ids that survive serialization, see treebie.nodeids.
         '''
         return str(uuid.uuid4())
 
 
+class ParentHookMixin(object):
+    '''Stores ``parent`` behind a property, and calls
+    ``parent_changed`` whenever it's set or deleted. Mixins that keep
+    derived structural data extend ``parent_changed`` and call super.
+    '''
+    @property
+    def parent(self):
+        try:
+            return self.__dict__['_parent']
+        except KeyError:
+            raise AttributeError('parent')
+
+    @parent.setter
+    def parent(self, parent):
+        old = self.__dict__.get('_parent')
+        self.__dict__['_parent'] = parent
+        self.parent_changed(old)
+
+    @parent.deleter
+    def parent(self):
+        try:
+            old = self.__dict__.pop('_parent')
+        except KeyError:
+            raise AttributeError('parent')
+        self.parent_changed(old)
+
+    def parent_changed(self, old_parent):
+        '''Called after the node's parent was set or deleted, with the
+        previous parent (or None).
+        '''
+
+
 def new_basenode(*bases):
     '''Create a new base node type with its own distinct nodespace.
     This provides a way to reuse node names without name conflicts in the
@@ -0,0 +1,168 @@
+'''Small integer node ids, unique within a tree.
+
+    class MyNode(NodeIdMixin, BaseNode):
+        pass
+
+    node.node_id              # 7
+    root.node_for(7)          # node
+    data = root.to_data()     # each node's data includes its 'id'
+    MyNode.fromdata(data).node_for(7) == node
+
+Ids are allocated in increasing order from a counter kept with the
+tree's IdTable, which also maps each id to its node. The table is
+built the first time an id is asked for, numbering the tree in
+preorder, and is shared by every node of the tree, so ``node_for``
+is O(1) from any of them.
+
+Once a tree has a table, attaching and detaching nodes keeps it
+current: attached nodes keep their ids unless one is already taken in
+the new tree, in which case they get a fresh one, and a detached
+subtree takes its ids along into a table of its own. Ids aren't
+reused within a table. Trees that never ask for ids don't pay for any
+of this; attaching a node is then a couple of dict lookups.
+
+Ids are only unique per tree; key results across trees or processes
+on the pair of something identifying the tree and the id. Classes
+that define their own ``serialization_meta`` should include
+``NodeIdMixin.serialization_meta`` in it. All nodes in a tree should
+use the mixin.
+'''
+from treebie.node import BaseNode, ParentHookMixin
+
+
+class IdTable(object):
+    '''Maps the ids of a tree's nodes to the nodes.
+    '''
+    __slots__ = ('nodes', 'next_id')
+
+    def __init__(self):
+        self.nodes = {}
+        self.next_id = 0
+
+    def __repr__(self):
+        return 'IdTable(%d nodes)' % len(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node_id):
+        return node_id in self.nodes
+
+    def get(self, node_id, default=None):
+        return self.nodes.get(node_id, default)
+
+    def add(self, node, keep=True):
+        '''Register the node, keeping its current id if it has one
+        and ``keep`` is true and the id isn't taken by another node.
+        '''
+        attrs = node.__dict__
+        node_id = attrs.get('_node_id')
+        if node_id is None or not keep or \
+                self.nodes.get(node_id, node) is not node:
+            node_id = attrs['_node_id'] = self.next_id
+        self.nodes[node_id] = node
+        if self.next_id <= node_id:
+            self.next_id = node_id + 1
+        attrs['_ids'] = self
+        return node_id
+
+    def discard(self, node):
+        attrs = node.__dict__
+        node_id = attrs.get('_node_id')
+        if self.nodes.get(node_id) is node:
+            del self.nodes[node_id]
+        if attrs.get('_ids') is self:
+            del attrs['_ids']
+
+    def add_all(self, nodes):
+        '''Register the nodes, giving the ones that already have ids
+        first claim to them.
+        '''
+        fresh = []
+        for node in nodes:
+            if node.__dict__.get('_node_id') is None:
+                fresh.append(node)
+            else:
+                self.add(node)
+        for node in fresh:
+            self.add(node)
+
+
+def _subtree(root):
+    nodes = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        children = node.__dict__.get('children')
+        if children:
+            stack.extend(reversed(children))
+    return nodes
+
+
+def _set_node_id(self, node_id):
+    '''Used by fromdata; restores a serialized id.
+    '''
+    table = self.__dict__.get('_ids')
+    if table is not None:
+        table.discard(self)
+    self.__dict__['_node_id'] = node_id
+    if table is not None:
+        table.add(self)
+
+
+class NodeIdMixin(ParentHookMixin):
+
+    serialization_meta = (dict(attr='node_id', alias='id'),)
+
+    @property
+    def id_table(self):
+        '''The IdTable of this node's tree, built on first use.
+        '''
+        table = self.__dict__.get('_ids')
+        if table is None:
+            root = self.getroot()
+            table = root.__dict__.get('_ids')
+            if table is None:
+                table = IdTable()
+                table.add_all(_subtree(root))
+        return table
+
+    def _get_node_id(self):
+        node_id = self.__dict__.get('_node_id')
+        if node_id is None or '_ids' not in self.__dict__:
+            self.id_table
+            node_id = self.__dict__['_node_id']
+        return node_id
+
+    node_id = property(_get_node_id, _set_node_id)
+
+    def node_for(self, node_id):
+        '''Return the node in this tree with the given id, or None.
+        '''
+        return self.id_table.get(node_id)
+
+    def parent_changed(self, old_parent):
+        super(NodeIdMixin, self).parent_changed(old_parent)
+        attrs = self.__dict__
+        old_table = attrs.get('_ids')
+        parent = getattr(self, 'parent', None)
+        new_table = None
+        if parent is not None:
+            new_table = parent.__dict__.get('_ids')
+        if old_table is new_table:
+            return
+        nodes = _subtree(self)
+        if old_table is not None:
+            for node in nodes:
+                old_table.discard(node)
+        if new_table is not None:
+            new_table.add_all(nodes)
+        elif parent is None:
+            # Detached from a tree with ids: keep them in a new table.
+            IdTable().add_all(nodes)
+
+
+class IdNode(NodeIdMixin, BaseNode):
+    '''A basic node with tree-unique integer ids.
+    '''
@@ -0,0 +1,195 @@
+'''Reading one tree from several threads.
+
+Concurrency model
+-----------------
+
+A tree may be read from any number of threads at once, as long as no
+thread changes it in the meantime. Reading covers traversal, ``find``,
+visitors, ``ctx`` lookups, ``to_data`` and equality. The lazily
+created per-node attributes (``children``, ``ctx``, ``resolvers``,
+``tokens``, ``uuid``) are initialized with a single atomic
+``dict.setdefault``, so threads that race to create one all end up
+with the same object. ``resolve_noderef`` resolves a missing name
+under a lock, so it resolves to the same class in every thread.
+
+Changing a tree while other threads read it isn't supported. To rule
+that out, freeze the tree first:
+
+    freeze(tree)
+    names = parallel_find(tree, 'Name')
+    sizes = parallel_map(len, tree.children)
+
+``freeze`` creates every node's ``children`` list up front, so that
+reading the frozen tree never writes to it. On nodes that use
+FreezableMixin it also makes the mutation methods raise
+FrozenNodeError until ``thaw`` is called. ``ctx`` stays writable, as
+it holds per-traversal scratch data rather than tree contents.
+
+On free-threaded builds (3.13+ with the GIL disabled), the helpers
+below run on several cores. With the GIL they still work, but only
+overlap with work that releases it.
+'''
+from concurrent.futures import ThreadPoolExecutor
+
+from treebie.exceptions import FrozenNodeError
+
+
+def _preorder(root):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = node.children
+        if children:
+            stack.extend(reversed(children))
+
+
+def freeze(root):
+    '''Make the tree under ``root`` read-only and return it.
+    '''
+    for node in _preorder(root):
+        node.__dict__['_frozen'] = True
+    return root
+
+
+def thaw(root):
+    '''Make a frozen tree mutable again and return it.
+    '''
+    for node in _preorder(root):
+        node.__dict__.pop('_frozen', None)
+    return root
+
+
+def is_frozen(node):
+    return node.__dict__.get('_frozen', False)
+
+
+class FreezableMixin(object):
+    '''Makes the mutation methods raise FrozenNodeError on frozen
+    nodes.
+    '''
+    def _check_frozen(self):
+        if self.__dict__.get('_frozen'):
+            msg = "Can't change the frozen node %r; thaw its tree first."
+            raise FrozenNodeError(msg % self)
+
+    def freeze(self):
+        return freeze(self)
+
+    def thaw(self):
+        return thaw(self)
+
+    def append(self, child, related=True):
+        self._check_frozen()
+        return super(FreezableMixin, self).append(child, related)
+
+    def insert(self, index, child):
+        self._check_frozen()
+        return super(FreezableMixin, self).insert(index, child)
+
+    def remove(self, child):
+        self._check_frozen()
+        return super(FreezableMixin, self).remove(child)
+
+    def __setitem__(self, key, value):
+        self._check_frozen()
+        super(FreezableMixin, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._check_frozen()
+        super(FreezableMixin, self).__delitem__(key)
+
+    def update(self, *args, **kwargs):
+        self._check_frozen()
+        super(FreezableMixin, self).update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._check_frozen()
+        return super(FreezableMixin, self).setdefault(key, default)
+
+    def pop(self, *args):
+        self._check_frozen()
+        return super(FreezableMixin, self).pop(*args)
+
+    def popitem(self):
+        self._check_frozen()
+        return super(FreezableMixin, self).popitem()
+
+    def clear(self):
+        self._check_frozen()
+        super(FreezableMixin, self).clear()
+
+
+# ---------------------------------------------------------------------------
+# Parallel helpers.
+# ---------------------------------------------------------------------------
+def _run(func, args, max_workers, executor):
+    if executor is not None:
+        return list(executor.map(func, args))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(func, args))
+
+
+def parallel_map(func, nodes, max_workers=None, executor=None):
+    '''Return ``[func(node) for node in nodes]``, calling ``func`` from
+    a thread pool. The subtrees under ``nodes`` shouldn't overlap if
+    ``func`` changes them.
+    '''
+    return _run(func, list(nodes), max_workers, executor)
+
+
+def _split(root, parts):
+    entries = [(root, True, 0)]
+    while sum(whole for _, whole, _ in entries) < parts:
+        expanded = []
+        for node, whole, depth in entries:
+            children = node.children if whole else None
+            if children:
+                expanded.append((node, False, depth))
+                expanded.extend((child, True, depth + 1) for child in children)
+            else:
+                expanded.append((node, whole, depth))
+        if len(expanded) == len(entries):
+            break
+        entries = expanded
+    return entries
+
+
+def split(root, parts):
+    '''Split the tree into at least ``parts`` subtrees where the tree
+    is big enough. Return a list of (node, whole) pairs in document
+    order, where ``whole`` is False for the nodes above the split,
+    which stand for themselves only.
+    '''
+    return [(node, whole) for node, whole, _ in _split(root, parts)]
+
+
+def parallel_find(root, nodekey=None, max_workers=None, executor=None,
+                  parts=None, max_depth=None, **kwargs):
+    '''Return the list of nodes ``root.find(nodekey, **kwargs)`` would
+    yield, in the same order, searching subtrees from a thread pool.
+    ``max_depth`` counts from ``root``, as for ``find``.
+    '''
+    if parts is None:
+        parts = 4 * (max_workers or 8)
+    entries = _split(root, parts)
+    if max_depth is not None:
+        entries = [entry for entry in entries if entry[2] <= max_depth]
+
+    def find(entry):
+        node, _, depth = entry
+        if max_depth is not None:
+            return list(node.find(
+                nodekey, max_depth=max_depth - depth, **kwargs))
+        return list(node.find(nodekey, **kwargs))
+
+    subtrees = [entry for entry in entries if entry[1]]
+    found = iter(_run(find, subtrees, max_workers, executor))
+    results = []
+    for node, whole, _ in entries:
+        if whole:
+            results.extend(next(found))
+        else:
+            results.extend(node.find(nodekey, max_depth=0, **kwargs))
+    return results
@@ -0,0 +1,149 @@
+'''Cached root, depth and ancestor metadata for trees that get queried
+more often than they get restructured.
+
+    class MyNode(PathCacheMixin, BaseNode):
+        pass
+
+With the mixin, ``getroot`` and ``getdepth`` are O(1) once the
+metadata is warm, and ``is_ancestor_of`` and ``common_ancestor`` are
+O(log depth) using binary-lifting jump pointers.
+
+The metadata is computed lazily and stamped with the generation of
+its tree, a counter kept on the tree's root. Attaching or detaching a
+node that has children bumps the generation of the tree its metadata
+came from, which invalidates every cached entry in that tree at once,
+but not in any other tree; the next query then recomputes the entries
+it needs from the nearest valid ancestor. Attaching a leaf, the common
+case while building a tree, only invalidates that leaf. All nodes in
+a tree should use the mixin.
+'''
+from treebie.node import BaseNode, ParentHookMixin
+
+
+class PathCacheMixin(ParentHookMixin):
+
+    def parent_changed(self, old_parent):
+        super(PathCacheMixin, self).parent_changed(old_parent)
+        attrs = self.__dict__
+        if attrs.get('children'):
+            # The subtree's entries, and those of the rest of the tree
+            # it came from, share this node's generation counter.
+            for attr in ('_paths', '_jumps'):
+                entry = attrs.get(attr)
+                if entry is not None and entry[1] == entry[0][0]:
+                    entry[0][0] += 1
+        else:
+            attrs.pop('_paths', None)
+            attrs.pop('_jumps', None)
+
+    # -----------------------------------------------------------------------
+    # Metadata computation.
+    # -----------------------------------------------------------------------
+    def _stale_chain(self, attr):
+        '''Return the nodes from self upwards whose ``attr`` entry is
+        stale, and the generation counter and number to stamp them
+        with: those of the nearest ancestor whose entry is valid, or
+        else of the root.
+        '''
+        chain = []
+        this = self
+        while this is not None:
+            entry = this.__dict__.get(attr)
+            if entry is not None and entry[1] == entry[0][0]:
+                return chain, this, entry[0], entry[1]
+            chain.append(this)
+            this = getattr(this, 'parent', None)
+        counter = chain[-1].__dict__.setdefault('_path_generation', [0])
+        return chain, None, counter, counter[0]
+
+    def _path_entry(self):
+        '''Return (counter, generation, root, depth) for this node.
+        '''
+        entry = self.__dict__.get('_paths')
+        if entry is not None and entry[1] == entry[0][0]:
+            return entry
+        chain, valid, counter, generation = self._stale_chain('_paths')
+        if valid is None:
+            top = chain.pop()
+            entry = top.__dict__['_paths'] = (counter, generation, top, 0)
+        else:
+            entry = valid.__dict__['_paths']
+        root, depth = entry[2], entry[3]
+        for node in reversed(chain):
+            depth += 1
+            entry = node.__dict__['_paths'] = (
+                counter, generation, root, depth)
+        return entry
+
+    def _jump_list(self):
+        '''Return the list of this node's ancestors at distances
+        1, 2, 4, 8...
+        '''
+        entry = self.__dict__.get('_jumps')
+        if entry is not None and entry[1] == entry[0][0]:
+            return entry[2]
+        chain, valid, counter, generation = self._stale_chain('_jumps')
+        for node in reversed(chain):
+            parent = getattr(node, 'parent', None)
+            jumps = []
+            if parent is not None:
+                jumps.append(parent)
+                k = 0
+                while True:
+                    above = jumps[k].__dict__['_jumps'][2]
+                    if len(above) <= k:
+                        break
+                    jumps.append(above[k])
+                    k += 1
+            entry = node.__dict__['_jumps'] = (counter, generation, jumps)
+        return entry[2]
+
+    def _ancestor_at_depth(self, depth):
+        '''Return this node's ancestor at the given depth (or self).
+        '''
+        distance = self.getdepth() - depth
+        this = self
+        k = 0
+        while distance:
+            if distance & 1:
+                this = this._jump_list()[k]
+            distance >>= 1
+            k += 1
+        return this
+
+    # -----------------------------------------------------------------------
+    # Querying methods.
+    # -----------------------------------------------------------------------
+    def getroot(self):
+        return self._path_entry()[2]
+
+    def getdepth(self):
+        return self._path_entry()[3]
+
+    def is_ancestor_of(self, other):
+        _, _, root, depth = self._path_entry()
+        _, _, other_root, other_depth = other._path_entry()
+        if root is not other_root or other_depth <= depth:
+            return False
+        return other._ancestor_at_depth(depth) is self
+
+    def common_ancestor(self, other):
+        _, _, root, depth = self._path_entry()
+        _, _, other_root, other_depth = other._path_entry()
+        if root is not other_root:
+            return None
+        this = self._ancestor_at_depth(min(depth, other_depth))
+        other = other._ancestor_at_depth(min(depth, other_depth))
+        if this is other:
+            return this
+        jumps = this._jump_list()
+        for k in reversed(range(len(jumps))):
+            these, others = this._jump_list(), other._jump_list()
+            if k < len(these) and these[k] is not others[k]:
+                this, other = these[k], others[k]
+        return this.parent
+
+
+class PathNode(PathCacheMixin, BaseNode):
+    '''A basic node with cached path metadata.
+    '''
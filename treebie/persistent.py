@@ -0,0 +1,267 @@
+'''Immutable, structurally shared trees.
+
+A PersistentNode never changes after it's built. Editing methods
+return a new node, and the path-addressed methods on a root return a
+new root that shares every subtree off the edited path with the old
+one:
+
+    v1 = PersistentNode.from_node(tree)
+    path = v1.find_path('FunctionDef', name='main')
+    v2 = v1.set_at(path, 'name', 'entry')
+    v3 = v2.append_at(path, Node(comment=True))
+    assert v1.get_in(path)['name'] == 'main'
+
+Since a node can belong to many versions at once, persistent nodes
+have no parent; nodes below the root are addressed by the tuple of
+child indexes leading to them. A version costs O(depth) new nodes
+per edit, so N versions of a tree take memory proportional to the
+edits, not N copies.
+
+VersionedTree keeps a history of roots for snapshot and rollback.
+'''
+from treebie.node import BaseNode, Node
+
+
+class PersistentNode(BaseNode):
+    '''An immutable node. ``node_type`` is the mutable class it stands
+    for, which ``to_node`` recreates and ``get_nodekey`` reports.
+    '''
+    eq_attrs = ('node_type', 'children', 'tokens')
+
+    node_type = Node
+    children = ()
+    tokens = None
+
+    @classmethod
+    def make(cls, data=(), children=(), node_type=None, tokens=None):
+        node = cls(data)
+        attrs = node.__dict__
+        attrs['children'] = tuple(children)
+        if node_type is not None:
+            attrs['node_type'] = node_type
+        if tokens is not None:
+            attrs['tokens'] = tuple(tokens)
+        return node
+
+    def _evolve(self, data=None, children=None):
+        return self.make(
+            self if data is None else data,
+            self.children if children is None else children,
+            self.node_type, self.tokens)
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return super(PersistentNode, self).__eq__(other)
+
+    def __repr__(self):
+        return 'Persistent%s(%s)' % (
+            self.node_type.__name__, dict.__repr__(self))
+
+    def get_nodekey(self):
+        return self.node_type.__name__
+
+    # -----------------------------------------------------------------------
+    # Conversion to and from mutable nodes.
+    # -----------------------------------------------------------------------
+    @classmethod
+    def from_node(cls, root):
+        '''Convert a mutable tree. Persistent subtrees are reused as is.
+        '''
+        if isinstance(root, PersistentNode):
+            return root
+        converted = {}
+        stack = [(root, False)]
+        while stack:
+            node, done = stack.pop()
+            children = node.__dict__.get('children') or ()
+            if not done:
+                stack.append((node, True))
+                stack.extend((child, False) for child in children)
+                continue
+            kids = []
+            for child in children:
+                if isinstance(child, PersistentNode):
+                    kids.append(child)
+                else:
+                    kids.append(converted.pop(id(child)))
+            converted[id(node)] = cls.make(
+                node, kids, type(node), node.__dict__.get('tokens'))
+        return converted[id(root)]
+
+    def to_node(self):
+        '''Build a mutable copy of this tree.
+        '''
+        root = None
+        stack = [(self, None)]
+        while stack:
+            node, parent = stack.pop()
+            new = node.node_type(node)
+            if node.tokens is not None:
+                new.tokens.extend(node.tokens)
+            if parent is None:
+                root = new
+            else:
+                parent.append(new)
+            stack.extend((child, new) for child in reversed(node.children))
+        return root
+
+    def to_data(self, children=True):
+        return self.to_node().to_data(children)
+
+    # -----------------------------------------------------------------------
+    # Single-node edits. Each returns a new node.
+    # -----------------------------------------------------------------------
+    def set(self, key, value):
+        data = dict(self)
+        data[key] = value
+        return self._evolve(data)
+
+    def discard(self, key):
+        data = dict(self)
+        data.pop(key, None)
+        return self._evolve(data)
+
+    def append(self, child, related=True):
+        child = self.from_node(child)
+        return self._evolve(children=self.children + (child,))
+
+    def insert(self, index, child):
+        child = self.from_node(child)
+        children = list(self.children)
+        children.insert(index, child)
+        return self._evolve(children=children)
+
+    def without(self, index):
+        children = list(self.children)
+        del children[index]
+        return self._evolve(children=children)
+
+    def with_child(self, index, child):
+        children = list(self.children)
+        children[index] = self.from_node(child)
+        return self._evolve(children=children)
+
+    def clone(self, *args, **kwargs):
+        if not args and not kwargs:
+            return self
+        data = dict(self)
+        data.update(*args, **kwargs)
+        return self._evolve(data)
+
+    # -----------------------------------------------------------------------
+    # Path-addressed edits. Each returns a new root.
+    # -----------------------------------------------------------------------
+    def get_in(self, path):
+        node = self
+        for index in path:
+            node = node.children[index]
+        return node
+
+    def update_in(self, path, func):
+        '''Return a new root in which the node at ``path`` is replaced
+        by ``func(node)``. Only the nodes along the path are copied.
+        '''
+        trail = [self]
+        for index in path:
+            trail.append(trail[-1].children[index])
+        new = func(trail.pop())
+        for index in reversed(path):
+            new = trail.pop().with_child(index, new)
+        return new
+
+    def set_at(self, path, key, value):
+        return self.update_in(path, lambda node: node.set(key, value))
+
+    def append_at(self, path, child):
+        return self.update_in(path, lambda node: node.append(child))
+
+    def insert_at(self, path, index, child):
+        return self.update_in(path, lambda node: node.insert(index, child))
+
+    def replace_at(self, path, new):
+        return self.update_in(path, lambda node: self.from_node(new))
+
+    def delete_at(self, path):
+        if not path:
+            raise ValueError("Can't delete the root.")
+        path = tuple(path)
+        return self.update_in(
+            path[:-1], lambda node: node.without(path[-1]))
+
+    # -----------------------------------------------------------------------
+    # Locating nodes by path.
+    # -----------------------------------------------------------------------
+    def walk_paths(self):
+        '''Yield (path, node) pairs in document order.
+        '''
+        stack = [((), self)]
+        while stack:
+            path, node = stack.pop()
+            yield path, node
+            children = node.children
+            for index in reversed(range(len(children))):
+                stack.append((path + (index,), children[index]))
+
+    def find_path(self, nodekey=None, **kwargs):
+        '''Return the path of the first node ``find_one`` would return
+        for the same arguments, or None.
+        '''
+        for path, node in self.walk_paths():
+            if nodekey is not None and node.get_nodekey() != nodekey:
+                continue
+            if all(node.get(key) == value for key, value in kwargs.items()):
+                return path
+
+    # -----------------------------------------------------------------------
+    # Mutation in place isn't allowed.
+    # -----------------------------------------------------------------------
+    def _immutable(self, *args, **kwargs):
+        msg = ('%s is immutable; use the methods that return a '
+               'new version instead.')
+        raise TypeError(msg % self.__class__.__name__)
+
+    __setitem__ = __delitem__ = _immutable
+    update = pop = popitem = clear = setdefault = _immutable
+    descend = descend_insert = descend_path = ascend = _immutable
+    detatch = detach = remove = replace = swap_type = _immutable
+
+
+class VersionedTree(object):
+    '''A history of persistent roots with snapshot and rollback.
+
+        tree = VersionedTree(node)
+        mark = tree.snapshot()
+        tree.edit('set_at', path, 'name', 'x')
+        tree.rollback(mark)
+    '''
+    def __init__(self, root):
+        self.versions = [PersistentNode.from_node(root)]
+
+    @property
+    def root(self):
+        return self.versions[-1]
+
+    def commit(self, root):
+        '''Record a new version and return its number.
+        '''
+        self.versions.append(PersistentNode.from_node(root))
+        return len(self.versions) - 1
+
+    def edit(self, method, *args):
+        '''Call one of the root's path-addressed methods, such as
+        ``append_at`` or ``set_at``, and record the result.
+        '''
+        return self.commit(getattr(self.root, method)(*args))
+
+    def snapshot(self):
+        return len(self.versions) - 1
+
+    def rollback(self, version):
+        '''Discard every version after ``version``.
+        '''
+        del self.versions[version + 1:]
+        return self.root
+
+    def to_node(self, version=-1):
+        return self.versions[version].to_node()
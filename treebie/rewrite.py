@@ -0,0 +1,298 @@
+'''Declarative rewrite rules applied to a fixpoint.
+
+    rules = RuleSet()
+
+    @rules.rule(Pattern('BinOp', op='+', children=[
+            Pattern('Num', bind='left'), Pattern('Num', bind='right')]))
+    def fold(node, left, right):
+        return Num(value=left['value'] + right['value'])
+
+    tree = rules.rewrite(tree)
+
+A Pattern matches a node by nodekey (or class), by dict values (or
+predicates on them) and by the shape of its children, where ``ANY``
+matches any one child and ``REST`` any number of remaining ones.
+Patterns compile to plain functions, and a RuleSet indexes its rules
+by the nodekey at the root of each pattern, so each node is only
+tested against the rules that could match it.
+
+An action gets the matched node and the nodes bound by the pattern as
+keyword arguments. It returns None if it made no change, a new node
+to take the matched node's place, ``REMOVE`` to detach it, or the
+node itself if it changed it in place.
+
+``rewrite`` checks every node once, bottom-up. After each rewrite,
+only the new or changed subtree and the ancestors a pattern could
+see from there are checked again, so the cost follows the size of
+the changes rather than the size of the tree.
+
+Actions that change a node in place may also attach and detach nodes
+below it. With RewriteHookMixin, the ``parent_changed`` hook reports
+exactly which nodes moved; without it, the whole subtree of a node
+changed in place is checked again.
+'''
+from treebie.node import ParentHookMixin
+from treebie.visitor import REMOVE, _Sentinel
+
+
+class RewriteError(Exception):
+    '''Raised when rewriting doesn't reach a fixpoint.
+    '''
+
+
+#: Matches any number of remaining children. Only valid last.
+REST = _Sentinel('REST')
+
+_missing = object()
+
+
+class Pattern(object):
+
+    def __init__(self, nodekey=None, children=None, bind=None, **attrs):
+        self.nodekey = nodekey
+        self.children = children
+        self.bind = bind
+        self.attrs = attrs
+
+    def __repr__(self):
+        return 'Pattern(%r, children=%r, bind=%r, **%r)' % (
+            self.nodekey, self.children, self.bind, self.attrs)
+
+    @property
+    def depth(self):
+        '''How many levels of the tree the pattern looks at.
+        '''
+        depths = [child.depth for child in self.children or ()
+                  if child is not REST]
+        return 1 + max(depths or [0])
+
+    @property
+    def index_key(self):
+        '''The nodekey rules with this pattern are indexed by, or None
+        if the pattern can match any node.
+        '''
+        if isinstance(self.nodekey, str):
+            return self.nodekey
+
+    def compile(self):
+        '''Return a function that takes a node and a bindings dict, and
+        returns whether the node matches, adding its bindings.
+        '''
+        checks = []
+        nodekey = self.nodekey
+        if isinstance(nodekey, str):
+            checks.append(lambda node: node.get_nodekey() == nodekey)
+        elif nodekey is not None:
+            checks.append(lambda node: isinstance(node, nodekey))
+
+        for key, value in self.attrs.items():
+            if callable(value):
+                checks.append(
+                    lambda node, key=key, pred=value: pred(node.get(key)))
+            else:
+                checks.append(
+                    lambda node, key=key, value=value:
+                        node.get(key, _missing) == value)
+
+        children = self.children
+        if children is not None:
+            rest = bool(children) and children[-1] is REST
+            if rest:
+                children = children[:-1]
+            if REST in children:
+                raise ValueError('REST can only be the last child pattern.')
+            matchers = [child.compile() for child in children]
+            count = len(matchers)
+        bind = self.bind
+
+        def match(node, bindings):
+            for check in checks:
+                if not check(node):
+                    return False
+            if children is not None:
+                kids = node.__dict__.get('children') or ()
+                if len(kids) < count or (not rest and count < len(kids)):
+                    return False
+                for matcher, kid in zip(matchers, kids):
+                    if not matcher(kid, bindings):
+                        return False
+            if bind is not None:
+                bindings[bind] = node
+            return True
+        return match
+
+
+#: Matches any single node.
+ANY = Pattern()
+
+
+class Rule(object):
+
+    def __init__(self, pattern, action, name=None):
+        self.pattern = pattern
+        self.action = action
+        self.name = name or getattr(action, '__name__', repr(action))
+        self.match = pattern.compile()
+
+    def __repr__(self):
+        return 'Rule(%r)' % self.name
+
+
+class RewriteHookMixin(ParentHookMixin):
+    '''Reports parent changes made by rewrite actions, so that
+    ``rewrite`` rechecks only the nodes that actually moved.
+    '''
+    _rewrite_log = None
+
+    def parent_changed(self, old_parent):
+        super(RewriteHookMixin, self).parent_changed(old_parent)
+        log = RewriteHookMixin._rewrite_log
+        if log is not None:
+            log.append((self, old_parent))
+
+
+class RuleSet(object):
+
+    def __init__(self, rules=()):
+        self.rules = []
+        self._by_nodekey = {}
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        self.rules.append(rule)
+        self._by_nodekey = {}
+        return rule
+
+    def rule(self, pattern, name=None):
+        '''Decorator that registers the function as a rule's action.
+        '''
+        def decorator(action):
+            self.add(Rule(pattern, action, name))
+            return action
+        return decorator
+
+    @property
+    def depth(self):
+        return max([rule.pattern.depth for rule in self.rules] or [0])
+
+    def rules_for(self, nodekey):
+        '''The rules that could match a node with this nodekey, in the
+        order they were added.
+        '''
+        try:
+            return self._by_nodekey[nodekey]
+        except KeyError:
+            rules = [rule for rule in self.rules
+                     if rule.pattern.index_key in (None, nodekey)]
+            self._by_nodekey[nodekey] = rules
+            return rules
+
+    # -----------------------------------------------------------------------
+    # Applying the rules.
+    # -----------------------------------------------------------------------
+    def apply_once(self, node):
+        '''Try the rules on a single node. Return (rule, result) for
+        the first rule whose action changed something, or None.
+        '''
+        for rule in self.rules_for(node.get_nodekey()):
+            bindings = {}
+            if not rule.match(node, bindings):
+                continue
+            result = rule.action(node, **bindings)
+            if result is not None:
+                return rule, result
+
+    def rewrite(self, root, max_rewrites=None):
+        '''Rewrite the tree until no rule applies and return the root,
+        which is a new node if the root itself was replaced (or None
+        if it was removed).
+        '''
+        depth = self.depth
+        stack = list(_postorder(root))
+        stack.reverse()
+        detached = set()
+        if max_rewrites is None:
+            max_rewrites = 100 * (len(stack) + 1)
+        rewrites = 0
+
+        def recheck(node, subtree):
+            # Ancestors go on the stack first, so they're checked after
+            # the changed nodes below them.
+            ancestors = []
+            this = getattr(node, 'parent', None)
+            while this is not None and len(ancestors) < depth - 1:
+                ancestors.append(this)
+                this = getattr(this, 'parent', None)
+            stack.extend(reversed(ancestors))
+            if subtree:
+                nodes = list(_postorder(node))
+                detached.difference_update(map(id, nodes))
+                stack.extend(reversed(nodes))
+            else:
+                stack.append(node)
+
+        while stack:
+            node = stack.pop()
+            if id(node) in detached:
+                continue
+            if node is not root and getattr(node, 'parent', None) is None:
+                continue
+
+            log = RewriteHookMixin._rewrite_log
+            RewriteHookMixin._rewrite_log = moved = []
+            try:
+                applied = self.apply_once(node)
+            finally:
+                RewriteHookMixin._rewrite_log = log
+            if applied is None:
+                continue
+            rule, result = applied
+            rewrites += 1
+            if max_rewrites < rewrites:
+                msg = 'No fixpoint after %d rewrites; last rule was %r.'
+                raise RewriteError(msg % (max_rewrites, rule))
+
+            if result is node:
+                if not isinstance(node, RewriteHookMixin):
+                    recheck(node, True)
+                    continue
+                recheck(node, False)
+                for child, old_parent in moved:
+                    if getattr(child, 'parent', None) is None:
+                        detached.update(map(id, _postorder(child)))
+                    else:
+                        recheck(child, True)
+                    if old_parent is not None and \
+                            id(old_parent) not in detached:
+                        recheck(old_parent, False)
+                continue
+
+            parent = getattr(node, 'parent', None)
+            detached.update(map(id, _postorder(node)))
+            if parent is None:
+                if result is REMOVE:
+                    return None
+                root = result
+            else:
+                index = node.detatch()
+                if result is not REMOVE:
+                    parent.insert(index, result)
+            if result is REMOVE:
+                recheck(parent, False)
+            else:
+                recheck(result, True)
+        return root
+
+
+def _postorder(root):
+    stack = [(root, False)]
+    while stack:
+        node, done = stack.pop()
+        if done:
+            yield node
+            continue
+        stack.append((node, True))
+        children = node.__dict__.get('children')
+        if children:
+            stack.extend((child, False) for child in reversed(children))
@@ -0,0 +1,353 @@
+'''Read-only tree snapshots in shared memory, for process pools.
+
+    snapshot = SharedTree.create(tree)
+    try:
+        with ProcessPoolExecutor() as pool:
+            ids = pool.map(count_calls, [snapshot] * 8, range(8))
+        nodes = snapshot.nodes_for(sum(ids, []))
+    finally:
+        snapshot.close()
+        snapshot.unlink()
+
+    def count_calls(snapshot, part):
+        return [view.id for view in snapshot.root.children[part].find('Call')]
+
+``create`` flattens the tree once into a single
+``multiprocessing.shared_memory`` block: the pre-order position of
+each node's parent and last descendant, its depth, a type code, and
+its serialized payload (what ``to_data`` returns, without children).
+A SharedTree pickles as just the block's name, so handing it to a
+worker costs the same no matter how big the tree is, and the worker
+maps the block instead of copying it.
+
+Workers see the tree through NodeView objects, which support the read
+side of the node API: dict access, ``children``, ``parent``,
+``get_nodekey``, ``depth_first``, ``find`` and ``find_one``. A node's
+payload is only decoded when its dict is first accessed, and ``find``
+by nodekey compares type codes without decoding anything. A view's
+``id`` is the node's pre-order position, which the process that
+created the snapshot turns back into nodes with ``nodes_for``.
+'''
+import json
+import array
+import struct
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+
+
+_HEADER = struct.Struct('<4sIQQQ')
+_MAGIC = b'TBSM'
+_VERSION = 1
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _layout(count, types_len, blob_len):
+    '''Return the (start, stop) byte ranges of each section.
+    '''
+    sections = {}
+    offset = _align(_HEADER.size)
+    for name, size in (('parents', 8 * count),
+                       ('exits', 8 * count),
+                       ('depths', 4 * count),
+                       ('types', 4 * count),
+                       ('offsets', 8 * (count + 1)),
+                       ('type_table', types_len),
+                       ('blob', blob_len)):
+        sections[name] = (offset, offset + size)
+        offset = _align(offset + size)
+    return sections, offset
+
+
+class SharedTree(object):
+    '''A flattened, read-only tree in a shared memory block.
+    '''
+    def __init__(self, shm, nodes=None, owner=False):
+        self.shm = shm
+        self.nodes = nodes
+        self.owner = owner
+        self._views = []
+        self._data = {}
+
+        buf = shm.buf
+        magic, version, count, types_len, blob_len = _HEADER.unpack_from(buf)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError('%r is not a tree snapshot.' % shm.name)
+        self.count = count
+        sections, _ = _layout(count, types_len, blob_len)
+
+        def section(name, fmt=None):
+            start, stop = sections[name]
+            view = buf[start:stop]
+            self._views.append(view)
+            if fmt is not None:
+                view = view.cast(fmt)
+                self._views.append(view)
+            return view
+
+        self.parents = section('parents', 'q')
+        self.exits = section('exits', 'q')
+        self.depths = section('depths', 'i')
+        self.types = section('types', 'i')
+        self.offsets = section('offsets', 'q')
+        self.blob = section('blob')
+        type_table = json.loads(bytes(section('type_table')).decode('utf-8'))
+        self.type_names = [fqname for fqname, _ in type_table]
+        self.nodekeys = [nodekey for _, nodekey in type_table]
+
+    def __repr__(self):
+        return 'SharedTree(%r, %d nodes)' % (self.name, self.count)
+
+    def __len__(self):
+        return self.count
+
+    def __reduce__(self):
+        return (SharedTree.attach, (self.name,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        if self.owner:
+            self.unlink()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    # -----------------------------------------------------------------------
+    # Creating, attaching and releasing.
+    # -----------------------------------------------------------------------
+    @classmethod
+    def create(cls, root, name=None):
+        '''Flatten the tree under ``root`` into a new shared memory
+        block. The returned snapshot owns the block.
+        '''
+        nodes = []
+        parents = []
+        exits = []
+        depths = []
+        types = []
+        offsets = [0]
+        chunks = []
+        type_codes = {}
+        type_table = []
+
+        stack = [(root, -1, 0, False)]
+        while stack:
+            node, parent, depth, done = stack.pop()
+            if done:
+                exits[parent] = len(nodes) - 1
+                continue
+            index = len(nodes)
+            nodes.append(node)
+            parents.append(parent)
+            exits.append(index)
+            depths.append(depth)
+
+            key = (type(node), node.get_nodekey())
+            code = type_codes.get(key)
+            if code is None:
+                code = type_codes[key] = len(type_table)
+                type_table.append((key[0].fqname(), key[1]))
+            types.append(code)
+
+            payload = node.to_data(children=False)
+            payload.pop('type', None)
+            chunk = json.dumps(payload).encode('utf-8')
+            chunks.append(chunk)
+            offsets.append(offsets[-1] + len(chunk))
+
+            children = node.__dict__.get('children')
+            if children:
+                stack.append((node, index, depth, True))
+                for child in reversed(children):
+                    stack.append((child, index, depth + 1, False))
+
+        type_bytes = json.dumps(type_table).encode('utf-8')
+        blob = b''.join(chunks)
+        count = len(nodes)
+        sections, size = _layout(count, len(type_bytes), len(blob))
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        buf = shm.buf
+        _HEADER.pack_into(
+            buf, 0, _MAGIC, _VERSION, count, len(type_bytes), len(blob))
+        for key, data in (('parents', array.array('q', parents)),
+                          ('exits', array.array('q', exits)),
+                          ('depths', array.array('i', depths)),
+                          ('types', array.array('i', types)),
+                          ('offsets', array.array('q', offsets)),
+                          ('type_table', type_bytes),
+                          ('blob', blob)):
+            start, stop = sections[key]
+            buf[start:stop] = memoryview(data).cast('B')
+        return cls(shm, nodes, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        '''Map an existing snapshot by name, without copying it.
+        '''
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before 3.13, attaching always registers the block with
+            # the resource tracker, which a pool shares with its parent.
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm)
+
+    def close(self):
+        '''Release this process's mapping of the block. Views of it
+        can't be used afterwards.
+        '''
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self.shm.close()
+
+    def unlink(self):
+        '''Free the block. Only the process that created it should.
+        '''
+        self.shm.unlink()
+
+    # -----------------------------------------------------------------------
+    # Access.
+    # -----------------------------------------------------------------------
+    @property
+    def root(self):
+        return NodeView(self, 0)
+
+    def view(self, id):
+        return NodeView(self, id)
+
+    def data(self, id):
+        '''Return the decoded payload of the node ``id``.
+        '''
+        try:
+            return self._data[id]
+        except KeyError:
+            start, stop = self.offsets[id], self.offsets[id + 1]
+            payload = json.loads(bytes(self.blob[start:stop]).decode('utf-8'))
+            self._data[id] = payload
+            return payload
+
+    def nodes_for(self, ids):
+        '''Map node ids back to the nodes of the original tree. Only
+        works in the process that created the snapshot.
+        '''
+        if self.nodes is None:
+            raise ValueError('Only the creating process has the nodes.')
+        return [self.nodes[id] for id in ids]
+
+    def find_ids(self, nodekey=None, start=0, max_depth=None):
+        '''Return the ids of the nodes in the subtree at ``start`` with
+        the given nodekey, in document order, without decoding any
+        payloads.
+        '''
+        stop = self.exits[start] + 1
+        ids = range(start, stop)
+        if nodekey is not None:
+            codes = set(code for code, key in enumerate(self.nodekeys)
+                        if key == nodekey)
+            types = self.types
+            ids = [id for id in ids if types[id] in codes]
+        if max_depth is not None:
+            limit = self.depths[start] + max_depth
+            depths = self.depths
+            ids = [id for id in ids if depths[id] <= limit]
+        return list(ids)
+
+
+class NodeView(Mapping):
+    '''A read-only view of one node of a SharedTree.
+    '''
+    __slots__ = ('tree', 'id')
+
+    def __init__(self, tree, id):
+        self.tree = tree
+        self.id = id
+
+    def __repr__(self):
+        return '%sView(%r)' % (self.get_nodekey(), dict(self))
+
+    def __eq__(self, other):
+        if isinstance(other, NodeView):
+            return self.tree is other.tree and self.id == other.id
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((id(self.tree), self.id))
+
+    # Dict access.
+    def _data(self):
+        return self.tree.data(self.id)['data']
+
+    def __getitem__(self, key):
+        return self._data()[key]
+
+    def __iter__(self):
+        return iter(self._data())
+
+    def __len__(self):
+        return len(self._data())
+
+    def __getattr__(self, name):
+        # Other serialized attributes, such as a SyntaxNode's tokens.
+        try:
+            return self.tree.data(self.id)[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    # Structure.
+    @property
+    def children(self):
+        tree = self.tree
+        exits = tree.exits
+        children = []
+        child = self.id + 1
+        stop = exits[self.id]
+        while child <= stop:
+            children.append(NodeView(tree, child))
+            child = exits[child] + 1
+        return children
+
+    @property
+    def parent(self):
+        parent = self.tree.parents[self.id]
+        if parent < 0:
+            return None
+        return NodeView(self.tree, parent)
+
+    def getdepth(self):
+        return self.tree.depths[self.id]
+
+    def get_nodekey(self):
+        return self.tree.nodekeys[self.tree.types[self.id]]
+
+    def type_name(self):
+        '''The fully qualified name of the original node's class.
+        '''
+        return self.tree.type_names[self.tree.types[self.id]]
+
+    # Traversal and queries.
+    def depth_first(self, max_depth=None):
+        tree = self.tree
+        for id in tree.find_ids(start=self.id, max_depth=max_depth):
+            yield NodeView(tree, id)
+
+    def find(self, nodekey=None, max_depth=None, **kwargs):
+        tree = self.tree
+        for id in tree.find_ids(nodekey, self.id, max_depth):
+            view = NodeView(tree, id)
+            if kwargs:
+                data = view._data()
+                if not all(data.get(key) == value
+                           for key, value in kwargs.items()):
+                    continue
+            yield view
+
+    def find_one(self, nodekey=None, max_depth=None, **kwargs):
+        for view in self.find(nodekey, max_depth, **kwargs):
+            return view
@@ -1,2 +1,4 @@
 from treebie.syntaxnode.base import SyntaxNode
-from treebie.syntaxnode.dispatcher import matches, tokenseq, token_subtypes
\ No newline at end of file
+from treebie.syntaxnode.dispatcher import matches, tokenseq, token_subtypes
+from treebie.syntaxnode.instrument import ParseInstrument, ParseProfiler
+from treebie.syntaxnode.lexer import Lexer, LexError, include
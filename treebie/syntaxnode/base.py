@@ -1,38 +1,67 @@
-import inspect
+import time
 from collections import defaultdict
 
-from hercules import CachedAttr, NoClobberDict, Stream
-from hercules.tokentype import Token
+from hercules import NoClobberDict, Stream
+from hercules.tokentype import Token, string_to_tokentype
 
-from treebie.node import Node
+from treebie.node import Node, AtomicCachedAttr
+from treebie.lifecycle import gc_paused
 from treebie.resolvers import (
     LazyImportResolver,
     LazySyntaxTypeCreator)
+from treebie.syntaxnode.tokentable import TokenRange, active_table
 
 
 class ParseError(Exception):
-    pass
+    '''Raised when neither the current node nor any of its ancestors
+    has a handler for the next items. ``node`` is the node that gave
+    up (or, for errors recorded by treebie.syntaxnode.recovery, the
+    node the parse had reached), ``position`` the index of the first
+    unhandled item, and
+    ``before`` and ``after`` the items around it, up to ``context``
+    on each side.
+    '''
+    def __init__(self, msg, node=None, position=None, before=(), after=()):
+        super(ParseError, self).__init__(msg)
+        self.node = node
+        self.position = position
+        self.before = before
+        self.after = after
+        #: Items dropped to recover from the error; see
+        #: treebie.syntaxnode.recovery.
+        self.skipped = 0
+
+    @property
+    def item(self):
+        if self.after:
+            return self.after[0]
+
+
+def _unresolved(error, node, itemstream):
+    '''Whether the error is this parse finding no handler for the
+    current item, rather than one raised by a handler (after consuming
+    items, or from a nested parse).
+    '''
+    return error.position == itemstream.i and error.node is node.getroot()
 
 
 class _NodeMeta(type):
+    '''Compiles the handlers registered on a node class into the
+    ``_dispatch_data`` consulted by ``SyntaxNode.resolve``.
 
-    @classmethod
-    def get_base_attrs(meta, bases):
-        '''Aggregate registered handlers from the node's base
-        classes into the instance's dict.
-        '''
-        attrs = {}
-        get_attr_dict = lambda cls: dict(inspect.getmembers(cls))
-        for base_attrs in map(get_attr_dict, bases):
-            attrs.update(base_attrs)
-        return attrs
+    Each class keeps the signature tables of its own handlers in
+    ``_own_signatures`` and the tables merged along its MRO in
+    ``_dispatch_signatures``, so only a class's own handlers get
+    compiled. Dispatchers that gain no new handlers share the base
+    class's prepared data.
+    '''
 
     @classmethod
-    def get_sorted_attrs(meta, attrs):
+    def get_sorted_attrs(meta, attrs, order=None):
         '''Sort the items if an order is given.
         '''
         items = list(attrs.items())
-        order = attrs.get('order')
+        order = attrs.get('order', order)
         if order is not None:
             def sorter(item, order=order):
                 attr, val = item
@@ -56,31 +85,88 @@ class _NodeMeta(type):
         return dispatch_data
 
     @classmethod
-    def prepare(meta, dispatch_data):
+    def get_own_signatures(meta, cls):
+        '''Return the signature tables of the handlers defined on the
+        class itself. Classes created by this metaclass already have
+        them; for anything else (plain mixins), they're collected from
+        the class dict.
+        '''
+        signatures = cls.__dict__.get('_own_signatures')
+        if signatures is not None:
+            return signatures
+        attrs = vars(cls)
+        return meta.compile_dispatch_data(
+            meta.get_sorted_attrs(attrs, getattr(cls, 'order', None)))
+
+    @classmethod
+    def merge_signatures(meta, own, mro):
+        '''Merge the class's own signature tables with those of the
+        classes in its MRO. The class's handlers come first; after
+        them, a handler from a class earlier in the MRO overrides any
+        registered for the same signature further along, as with
+        attribute lookup. Only the class's own handlers can clash.
+        '''
+        merged = defaultdict(NoClobberDict)
+        for dispatcher, signature_dict in own.items():
+            merged[dispatcher].update(signature_dict)
+        for cls in mro:
+            for dispatcher, signature_dict in \
+                    meta.get_own_signatures(cls).items():
+                this = merged[dispatcher]
+                for signature, method in signature_dict.items():
+                    if signature not in this:
+                        this[signature] = method
+        return merged
+
+    @classmethod
+    def prepare(meta, signatures, bases):
         '''Delegate further preparation of dispatch data to the
-        dispatchers used on this class.
+        dispatchers used on this class, reusing the prepared data
+        of the first base that uses the same dispatcher.
         '''
         res = {}
-        for dispatcher, signature_dict in dispatch_data.items():
-            res[dispatcher] = dispatcher.prepare(signature_dict)
+        for dispatcher, signature_dict in signatures.items():
+            for base in bases:
+                base_data = getattr(base, '_dispatch_data', {})
+                if dispatcher in base_data:
+                    break
+            else:
+                res[dispatcher] = dispatcher.prepare(signature_dict)
+                continue
+
+            base_signatures = base._dispatch_signatures[dispatcher]
+            new_signatures = {}
+            for signature, method in signature_dict.items():
+                if base_signatures.get(signature) is not method:
+                    new_signatures[signature] = method
+            if not new_signatures:
+                res[dispatcher] = base_data[dispatcher]
+            else:
+                res[dispatcher] = dispatcher.extend(
+                    base_data[dispatcher], new_signatures, signature_dict)
         return res
 
     def __new__(meta, name, bases, attrs):
-        # Merge all handlers registered on base classes into
-        # this instance.
-        _attrs = dict(attrs)
-        _attrs.update(meta.get_base_attrs(bases))
+        # Aggregate all the handlers defined on this class, in the
+        # order specified on the class, if any.
+        order = None
+        for base in bases:
+            order = getattr(base, 'order', None)
+            if order is not None:
+                break
+        items = meta.get_sorted_attrs(attrs, order)
+        own = meta.compile_dispatch_data(items)
 
-        # Get them into the order specified on the class, if any.
-        items = meta.get_sorted_attrs(_attrs)
+        cls = type.__new__(meta, name, bases, attrs)
 
-        # Aggregate all the handlers defined on this class.
-        dispatch_data = meta.compile_dispatch_data(items)
-        dispatch_data = meta.prepare(dispatch_data)
+        # Merge in the handlers registered on base classes.
+        signatures = meta.merge_signatures(own, cls.__mro__[1:])
+        dispatch_data = meta.prepare(signatures, bases)
 
         # Update the class with the dispatch data.
-        attrs.update(_dispatch_data=dispatch_data)
-        cls = type.__new__(meta, name, bases, attrs)
+        cls._own_signatures = dict(own)
+        cls._dispatch_signatures = dict(signatures)
+        cls._dispatch_data = dispatch_data
 
         return cls
 
@@ -93,9 +179,17 @@ class SyntaxNode(Node, metaclass=_NodeMeta):
         LazyImportResolver,
         LazySyntaxTypeCreator)
 
-    @CachedAttr
+    #: Token types (or their dotted names) that always start a new
+    #: top-level node when this is the start class, so a parse can be
+    #: split there; see treebie.syntaxnode.parallel.
+    split_tokens = ()
+
+    @AtomicCachedAttr
     def tokens(self):
-        return []
+        table = active_table.get()
+        if table is None:
+            return []
+        return TokenRange(table)
 
     def __repr__(self):
         return '%s(tokens=%s)' % (self.__class__.__name__, self.tokens)
@@ -108,20 +202,34 @@ class SyntaxNode(Node, metaclass=_NodeMeta):
         to return the parent.'''
         return self.parent
 
-    def resolve(self, itemstream, **options):
+    def resolve(self, itemstream, depth=0, **options):
         '''Try to resolve the incoming stream against the functions
         defined on the class instance.
+
+        With an ``instrument`` option, every dispatch attempt, handler
+        call and propagation is reported to it; ``depth`` counts the
+        levels propagated up from the node the parse was at.
         '''
         debug = options.get('debug')
+        instrument = options.get('instrument')
         for dispatcher, dispatch_data in self._dispatch_data.items():
             match = dispatcher.dispatch(itemstream, dispatch_data)
-            if match is None:
+            method = None
+            if match is not None:
+                method, matched_items = match
+            if instrument is not None:
+                instrument.on_dispatch(self, dispatcher, method is not None)
+            if method is None:
                 continue
-            method, matched_items = match
-            if method is not None:
-                if debug:
-                    print('  * Resolved node to: %r' % method)
+            if debug:
+                print('  * Resolved node to: %r' % method)
+            if instrument is None:
                 return method(self, *matched_items)
+            instrument.on_resolved(self, depth)
+            start = time.perf_counter()
+            result = method(self, *matched_items)
+            instrument.on_handler(self, method, time.perf_counter() - start)
+            return result
 
         # Itemstream is exhausted.
         if not itemstream:
@@ -132,24 +240,85 @@ class SyntaxNode(Node, metaclass=_NodeMeta):
         if parent is not None:
             if debug:
                 print(' ..Propagating from %r up to parent %r' % (type(self), type(self.parent)))
-            return parent.resolve(itemstream)
+            return parent.resolve(itemstream, depth + 1, **options)
         else:
-            msg = 'No function defined on %r for %s ...'
-            i = itemstream.i
-            stream = list(itemstream._stream)[i:i+10]
-            # self.getroot().pprint()
-            raise ParseError(msg % (self, stream))
+            self._raise_parse_error(itemstream)
+
+    def _raise_parse_error(self, itemstream, context=10):
+        msg = 'No function defined on %r for %s ...'
+        i = itemstream.i
+        # Slicing the lazy list only computes the items in the window.
+        data = itemstream._stream
+        before = list(data[max(0, i - context):i])
+        after = list(data[i:i + context])
+        raise ParseError(msg % (self, after), self, i, before, after)
 
     @classmethod
     def parse(cls_or_inst, itemiter, **options):
         '''Supply a user-defined start class.
+
+        Pass ``instrument=<ParseInstrument>`` to collect dispatch
+        statistics; see treebie.syntaxnode.instrument.
+
+        Pass ``token_table=<TokenTable>`` to have the nodes created
+        during the parse keep their tokens as ranges of the table;
+        see treebie.syntaxnode.tokentable.
+
+        Pass ``journal=<Journal>`` to record the tree's construction
+        in a mutation journal; the grammar's node classes have to use
+        JournalMixin. See treebie.journal.
+
+        Pass ``pause_gc=True`` to turn off automatic garbage collection
+        while the tree is built; see treebie.lifecycle.
+
+        Pass ``checkpoint=<Checkpointer>`` to take snapshots of the
+        parse as it goes, and ``resume=<Checkpoint>`` to carry on from
+        one; see treebie.syntaxnode.checkpoint.
+
+        Pass ``recover=<Recovery>`` to record parse errors and carry on
+        instead of raising the first; see treebie.syntaxnode.recovery.
         '''
+        if options.pop('pause_gc', False):
+            with gc_paused():
+                return cls_or_inst.parse(itemiter, **options)
+
+        token_table = options.pop('token_table', None)
+        if token_table is not None:
+            reset = active_table.set(token_table)
+            try:
+                return cls_or_inst.parse(itemiter, **options)
+            finally:
+                active_table.reset(reset)
+
         itemstream = Stream(itemiter)
 
-        if callable(cls_or_inst):
-            node = cls_or_inst()
+        resume = options.pop('resume', None)
+        if resume is not None:
+            node_cls = cls_or_inst
+            if not isinstance(node_cls, type):
+                node_cls = type(node_cls)
+            start, node = resume.restore(node_cls)
+        elif callable(cls_or_inst):
+            node = start = cls_or_inst()
         else:
-            node = cls_or_inst
+            node = start = cls_or_inst
+        # Holding ``start`` until the loop ends keeps the tree alive if
+        # its nodes only have weak parent links.
+
+        journal = options.pop('journal', None)
+        if journal is not None:
+            journal.attach(node)
+
+        checkpoint = options.pop('checkpoint', None)
+        if checkpoint is not None:
+            checkpoint.start(itemstream, resume)
+            threshold = checkpoint.next
+
+        recover = options.pop('recover', None)
+
+        instrument = options.get('instrument')
+        if instrument is not None:
+            instrument.on_parse_start(node, itemstream)
 
         while 1:
             try:
@@ -159,7 +328,39 @@ class SyntaxNode(Node, metaclass=_NodeMeta):
                 node = node.resolve(itemstream, **options)
             except StopIteration:
                 break
-        return node.getroot()
+            except ParseError as error:
+                if (recover is None or
+                        not _unresolved(error, node, itemstream)):
+                    raise
+                node = recover.recover(node, itemstream, error)
+            if checkpoint is not None and threshold <= itemstream.i:
+                checkpoint.maybe(node, itemstream)
+                threshold = checkpoint.next
+        root = node.getroot()
+        del start
+        if instrument is not None:
+            instrument.on_parse_end(root, itemstream)
+        return root
+
+    @classmethod
+    def split_points(cls, items):
+        '''Return the indexes of the items where the input can be cut
+        into chunks that parse independently from this start class.
+        The default is every item whose token is one of
+        ``split_tokens``. Grammars whose split points depend on context
+        can override this.
+        '''
+        tokentypes = [string_to_tokentype(t) for t in cls.split_tokens]
+        if not tokentypes:
+            return []
+        points = []
+        for index, item in enumerate(items):
+            token = item[1]
+            for tokentype in tokentypes:
+                if token in tokentype:
+                    points.append(index)
+                    break
+        return points
 
     # -----------------------------------------------------------------------
     # Readability functions.
@@ -184,6 +385,30 @@ class SyntaxNode(Node, metaclass=_NodeMeta):
     #------------------------------------------------------------------------
     # Serialization methods.
     #------------------------------------------------------------------------
+    def to_data(self, children=True):
+        data = super(SyntaxNode, self).to_data(children)
+        tokens = data.get('tokens')
+        if isinstance(tokens, TokenRange):
+            data['tokens'] = tokens.to_list()
+        return data
+
+    def to_records(self):
+        '''Return this subtree as ``(types, parents, attrs, tokens)``
+        lists in preorder, where ``tokens[i]`` is a list of the node's
+        tokens, or None if it has none. ``from_records`` takes all four.
+        '''
+        types, parents, attrs = super(SyntaxNode, self).to_records()
+        tokens = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node_tokens = node.__dict__.get('tokens')
+            tokens.append(list(node_tokens) if node_tokens else None)
+            children = node.__dict__.get('children')
+            if children:
+                stack.extend(reversed(children))
+        return types, parents, attrs, tokens
+
     @staticmethod
     def _tokens_as_data(self, tokens):
         _tokens = []
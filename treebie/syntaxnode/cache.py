@@ -0,0 +1,350 @@
+'''Caching parse results.
+
+    cache = ParseCache(directory='.treebie-cache', max_bytes=64 << 20)
+    tree = cache.parse(Module, source, MyLexer().tokenize)
+    cache.stats()   # {'hits': ..., 'disk_hits': ..., 'misses': ...}
+
+Results are keyed by a hash of the source and a fingerprint of the
+grammar: the handlers registered on the grammar's node classes (the
+signatures ``_dispatch_data`` is compiled from, and the code of each
+handler) and the tokenizer. Editing a handler or a lexer rule changes
+the fingerprint, so stale results are never returned. Parse options
+that change the tree are part of the key too. By default the grammar
+is the start class and the other SyntaxNode classes defined in its
+module; pass ``classes`` if it spans several modules.
+
+On a miss the source is tokenized and parsed as usual, and the tree
+is stored, serialized, in an in-memory LRU bounded by ``max_bytes``
+and, if a directory is given, on disk. A hit deserializes a new tree
+without running the tokenizer or the parser, so callers never share a
+cached tree. The disk store is safe to share between processes:
+entries are written to a temporary file and renamed into place, and
+unreadable entries count as misses. Node classes must be importable
+by name, as for ``fromdata``, and node data JSON-serializable.
+
+Entries are stored as JSON, so reading one never runs code, but
+whoever can write to the directory decides what trees the cache
+returns. Only share it between processes that trust each other; the
+directories the cache creates are only accessible to their owner.
+'''
+import os
+import sys
+import json
+import types
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from hercules.tokentype import string_to_tokentype
+
+from treebie.syntaxnode.base import SyntaxNode
+from treebie.syntaxnode.tokentable import Item
+
+
+# ---------------------------------------------------------------------------
+# Fingerprints.
+# ---------------------------------------------------------------------------
+def _code_digest(func, h):
+    code = getattr(func, '__code__', None)
+    if code is None:
+        h.update(repr(getattr(func, '__qualname__', func)).encode())
+        return
+    stack = [code]
+    while stack:
+        code = stack.pop()
+        h.update(code.co_code)
+        h.update(repr(code.co_names).encode())
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                stack.append(const)
+            else:
+                h.update(repr(const).encode())
+
+
+def grammar_fingerprint(classes, tokenize=None):
+    '''Return a hex digest of the handlers registered on the classes
+    and, if given, of the tokenizer.
+    '''
+    h = hashlib.sha256()
+    for cls in sorted(set(classes), key=lambda cls: cls.fqname()):
+        h.update(cls.fqname().encode())
+        signatures = cls.__dict__.get('_dispatch_signatures', {})
+        for dispatcher in sorted(signatures, key=lambda d: type(d).__name__):
+            h.update(type(dispatcher).__name__.encode())
+            handlers = signatures[dispatcher]
+            for signature in sorted(handlers, key=repr):
+                h.update(repr(signature).encode())
+                _code_digest(handlers[signature], h)
+    if tokenize is not None:
+        _code_digest(getattr(tokenize, '__func__', tokenize), h)
+        owner = getattr(tokenize, '__self__', None)
+        if owner is not None:
+            h.update(repr(getattr(owner, 'tokendefs', None)).encode())
+    return h.hexdigest()
+
+
+def grammar_classes(start_cls):
+    '''The start class and the SyntaxNode classes of its module.
+    '''
+    classes = {start_cls}
+    module = sys.modules.get(start_cls.__module__)
+    if module is not None:
+        for value in vars(module).values():
+            if isinstance(value, type) and issubclass(value, SyntaxNode):
+                classes.add(value)
+    return classes
+
+
+# ---------------------------------------------------------------------------
+# Serialization.
+# ---------------------------------------------------------------------------
+_FORMAT = 2
+
+
+def dump_tree(tree):
+    '''Serialize a tree, with its nodes' tokens, to bytes. The output
+    is JSON, with node types and token types given by name, so loading
+    it never runs code; node data has to be JSON-serializable, as for
+    ``to_data``.
+    '''
+    types_, parents, attrs, node_tokens = tree.to_records()
+    names = {}
+    type_indexes = [names.setdefault(name, len(names)) for name in types_]
+    tokentypes = {}
+    tokens = []
+    for items in node_tokens:
+        encoded = None
+        if items:
+            encoded = []
+            for pos, token, text in items:
+                index = tokentypes.get(token)
+                if index is None:
+                    index = tokentypes[token] = len(tokentypes)
+                if text.__class__ is bytes:
+                    # JSON has no bytes; they're kept as hex, as in
+                    # treebie.corpus.
+                    text = {'b': text.hex()}
+                encoded.append((pos, index, text))
+        tokens.append(encoded)
+    data = (
+        _FORMAT, list(names), type_indexes, parents, attrs,
+        [token.as_json() for token in tokentypes], tokens)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def load_tree(blob, node_cls=SyntaxNode):
+    '''Build a new tree from ``dump_tree`` output.
+    '''
+    data = json.loads(blob)
+    if not isinstance(data, list) or data[0] != _FORMAT:
+        raise ValueError('Unknown cache format.')
+    _, names, type_indexes, parents, attrs, tokennames, tokens = data
+    types_ = [names[index] for index in type_indexes]
+    tokentypes = [string_to_tokentype(name) for name in tokennames]
+    node_tokens = []
+    for encoded in tokens:
+        items = None
+        if encoded:
+            items = []
+            for pos, token, text in encoded:
+                if text.__class__ is dict:
+                    text = bytes.fromhex(text['b'])
+                items.append(Item(pos, tokentypes[token], text))
+        node_tokens.append(items)
+    return node_cls.from_records(types_, parents, attrs, node_tokens)
+
+
+# ---------------------------------------------------------------------------
+# The cache.
+# ---------------------------------------------------------------------------
+# Parse options that have effects beyond the tree; a hit would skip them.
+_UNCACHED_OPTIONS = frozenset((
+    'journal', 'instrument', 'checkpoint', 'resume', 'recover', 'debug'))
+
+# Options that don't change the tree.
+_IGNORED_OPTIONS = frozenset(('pause_gc',))
+
+
+class ParseCache(object):
+
+    def __init__(self, directory=None, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._fingerprints = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bypassed = 0
+
+    def __repr__(self):
+        return 'ParseCache(%d entries, %d bytes)' % (
+            len(self._entries), self._size)
+
+    def stats(self):
+        return dict(
+            hits=self.hits,
+            disk_hits=self.disk_hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            bypassed=self.bypassed,
+            entries=len(self._entries),
+            bytes=self._size)
+
+    def key(self, start_cls, source, tokenize, classes=None, **options):
+        '''Return the cache key for parsing the source with the given
+        parse options.
+        '''
+        # Fingerprints are remembered per grammar, tokenizer and lexer
+        # rules, so lexer instances with their own rules don't share one.
+        owner = getattr(tokenize, '__self__', None)
+        memo_key = (
+            start_cls, None if classes is None else frozenset(classes),
+            getattr(tokenize, '__func__', tokenize), type(owner),
+            repr(getattr(owner, 'tokendefs', None)))
+        fingerprint = self._fingerprints.get(memo_key)
+        if fingerprint is None:
+            if classes is None:
+                classes = grammar_classes(start_cls)
+            fingerprint = grammar_fingerprint(classes, tokenize)
+            self._fingerprints[memo_key] = fingerprint
+        h = hashlib.sha256(fingerprint.encode())
+        h.update(start_cls.fqname().encode())
+        for name in sorted(options):
+            if name in _IGNORED_OPTIONS:
+                continue
+            value = options[name]
+            if name == 'token_table':
+                # The table is built from the source, so only whether
+                # one was used matters.
+                value = value is not None
+            h.update(('%s=%r;' % (name, value)).encode())
+        if isinstance(source, str):
+            h.update(b's')
+            h.update(source.encode('utf-8', 'surrogatepass'))
+        else:
+            h.update(b'b')
+            h.update(source)
+        return h.hexdigest()
+
+    def parse(self, start_cls, source, tokenize, classes=None, **options):
+        '''Return the tree for ``start_cls.parse(tokenize(source),
+        **options)``, from the cache if possible. Options that report on
+        or change the parse as it runs (``journal``, ``instrument``,
+        ``checkpoint``, ``resume``, ``recover`` and ``debug``) skip the
+        cache, since a hit wouldn't run the parse.
+        '''
+        if _UNCACHED_OPTIONS.intersection(options):
+            with self._lock:
+                self.bypassed += 1
+            return start_cls.parse(tokenize(source), **options)
+        key = self.key(start_cls, source, tokenize, classes, **options)
+        blob, tier = self._lookup(key)
+        if blob is not None:
+            try:
+                tree = load_tree(blob, start_cls)
+            except Exception:
+                # A damaged entry on disk; parse again and replace it.
+                self._forget(key)
+            else:
+                with self._lock:
+                    if tier == 'memory':
+                        self.hits += 1
+                    else:
+                        self.disk_hits += 1
+                return tree
+        with self._lock:
+            self.misses += 1
+        tree = start_cls.parse(tokenize(source), **options)
+        self._remember(key, dump_tree(tree), write=True)
+        return tree
+
+    # -----------------------------------------------------------------------
+    # The two tiers.
+    # -----------------------------------------------------------------------
+    def _lookup(self, key):
+        '''Return the blob stored for the key and the tier it came
+        from, ``'memory'`` or ``'disk'``, or (None, None).
+        '''
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                return blob, 'memory'
+        blob = self._read(key)
+        if blob is not None:
+            self._remember(key, blob)
+            return blob, 'disk'
+        return None, None
+
+    def _forget(self, key):
+        with self._lock:
+            blob = self._entries.pop(key, None)
+            if blob is not None:
+                self._size -= len(blob)
+
+    def _remember(self, key, blob, write=False):
+        if write:
+            self._write(key, blob)
+        if self.max_bytes < len(blob):
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = blob
+            self._size += len(blob)
+            while self.max_bytes < self._size:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.tree')
+
+    def _read(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write(self, key, blob):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            # makedirs only applies the mode to the last directory.
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            os.makedirs(dirname, mode=0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def clear(self, disk=False):
+        '''Empty the memory tier, and with ``disk=True`` remove the
+        entries on disk too.
+        '''
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if disk and self.directory is not None:
+            for dirpath, dirnames, filenames in os.walk(self.directory):
+                for filename in filenames:
+                    if filename.endswith('.tree'):
+                        os.remove(os.path.join(dirpath, filename))
@@ -0,0 +1,194 @@
+'''Checkpointing long parses so they can be resumed.
+
+    checkpointer = Checkpointer('parse.ckpt', every=100000)
+    tree = Module.parse(lexer.tokenize(source), checkpoint=checkpointer)
+
+    # After a crash:
+    checkpoint = Checkpoint.load('parse.ckpt')
+    items = checkpoint.skip(lexer.tokenize(source))
+    # Or, if the lexer is in its root state at the offset:
+    items = lexer.tokenize(source, pos=checkpoint.offset)
+    tree = Module.parse(items, resume=checkpoint)
+
+Every ``every`` items the parse loop takes a snapshot of the partial
+tree (serialized as by treebie.syntaxnode.cache.dump_tree), the path
+from the root to the current node, and the stream position: the count
+of items consumed, and the source offset just past the last of them.
+Only the nodes' data and tokens are kept, as in the parse cache.
+Snapshots are written to a temporary file and renamed over
+``path``, so the file always holds a complete checkpoint; without a
+path only the latest is kept, as ``checkpointer.last``. Checkpoint
+files are JSON, so loading one never runs code, but a resumed parse
+builds on whatever tree the file holds: keep them where only the
+parsing user can write.
+
+Taking a snapshot costs time proportional to the tree built so far.
+A snapshot is only taken if the time spent on checkpoints, including
+this one's expected cost, stays under ``max_overhead`` of the time
+since the parse started. The expected cost is the last snapshot's
+cost per item consumed, times the items consumed now; the first
+snapshot, at ``every`` items, is what measures it. So the overhead
+stays under ``max_overhead``, give or take the error in that estimate
+and the first snapshot (which is charged too, but whose share shrinks
+as the parse goes on), and checkpoints grow further apart as the tree
+grows. When handlers
+do little work per item, a snapshot can cost more than the budget
+ever allows, and no more are taken after the first; raise
+``max_overhead`` to trade speed for fresher checkpoints. Between
+snapshots the parse loop only compares the stream position with the
+next threshold.
+
+To resume, pass the checkpoint and items starting where it left off.
+The checkpoint doesn't record a lexer's state stack, so restarting a
+lexer at ``checkpoint.offset`` is only right where the lexer is in
+the state it's restarted in (``'root'`` by default); elsewhere, skip
+the same items with ``checkpoint.skip(items)``. Handlers that look
+behind the current item can't see items from before the checkpoint.
+'''
+import os
+import json
+import time
+import tempfile
+from itertools import islice
+
+from treebie.syntaxnode.cache import dump_tree, load_tree
+
+
+_FORMAT = 2
+
+
+class Checkpoint(object):
+    '''A snapshot of a parse in progress.
+    '''
+    def __init__(self, position, offset, path, tree):
+        #: The number of items consumed.
+        self.position = position
+        #: The source offset just past the last consumed item.
+        self.offset = offset
+        #: The child indexes leading from the root to the current node.
+        self.path = path
+        #: The partial tree, from dump_tree.
+        self.tree = tree
+
+    def __repr__(self):
+        return 'Checkpoint(position=%d, offset=%r, %d bytes)' % (
+            self.position, self.offset, len(self.tree))
+
+    @classmethod
+    def take(cls, node, itemstream, base=0):
+        path = []
+        parent = getattr(node, 'parent', None)
+        current = node
+        while parent is not None:
+            path.append(current.index())
+            current = parent
+            parent = getattr(current, 'parent', None)
+        path.reverse()
+
+        position = itemstream.i
+        offset = 0
+        if position:
+            pos, _, text = itemstream.behind(1)
+            offset = pos + len(text)
+        return cls(base + position, offset, path, dump_tree(current))
+
+    def restore(self, node_cls):
+        '''Return the rebuilt tree's root and current node.
+        '''
+        root = load_tree(self.tree, node_cls)
+        node = root
+        for index in self.path:
+            node = node.children[index]
+        return root, node
+
+    def skip(self, items):
+        '''Skip the items consumed before the checkpoint, for token
+        sources that can't be restarted at an offset.
+        '''
+        return islice(items, self.position, None)
+
+    # -----------------------------------------------------------------------
+    # Serialization.
+    # -----------------------------------------------------------------------
+    def dumps(self):
+        # The tree is JSON already, so it's embedded as a string.
+        data = (_FORMAT, self.position, self.offset, self.path,
+                self.tree.decode('utf-8'))
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+    @classmethod
+    def loads(cls, blob):
+        data = json.loads(blob)
+        if not isinstance(data, list) or data[0] != _FORMAT:
+            raise ValueError('Unknown checkpoint format.')
+        _, position, offset, path, tree = data
+        return cls(position, offset, path, tree.encode('utf-8'))
+
+    def save(self, path):
+        dirname = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.dumps())
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.loads(f.read())
+
+
+class Checkpointer(object):
+    '''Takes checkpoints for ``SyntaxNode.parse(checkpoint=...)``.
+    '''
+    def __init__(self, path=None, every=100000, max_overhead=0.05,
+                 timer=time.perf_counter):
+        self.path = path
+        self.every = every
+        self.max_overhead = max_overhead
+        self.timer = timer
+        self.last = None
+        self.count = 0
+        self.elapsed = 0.0
+        self.next = every
+        self.base = 0
+        self._started = None
+        self._cost_per_item = 0.0
+
+    def __repr__(self):
+        return 'Checkpointer(%r, every=%d, %d taken in %.3f s)' % (
+            self.path, self.every, self.count, self.elapsed)
+
+    def start(self, itemstream, resume=None):
+        '''Called when the parse starts, or resumes from a checkpoint.
+        '''
+        self.base = 0 if resume is None else resume.position
+        self._started = self.timer()
+        self.next = itemstream.i + self.every
+
+    def maybe(self, node, itemstream):
+        '''Called when the stream passes ``self.next``.
+        '''
+        now = self.timer()
+        self.next = itemstream.i + self.every
+        # Snapshots cover the whole tree, so their cost grows with the
+        # items consumed, counting those before a resume.
+        position = self.base + itemstream.i
+        expected = self._cost_per_item * position
+        budget = self.max_overhead * (now - self._started)
+        if self.count and budget < self.elapsed + expected:
+            return
+        checkpoint = Checkpoint.take(node, itemstream, self.base)
+        if self.path is not None:
+            checkpoint.save(self.path)
+        self.last = checkpoint
+        self.count += 1
+        cost = self.timer() - now
+        self.elapsed += cost
+        self._cost_per_item = cost / max(position, 1)
@@ -1,4 +1,3 @@
-import pickle
 from operator import itemgetter
 from functools import wraps
 from collections import defaultdict
@@ -20,6 +19,25 @@ class DuplicateHandlerFound(Exception):
     '''
 
 
+def _freeze(value):
+    '''Return a hashable stand-in for an argument to a dispatcher.
+    '''
+    try:
+        hash(value)
+    except TypeError:
+        pass
+    else:
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_freeze, value))
+    if isinstance(value, dict):
+        return tuple(sorted(
+            (key, _freeze(val)) for key, val in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(map(_freeze, value))
+    return repr(value)
+
+
 class Dispatcher(object):
     '''Implements the base functionality for dispatcher types.
     The node instances delegate their dispatch functions to
@@ -36,7 +54,16 @@ class Dispatcher(object):
             return method
         return decorator
 
-    loads = pickle.loads
+    @staticmethod
+    def make_signature(args, kwargs):
+        '''Turn the decorator's arguments into a hashable key. The
+        dispatchers unpack it again as an (args, kwargs) 2-tuple, with
+        kwargs as a sorted tuple of items. Unhashable arguments are
+        frozen: lists become tuples, dicts sorted tuples of items and
+        sets frozensets; anything else unhashable is keyed by its repr.
+        '''
+        return (_freeze(tuple(args)),
+                tuple((key, _freeze(kwargs[key])) for key in sorted(kwargs)))
 
     def register(self, method, args, kwargs):
         '''Given a single decorated handler function,
@@ -44,11 +71,11 @@ class Dispatcher(object):
         '''
         default = defaultdict(NoClobberDict)
         with SetDefault(method, '_disp', default) as registry:
-            key = pickle.dumps((args, kwargs))
+            key = self.make_signature(args, kwargs)
             try:
                 registry[self][key] = method
             except KeyClobberError:
-                other_method = registry[type(self)][key]
+                other_method = registry[self][key]
                 msg = (
                     "Can't register %r: previously registered handler %r "
                     "found for input signature %r.")
@@ -66,6 +93,17 @@ class Dispatcher(object):
         '''
         raise NotImplementedError()
 
+    def extend(self, base_data, new_signatures, signatures):
+        '''Given the prepared data of a base class, return the data
+        for a subclass that adds ``new_signatures``. ``signatures``
+        is the subclass's complete signature table, with the
+        subclass's own handlers first.
+
+        The default implementation just prepares the complete table
+        again. Subclasses can override it to reuse ``base_data``.
+        '''
+        return self.prepare(signatures)
+
     def dispatch(self, itemstream, dispatch_data):
         '''Provides the logic for dispatching the itemstream
         to a handler function, given the dispatch_data created at
@@ -81,11 +119,37 @@ class TokentypeSequence(Dispatcher):
     '''
     def prepare(self, dispatch_data):
         trie = Trie()
-        for signature, method in dispatch_data.items():
-            tokenseq, kwargs = self.loads(signature)
+        for (tokenseq, kwargs), method in dispatch_data.items():
             trie.add(tokenseq, method)
         return trie
 
+    def extend(self, base_data, new_signatures, signatures):
+        '''Add the new sequences to a copy of the base class's trie.
+        Only the trie nodes along the new sequences' paths get copied;
+        every other branch is shared with the base class.
+        '''
+        terminal_char = base_data._terminal_char
+        skipchars = base_data._skipchars
+        root = dict(base_data._trie)
+        copied = {id(root)}
+        for (tokenseq, kwargs), method in new_signatures.items():
+            this = root
+            w_len = len(tokenseq) - 1
+            for i, c in enumerate(tokenseq):
+                if c in skipchars:
+                    continue
+                child = this.get(c)
+                if child is None:
+                    child = {}
+                elif id(child) not in copied:
+                    child = dict(child)
+                copied.add(id(child))
+                this[c] = child
+                this = child
+                if i == w_len:
+                    this[terminal_char] = method
+        return Trie(root, terminal_char=terminal_char, skipchars=skipchars)
+
     def dispatch(self, itemstream, dispatch_data, second=itemgetter(1)):
         '''Try to find a handler that matches the signatures registered
         to this dispatcher instance.
@@ -101,8 +165,7 @@ class TokenSubtypes(Dispatcher):
     def prepare(self, dispatch_data):
         str2token = string_to_tokentype
         data = {}
-        for signature, method in dispatch_data.items():
-            args, kwargs = self.loads(signature)
+        for (args, kwargs), method in dispatch_data.items():
             if 1 < len(args):
                 msg = ('The %s dispatcher only accepts one '
                        'token as an argument; got %d')
@@ -113,6 +176,15 @@ class TokenSubtypes(Dispatcher):
             data[str2token(token)] = method
         return data
 
+    def extend(self, base_data, new_signatures, signatures):
+        '''The subclass's own tokens are tried first, then the
+        base class's.
+        '''
+        data = self.prepare(new_signatures)
+        for token, method in base_data.items():
+            data.setdefault(token, method)
+        return data
+
     def dispatch(self, itemstream, dispatch_data, str2token=string_to_tokentype):
         item = itemstream.this()
         item_token = str2token(item.token)
@@ -0,0 +1,147 @@
+'''Instrumentation hooks for SyntaxNode.parse.
+
+Pass an instrument to parse to observe dispatch without touching
+the grammar:
+
+    profiler = ParseProfiler()
+    tree = Start.parse(items, instrument=profiler)
+    print(profiler.summary())
+    with open('parse.folded', 'w') as f:
+        profiler.dump_collapsed(f)
+
+The hooks are called from ``SyntaxNode.resolve`` and the parse loop;
+without an instrument, each resolve step only checks that there's
+none.
+'''
+import time
+from collections import Counter, defaultdict
+
+
+class ParseInstrument(object):
+    '''Base class for parse instruments. Every hook is a no-op, so
+    subclasses only need to override the events they care about.
+    '''
+    def on_parse_start(self, node, itemstream):
+        '''Called once before the first token is resolved.
+        '''
+
+    def on_parse_end(self, root, itemstream):
+        '''Called once after the stream is exhausted.
+        '''
+
+    def on_dispatch(self, node, dispatcher, hit):
+        '''Called for every dispatcher tried on a node. ``hit`` is
+        true if the dispatcher found a handler.
+        '''
+
+    def on_handler(self, node, method, elapsed):
+        '''Called after a handler method returns, with the time
+        spent in it, in seconds.
+        '''
+
+    def on_resolved(self, node, depth):
+        '''Called when a token was resolved after propagating
+        ``depth`` levels up from the current node.
+        '''
+
+
+class ParseProfiler(ParseInstrument):
+    '''Collects per-dispatcher attempt and hit counts, a histogram of
+    upward propagation depths, time per handler method and the overall
+    token throughput.
+    '''
+    def __init__(self, timer=time.perf_counter):
+        self.timer = timer
+        self.attempts = Counter()
+        self.hits = Counter()
+        self.depths = Counter()
+        self.handler_calls = Counter()
+        self.handler_times = defaultdict(float)
+        self.stack_times = defaultdict(float)
+        self.tokens = 0
+        self.elapsed = 0.0
+        self._started = None
+
+    @staticmethod
+    def _dispatcher_key(node, dispatcher):
+        return (node.__class__.__name__, dispatcher.__class__.__name__)
+
+    @staticmethod
+    def _method_name(method):
+        return getattr(method, '__qualname__', repr(method))
+
+    def on_parse_start(self, node, itemstream):
+        self._started = self.timer()
+
+    def on_parse_end(self, root, itemstream):
+        self.elapsed += self.timer() - self._started
+        self.tokens += itemstream.i
+
+    def on_dispatch(self, node, dispatcher, hit):
+        key = self._dispatcher_key(node, dispatcher)
+        self.attempts[key] += 1
+        if hit:
+            self.hits[key] += 1
+
+    def on_handler(self, node, method, elapsed):
+        name = self._method_name(method)
+        self.handler_calls[name] += 1
+        self.handler_times[name] += elapsed
+
+        stack = [name]
+        this = node
+        while this is not None:
+            stack.append(this.__class__.__name__)
+            this = getattr(this, 'parent', None)
+        stack.reverse()
+        self.stack_times[tuple(stack)] += elapsed
+
+    def on_resolved(self, node, depth):
+        self.depths[depth] += 1
+
+    # -----------------------------------------------------------------------
+    # Reporting.
+    # -----------------------------------------------------------------------
+    @property
+    def tokens_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return self.tokens / self.elapsed
+
+    def summary(self):
+        '''Return the collected stats as a json-serializable dict.
+        '''
+        dispatchers = []
+        for key, attempts in self.attempts.most_common():
+            node_name, dispatcher_name = key
+            dispatchers.append(dict(
+                node=node_name,
+                dispatcher=dispatcher_name,
+                attempts=attempts,
+                hits=self.hits[key]))
+
+        handlers = []
+        items = sorted(
+            self.handler_times.items(), key=lambda item: -item[1])
+        for name, seconds in items:
+            handlers.append(dict(
+                handler=name,
+                calls=self.handler_calls[name],
+                seconds=seconds))
+
+        return dict(
+            tokens=self.tokens,
+            seconds=self.elapsed,
+            tokens_per_second=self.tokens_per_second,
+            dispatchers=dispatchers,
+            handlers=handlers,
+            depths=dict(sorted(self.depths.items())))
+
+    def dump_collapsed(self, fp, scale=1e6):
+        '''Write handler times in the collapsed-stack format read by
+        flamegraph.pl and speedscope. Each line is the chain of node
+        class names from the root down to the handler, followed by
+        its total time in microseconds (by default).
+        '''
+        for stack, seconds in sorted(self.stack_times.items()):
+            fp.write('%s %d\n' % (';'.join(stack), round(seconds * scale)))
@@ -0,0 +1,196 @@
+r'''A regex lexer producing the items SyntaxNode.parse consumes.
+
+    class MyLexer(Lexer):
+        tokendefs = {
+            'root': [
+                (r'\s+', None),
+                (r'\d+', Token.Number),
+                (r'[A-Za-z_]\w*', Token.Name),
+                (r'"', Token.String, 'string'),
+                ],
+            'string': [
+                (r'[^"\\]+', Token.String),
+                (r'\\.', Token.String.Escape),
+                (r'"', Token.String, '#pop'),
+                ],
+            }
+
+    tree = Module.parse(MyLexer().tokenize(source))
+
+Each state is a list of rules, tried in order: a pattern, a token type
+(a hercules token type or its dotted name, or None to skip the text),
+and optionally an action for the state stack: a state to push,
+``'#pop'``, ``'#pop:n'``, ``'#push'`` to push the current state again,
+or a tuple of those. ``include('state')`` splices in another state's
+rules. Lexing starts in ``'root'``.
+
+Every state is compiled once per class into a single master regex,
+with each rule as a named group, so a token costs one regex match
+whatever the number of rules. ``tokenize`` is a generator; it works on
+str, bytes, and on memoryviews and mmaps over bytes without copying
+the source (only each token's text is sliced out). For binary input,
+the patterns are encoded as utf-8.
+
+Text that no rule matches raises LexError, or with
+``errors='emit'``, comes out one character at a time as
+``Token.Error`` items.
+'''
+import re
+import threading
+
+from hercules.tokentype import Token, string_to_tokentype
+
+from treebie.syntaxnode.tokentable import Item
+
+
+class LexError(Exception):
+    '''Raised when no rule matches the input.
+    '''
+
+
+class include(str):
+    '''Splices the rules of the named state into another state.
+    '''
+
+
+def _compile_action(action):
+    '''Turn a rule's action into a tuple of stack operations: a state
+    name to push, or a negative number of states to pop.
+    '''
+    if action is None:
+        return ()
+    if isinstance(action, str):
+        action = (action,)
+    ops = []
+    for op in action:
+        if op == '#pop':
+            ops.append(-1)
+        elif op.startswith('#pop:'):
+            ops.append(-int(op[len('#pop:'):]))
+        else:
+            ops.append(op)
+    return tuple(ops)
+
+
+def _slicer(source):
+    if isinstance(source, memoryview):
+        return lambda start, stop: source[start:stop].tobytes()
+    return lambda start, stop: source[start:stop]
+
+
+class _CompiledState(object):
+    __slots__ = ('regex', 'rules')
+
+    def __init__(self, regex, rules):
+        self.regex = regex
+        # Maps each group name to (token type, stack operations).
+        self.rules = rules
+
+
+class Lexer(object):
+
+    #: State name -> list of rules.
+    tokendefs = {}
+
+    #: Flags for every pattern.
+    flags = re.MULTILINE
+
+    _compile_lock = threading.Lock()
+
+    # -----------------------------------------------------------------------
+    # Compiling the rules.
+    # -----------------------------------------------------------------------
+    @classmethod
+    def _flatten(cls, state, seen=()):
+        rules = []
+        for rule in cls.tokendefs[state]:
+            if isinstance(rule, include):
+                if rule in seen:
+                    raise LexError('State %r includes itself.' % rule)
+                rules.extend(cls._flatten(rule, seen + (state,)))
+            else:
+                rules.append(rule)
+        return rules
+
+    @classmethod
+    def compile_state(cls, state, binary=False):
+        '''Compile the rules of a state into one master regex.
+        '''
+        groups = []
+        rules = {}
+        for i, rule in enumerate(cls._flatten(state)):
+            pattern, tokentype = rule[:2]
+            action = rule[2] if len(rule) > 2 else None
+            if isinstance(tokentype, str):
+                tokentype = string_to_tokentype(tokentype)
+            name = '_%d' % i
+            groups.append('(?P<%s>%s)' % (name, pattern))
+            rules[name] = (tokentype, _compile_action(action))
+        master = '|'.join(groups)
+        if binary:
+            master = master.encode('utf-8')
+        return _CompiledState(re.compile(master, cls.flags), rules)
+
+    @classmethod
+    def compiled(cls, binary=False):
+        '''The compiled states of this class, made on first use.
+        '''
+        key = '_compiled_binary' if binary else '_compiled_text'
+        states = cls.__dict__.get(key)
+        if states is None:
+            with cls._compile_lock:
+                states = cls.__dict__.get(key)
+                if states is None:
+                    states = dict(
+                        (state, cls.compile_state(state, binary))
+                        for state in cls.tokendefs)
+                    setattr(cls, key, states)
+        return states
+
+    # -----------------------------------------------------------------------
+    # Lexing.
+    # -----------------------------------------------------------------------
+    def tokenize(self, source, state='root', errors='strict', pos=0):
+        '''Generate ``(pos, token, text)`` items from the source,
+        starting at offset ``pos``, with ``state`` as the state there.
+        '''
+        states = self.compiled(binary=not isinstance(source, str))
+        text = _slicer(source)
+        new_item = tuple.__new__
+        stack = [state]
+        current = states[state]
+        match = current.regex.match
+        rules = current.rules
+        end = len(source)
+        while pos < end:
+            m = match(source, pos)
+            if m is None:
+                if errors != 'emit':
+                    msg = 'No rule in state %r matches at position %d: %r'
+                    raise LexError(
+                        msg % (stack[-1], pos, text(pos, pos + 20)))
+                yield Item(pos, Token.Error, text(pos, pos + 1))
+                pos += 1
+                continue
+
+            tokentype, ops = rules[m.lastgroup]
+            stop = m.end()
+            if tokentype is not None:
+                yield new_item(Item, (pos, tokentype, m.group()))
+            if ops:
+                for op in ops:
+                    if op.__class__ is int:
+                        del stack[op:]
+                        if not stack:
+                            stack.append(state)
+                    elif op == '#push':
+                        stack.append(stack[-1])
+                    else:
+                        stack.append(op)
+                current = states[stack[-1]]
+                match = current.regex.match
+                rules = current.rules
+            elif stop == pos:
+                msg = 'Rule %s in state %r matched nothing at position %d.'
+                raise LexError(msg % (m.lastgroup, stack[-1], pos))
+            pos = stop
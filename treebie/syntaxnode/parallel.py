@@ -0,0 +1,153 @@
+'''Parsing one big input on several cores.
+
+    class Module(SyntaxNode):
+        # A ``def`` keyword always starts a new top-level node.
+        split_tokens = ('Keyword.Def',)
+
+    tree = parse_parallel(Module, items, max_workers=8)
+
+The start class declares where its input can be cut: by default at
+every item whose token is one of its ``split_tokens``, or wherever its
+``split_points(items)`` classmethod says, for grammars that need
+context to tell. A split point must be an item that always starts a
+new child of the start node, so that parsing the pieces separately
+from fresh start nodes gives the same children as parsing the whole.
+
+The items are cut at the split points nearest to equal shares, each
+chunk is parsed from a new start node in a process pool, and the
+children of the chunk roots are attached in order under one root of
+the start class. Workers get the items as plain tuples and send each
+node's tokens back as indexes into their chunk, so the tree's tokens
+are the original items, with their original positions, and the
+result equals a sequential parse. The start node's own tokens and
+data are merged in chunk order.
+
+The grammar's node classes must be importable by name in the worker
+processes, and the parse options picklable. Inputs too small to fill
+more than one chunk of ``min_chunk`` items are parsed sequentially.
+'''
+import os
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+
+from hercules.tokentype import string_to_tokentype
+
+from treebie.resolvers import resolve_name
+from treebie.syntaxnode.tokentable import Item
+
+
+def _preorder(root):
+    nodes = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        children = node.__dict__.get('children')
+        if children:
+            stack.extend(reversed(children))
+    return nodes
+
+
+def _parse_chunk(args):
+    '''Parse one chunk in a worker, and return the tree as records,
+    with each node's tokens as indexes into the chunk (or as items,
+    for items that didn't come from it).
+    '''
+    fqname, payload, options = args
+    start_cls = resolve_name(fqname)
+    tokentypes = {}
+    items = []
+    for pos, token, text in payload:
+        tokentype = tokentypes.get(token)
+        if tokentype is None:
+            tokentype = tokentypes[token] = string_to_tokentype(token)
+        items.append(Item(pos, tokentype, text))
+    index_of = dict((id(item), index) for index, item in enumerate(items))
+
+    root = start_cls.parse(iter(items), **options)
+    types, parents, attrs, records_tokens = root.to_records()
+    tokens = []
+    for node_tokens in records_tokens:
+        if not node_tokens:
+            tokens.append(None)
+            continue
+        encoded = []
+        for item in node_tokens:
+            index = index_of.get(id(item))
+            if index is None:
+                pos, token, text = item
+                index = (pos, token.as_json(), text)
+            encoded.append(index)
+        tokens.append(encoded)
+    return types, parents, attrs, tokens
+
+
+def choose_cuts(points, size, parts):
+    '''Return the chunk boundaries ``[0, ..., size]``, cutting at the
+    split points nearest after each equal share.
+    '''
+    cuts = [0]
+    for k in range(1, parts):
+        i = bisect_left(points, size * k // parts)
+        if i < len(points) and cuts[-1] < points[i] < size:
+            cuts.append(points[i])
+    cuts.append(size)
+    return cuts
+
+
+def parse_parallel(start_cls, items, max_workers=None, executor=None,
+                   chunks=None, min_chunk=1000, **options):
+    '''Parse ``items`` with ``start_cls`` as the start class, in
+    ``chunks`` pieces (by default one per worker) parsed in a process
+    pool, or in the given executor.
+    '''
+    if not hasattr(items, '__getitem__'):
+        items = list(items)
+    size = len(items)
+    if chunks is None:
+        chunks = max_workers or os.cpu_count() or 1
+    chunks = min(chunks, size // min_chunk)
+    cuts = [0, size]
+    if 1 < chunks:
+        cuts = choose_cuts(start_cls.split_points(items), size, chunks)
+    if len(cuts) <= 2:
+        return start_cls.parse(iter(items), **options)
+
+    fqname = start_cls.fqname()
+    names = {}
+    jobs = []
+    for start, stop in zip(cuts, cuts[1:]):
+        payload = []
+        for index in range(start, stop):
+            pos, token, text = items[index]
+            name = names.get(token)
+            if name is None:
+                name = names[token] = token.as_json()
+            payload.append((pos, name, text))
+        jobs.append((fqname, payload, options))
+
+    if executor is None:
+        with ProcessPoolExecutor(max_workers) as executor:
+            results = list(executor.map(_parse_chunk, jobs))
+    else:
+        results = list(executor.map(_parse_chunk, jobs))
+
+    root = start_cls()
+    for start, (types, parents, attrs, tokens) in zip(cuts, results):
+        chunk_root = start_cls.from_records(types, parents, attrs)
+        for node, encoded in zip(_preorder(chunk_root), tokens):
+            if encoded is None:
+                continue
+            node_tokens = node.tokens
+            for index in encoded:
+                if index.__class__ is int:
+                    node_tokens.append(items[start + index])
+                else:
+                    pos, token, text = index
+                    node_tokens.append(
+                        Item(pos, string_to_tokentype(token), text))
+        root.tokens.extend(chunk_root.tokens)
+        root.update(chunk_root)
+        for child in list(chunk_root.children):
+            root.append(child)
+    return root
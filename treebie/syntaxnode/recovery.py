@@ -0,0 +1,83 @@
+'''Recovering from parse errors, to collect them all in one pass.
+
+    recovery = Recovery(sync=(Block, 'Statement'), context=5)
+    tree = Module.parse(items, recover=recovery)
+    for error in recovery.errors:
+        print(error.position, error.item, error.skipped)
+
+Without ``recover``, a parse stops at the first ParseError. With it,
+each error is recorded and the parse carries on:
+
+* By default the unhandled item is skipped, and the parse continues
+  from the node it had reached.
+* With ``sync`` node types (classes, or class names), the parse also
+  abandons the construct it was in: it pops up to the nearest
+  ancestor of one of those types (or the root) before skipping, so
+  the following items are resolved from there.
+
+A run of items skipped one after another from the same node counts as
+one error, with ``skipped`` set to the number of items dropped. Each
+error keeps the node the parse had reached and up to ``context``
+items on each side of the first unhandled one, so the memory used per
+error is bounded whatever the size of the input. After ``max_errors``
+errors, the next one is raised.
+'''
+
+
+class Recovery(object):
+    '''Recovers from errors for ``SyntaxNode.parse(recover=...)``.
+    '''
+    def __init__(self, sync=(), context=10, max_errors=1000):
+        self.sync_types = tuple(t for t in sync if isinstance(t, type))
+        self.sync_names = frozenset(t for t in sync if isinstance(t, str))
+        self.context = context
+        self.max_errors = max_errors
+        self.errors = []
+        # The node and position an error's run of skipped items
+        # would continue from.
+        self._run = None
+
+    def __repr__(self):
+        return 'Recovery(%d errors)' % len(self.errors)
+
+    def is_sync(self, node):
+        return (isinstance(node, self.sync_types) or
+                type(node).__name__ in self.sync_names)
+
+    def sync(self, node):
+        '''Return the nearest ancestor-or-self of a sync type, or the
+        root.
+        '''
+        while not self.is_sync(node):
+            parent = getattr(node, 'parent', None)
+            if parent is None:
+                break
+            node = parent
+        return node
+
+    def recover(self, node, itemstream, error):
+        '''Record the error and return the node to carry on from,
+        after skipping the unhandled item.
+        '''
+        i = itemstream.i
+        run = self._run
+        if run is not None and run[0] is node and run[1] == i:
+            error = self.errors[-1]
+        else:
+            if self.max_errors <= len(self.errors):
+                raise error
+            data = itemstream._stream
+            error.node = node
+            error.before = list(data[max(0, i - self.context):i])
+            error.after = list(data[i:i + self.context])
+            self.errors.append(error)
+        if self.sync_types or self.sync_names:
+            node = self.sync(node)
+        try:
+            next(itemstream)
+        except StopIteration:
+            pass
+        else:
+            error.skipped += 1
+        self._run = (node, itemstream.i)
+        return node
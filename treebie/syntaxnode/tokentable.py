@@ -0,0 +1,209 @@
+'''Compact token storage for big inputs.
+
+By default every node keeps its tokens as a list of ``(pos, token,
+text)`` items, and each text is its own string. With a TokenTable,
+the source is kept once and each token is three numbers in typed
+arrays: its token type id, start offset and length. Nodes then keep
+a TokenRange, which is a list of index runs into the table, and the
+items are only materialized when they're looked at:
+
+    table = TokenTable.from_items(source, tokenize(source))
+    tree = Module.parse(table, token_table=table)
+
+The source can be a str, bytes, or a memoryview over bytes or an
+mmap; texts are slices of it. Each item's text must be the slice of
+the source at its position. TokenRange supports what nodes use
+``tokens`` for (``extend``, indexing, iteration, ``len``, equality
+with lists), so ``first``, ``first_token``, ``first_text`` and the
+dispatchers work unchanged. An item that doesn't come from the table
+turns that node's range back into a plain list of items.
+'''
+import array
+from bisect import bisect_left
+from contextvars import ContextVar
+from collections import namedtuple
+
+
+Item = namedtuple('Item', 'pos token text')
+
+#: The table of the parse in progress, if it's using one.
+active_table = ContextVar('active_table', default=None)
+
+
+class TokenTable(object):
+
+    def __init__(self, source):
+        self.source = source
+        self.types = array.array('i')
+        self.starts = array.array('q')
+        self.lengths = array.array('i')
+        self.tokentypes = []
+        self._type_ids = {}
+        if isinstance(source, memoryview):
+            self._slice = lambda start, stop: source[start:stop].tobytes()
+        else:
+            self._slice = lambda start, stop: source[start:stop]
+
+    @classmethod
+    def from_items(cls, source, items):
+        table = cls(source)
+        table.extend(items)
+        return table
+
+    def __repr__(self):
+        return 'TokenTable(%d tokens)' % len(self)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def type_id(self, token):
+        try:
+            return self._type_ids[token]
+        except KeyError:
+            type_id = self._type_ids[token] = len(self.tokentypes)
+            self.tokentypes.append(token)
+            return type_id
+
+    def append(self, pos, token, length):
+        self.types.append(self.type_id(token))
+        self.starts.append(pos)
+        self.lengths.append(length)
+
+    def extend(self, items):
+        append = self.append
+        for pos, token, text in items:
+            append(pos, token, len(text))
+
+    def __getitem__(self, index):
+        start = self.starts[index]
+        return Item(
+            start, self.tokentypes[self.types[index]],
+            self._slice(start, start + self.lengths[index]))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def index_of(self, item):
+        '''Return the index of ``item`` in the table, or None if it
+        isn't one of the table's items.
+        '''
+        pos, token, text = item
+        starts = self.starts
+        index = bisect_left(starts, pos)
+        type_id = self._type_ids.get(token)
+        while index < len(starts) and starts[index] == pos:
+            if self.types[index] == type_id and \
+                    self.lengths[index] == len(text):
+                return index
+            index += 1
+
+    def nbytes(self):
+        '''The size of the per-token arrays, not counting the source.
+        '''
+        return sum(a.itemsize * len(a)
+                   for a in (self.types, self.starts, self.lengths))
+
+
+class TokenRange(object):
+    '''A node's tokens, as runs of consecutive indexes into a table.
+    '''
+    __slots__ = ('table', 'runs', 'items')
+
+    def __init__(self, table):
+        self.table = table
+        # Flat [start, stop, start, stop, ...] list of half-open runs.
+        self.runs = []
+        # Set instead of runs once an item from elsewhere is added.
+        self.items = None
+
+    def indexes(self):
+        runs = self.runs
+        for i in range(0, len(runs), 2):
+            for index in range(runs[i], runs[i + 1]):
+                yield index
+
+    def to_list(self):
+        if self.items is not None:
+            return list(self.items)
+        table = self.table
+        return [table[index] for index in self.indexes()]
+
+    def _detach_from_table(self):
+        if self.items is None:
+            self.items = self.to_list()
+            self.runs = []
+        return self.items
+
+    # -----------------------------------------------------------------------
+    # The parts of the list interface nodes use.
+    # -----------------------------------------------------------------------
+    def append(self, item):
+        if self.items is not None:
+            self.items.append(item)
+            return
+        index = self.table.index_of(item)
+        if index is None:
+            self._detach_from_table().append(item)
+            return
+        runs = self.runs
+        if runs and runs[-1] == index:
+            runs[-1] = index + 1
+        else:
+            runs.extend((index, index + 1))
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def __len__(self):
+        if self.items is not None:
+            return len(self.items)
+        runs = self.runs
+        return sum(runs[i + 1] - runs[i] for i in range(0, len(runs), 2))
+
+    def __bool__(self):
+        return bool(self.items if self.items is not None else self.runs)
+
+    def __iter__(self):
+        if self.items is not None:
+            return iter(self.items)
+        table = self.table
+        return (table[index] for index in self.indexes())
+
+    def __getitem__(self, index):
+        if self.items is not None:
+            return self.items[index]
+        if isinstance(index, slice):
+            return self.to_list()[index]
+        if index < 0:
+            index += len(self)
+        runs = self.runs
+        for i in range(0, len(runs), 2):
+            size = runs[i + 1] - runs[i]
+            if 0 <= index < size:
+                return self.table[runs[i] + index]
+            index -= size
+        raise IndexError('token index out of range')
+
+    def __setitem__(self, index, value):
+        self._detach_from_table()[index] = value
+
+    def __delitem__(self, index):
+        del self._detach_from_table()[index]
+
+    def __eq__(self, other):
+        if isinstance(other, TokenRange):
+            other = other.to_list()
+        if isinstance(other, (list, tuple)):
+            return self.to_list() == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __repr__(self):
+        return repr(self.to_list())
@@ -0,0 +1,286 @@
+'''Visitors and transformers for BaseNode trees.
+
+    class CountCalls(NodeVisitor):
+        def __init__(self):
+            self.count = 0
+
+        def visit_Call(self, node):
+            self.count += 1
+
+        def finish(self, root):
+            return self.count
+
+    count = CountCalls().visit(tree)
+
+Handler methods are looked up once per (visitor class, node class)
+pair and cached on the visitor class, so a pass costs one dict lookup
+per node. Traversal is iterative, so deep trees don't hit the
+recursion limit.
+
+Several passes can share a single walk with ``visit_all``:
+
+    calls, names = visit_all(tree, [CountCalls(), Find('Name')])
+'''
+from treebie.node import BaseNode
+
+
+class _Sentinel(object):
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+#: Return from an enter hook to skip the node's children.
+SKIP = _Sentinel('SKIP')
+
+#: Return from a NodeTransformer visit method to remove the node.
+REMOVE = _Sentinel('REMOVE')
+
+
+class NodeVisitor(object):
+    '''Walks a tree in document order. For each node, the method named
+    ``visit_<nodekey>`` is called on entering it and ``leave_<nodekey>``
+    after its children have been visited. Either may be missing.
+    Returning ``SKIP`` from the enter hook skips the node's children.
+
+    ``generic_visit`` and ``generic_leave`` are the fallbacks for
+    nodes with no specific hooks.
+    '''
+    enter_prefix = 'visit_'
+    leave_prefix = 'leave_'
+
+    generic_visit = None
+    generic_leave = None
+
+    @classmethod
+    def _handler_table(cls):
+        table = cls.__dict__.get('_handlers')
+        if table is None:
+            table = {}
+            setattr(cls, '_handlers', table)
+        return table
+
+    @staticmethod
+    def _handler_key(node):
+        '''Node classes that override ``get_nodekey`` are keyed by
+        nodekey too, since it may vary per instance.
+        '''
+        node_cls = type(node)
+        if node_cls.get_nodekey is BaseNode.get_nodekey:
+            return node_cls
+        return (node_cls, node.get_nodekey())
+
+    @classmethod
+    def make_handlers(cls, nodekey):
+        '''Return the (enter, leave) functions for a nodekey.
+        '''
+        enter = getattr(cls, cls.enter_prefix + nodekey, cls.generic_visit)
+        leave = getattr(cls, cls.leave_prefix + nodekey, cls.generic_leave)
+        return enter, leave
+
+    @classmethod
+    def get_handlers(cls, node):
+        '''Return the cached (enter, leave) functions for this node.
+        '''
+        table = cls._handler_table()
+        key = cls._handler_key(node)
+        try:
+            return table[key]
+        except KeyError:
+            handlers = table[key] = cls.make_handlers(node.get_nodekey())
+            return handlers
+
+    def walk(self, root):
+        '''Visit every node under ``root``, including ``root``.
+        '''
+        get_handlers = self.get_handlers
+        stack = [(root, None)]
+        pop = stack.pop
+        push = stack.append
+        extend = stack.extend
+        while stack:
+            node, leave = pop()
+            if leave is not None:
+                leave(self, node)
+                continue
+            enter, leave = get_handlers(node)
+            if enter is not None and enter(self, node) is SKIP:
+                if leave is not None:
+                    leave(self, node)
+                continue
+            if leave is not None:
+                push((node, leave))
+            children = node.children
+            if children:
+                extend((child, None) for child in reversed(children))
+
+    def start(self, root):
+        '''Called before the walk.
+        '''
+
+    def finish(self, root):
+        '''Called after the walk. Its return value is returned by
+        ``visit``.
+        '''
+
+    def visit(self, root):
+        self.start(root)
+        self.walk(root)
+        return self.finish(root)
+
+
+class NodeTransformer(NodeVisitor):
+    '''A visitor that can mutate the tree it walks. The method named
+    ``visit_<nodekey>`` is called after the node's children have been
+    transformed, and its return value decides the node's fate:
+
+    - ``None`` or the node itself keeps the node,
+    - another node takes its place in the parent's children,
+    - ``REMOVE`` detaches it.
+
+    ``enter_<nodekey>`` hooks run before the children are visited and
+    can return ``SKIP``. ``visit`` returns the (possibly new) root.
+    '''
+    enter_prefix = 'enter_'
+    leave_prefix = 'visit_'
+
+    @classmethod
+    def make_handlers(cls, nodekey):
+        enter, visit = super(NodeTransformer, cls).make_handlers(nodekey)
+        if visit is None:
+            return enter, visit
+
+        def transform(self, node):
+            self.apply(node, visit(self, node))
+        return enter, transform
+
+    def apply(self, node, result):
+        '''Put ``result`` in place of ``node``.
+        '''
+        if result is None or result is node:
+            return
+        parent = getattr(node, 'parent', None)
+        if parent is None:
+            if node is self._root:
+                self._root = None if result is REMOVE else result
+            return
+        index = node.detatch()
+        if result is not REMOVE:
+            parent.insert(index, result)
+
+    def start(self, root):
+        self._root = root
+
+    def finish(self, root):
+        return self._root
+
+
+class Find(NodeVisitor):
+    '''A pass that collects the nodes ``find`` would yield for the
+    same arguments, for use with ``visit_all``. Only the ``__in`` and
+    ``__ne`` operators are supported in the keyword filters.
+    '''
+    def __init__(self, nodekey=None, **kwargs):
+        self.nodekey = nodekey
+        self.filters = []
+        for key, value in kwargs.items():
+            key, _, op = key.partition('__')
+            self.filters.append((key, op or 'eq', value))
+        self.matches = []
+        self._handlers = {}
+
+    def get_handlers(self, node):
+        key = self._handler_key(node)
+        try:
+            return self._handlers[key]
+        except KeyError:
+            pass
+        if self.nodekey is None or node.get_nodekey() == self.nodekey:
+            handlers = (type(self).match, None)
+        else:
+            handlers = (None, None)
+        self._handlers[key] = handlers
+        return handlers
+
+    def match(self, node):
+        missing = object()
+        for key, op, value in self.filters:
+            item = node.get(key, missing)
+            if op == 'eq':
+                if item is missing or item != value:
+                    return
+            elif op == 'in':
+                if item is missing or item not in value:
+                    return
+            elif op == 'ne':
+                if item is missing or item == value:
+                    return
+            else:
+                raise ValueError('Unsupported filter operator %r.' % op)
+        self.matches.append(node)
+
+    def finish(self, root):
+        return self.matches
+
+
+def visit_all(root, passes):
+    '''Run several visitors (or ``Find`` passes) over ``root`` in a
+    single walk and return the list of their ``finish`` results.
+
+    Each node is routed only to the passes with hooks for its type,
+    so the cost is roughly one walk plus the hooks actually called.
+    A pass that returns ``SKIP`` stops receiving nodes until the walk
+    leaves the skipped node; the other passes continue into the
+    subtree. Hooks run in the order the passes were given, so
+    transformers that touch the same nodes see each other's changes.
+    '''
+    passes = list(passes)
+    for visitor in passes:
+        visitor.start(root)
+
+    routes = {}
+    suspended = {}
+    stack = [(root, None)]
+    pop = stack.pop
+    push = stack.append
+    extend = stack.extend
+    while stack:
+        node, leaving = pop()
+        if leaving is not None:
+            for i, visitor, leave in leaving:
+                if leave is not None:
+                    leave(visitor, node)
+                if suspended.get(i) is node:
+                    del suspended[i]
+            continue
+
+        key = NodeVisitor._handler_key(node)
+        route = routes.get(key)
+        if route is None:
+            route = routes[key] = []
+            for i, visitor in enumerate(passes):
+                enter, leave = visitor.get_handlers(node)
+                if enter is not None or leave is not None:
+                    route.append((i, visitor, enter, leave))
+
+        leaving = []
+        for i, visitor, enter, leave in route:
+            if i in suspended:
+                continue
+            if enter is not None and enter(visitor, node) is SKIP:
+                suspended[i] = node
+                leaving.append((i, visitor, leave))
+            elif leave is not None:
+                leaving.append((i, visitor, leave))
+        if leaving:
+            push((node, leaving))
+
+        children = node.children
+        if children and len(suspended) < len(passes):
+            extend((child, None) for child in reversed(children))
+
+    return [visitor.finish(root) for visitor in passes]